@@ -1,33 +1,75 @@
 from flask import Blueprint, request, jsonify, session, redirect, url_for
-import bcrypt
 import json
 import os
+from database import jsonio
+from database.cache import get_json_cache
+from database.snapshot import SharedSnapshot
+from api.validation import EMAIL_PATTERN, Field, Schema, error_response
+from services.async_views import async_views, io_executor, bcrypt_executor
 
 auth_bp = Blueprint('auth', __name__)
 
 # Función de ayuda para hashear
 def hash_password(password):
+    import bcrypt  # Importación diferida (ver database/db.py)
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
 
+# bcrypt solo usa los primeros 72 bytes de la contraseña (no caracteres: en
+# UTF-8 una letra acentuada ocupa 2)
+BCRYPT_MAX_BYTES = 72
+
+def fits_bcrypt(password):
+    return len(password.encode('utf-8')) <= BCRYPT_MAX_BYTES
+
+# Datos del registro (ver api/validation.py)
+REGISTER_SCHEMA = Schema(
+    Field('first_name', label='Nombre', max_length=50),
+    Field('last_name', label='Apellido', max_length=50),
+    Field('email', label='Correo electrónico', max_length=255, pattern=EMAIL_PATTERN,
+          messages={'pattern': 'Formato de correo electrónico inválido'}),
+    Field('id_card', label='Cédula', max_length=20),
+    Field('password', label='Contraseña', validator=fits_bcrypt,
+          messages={'validator': f'Contraseña debe tener máximo {BCRYPT_MAX_BYTES} bytes'}),
+    Field('phone', label='Teléfono', max_length=20)
+)
+
+# Sin límite de longitud en la contraseña: las cuentas existentes pueden tener
+# contraseñas más largas (bcrypt compara solo sus primeros 72 bytes)
+LOGIN_SCHEMA = Schema(
+    Field('email', label='Correo electrónico', max_length=255),
+    Field('password', label='Contraseña')
+)
+
+# Índice de autenticación por email, compartido entre workers (mmap)
+users_snapshot = SharedSnapshot('users', key=lambda u: u.get('email', ''))
+
+def get_users_path():
+    users_path = os.path.join(os.getcwd(), 'users.json')
+    if not os.path.exists(users_path):
+        # Try alternative path
+        users_path = os.path.join('static', 'data', 'users.json')
+    return users_path
+
+def get_users_snapshot():
+    """Versión vigente del índice de usuarios (se republica si el archivo cambió)"""
+    return users_snapshot.current(get_users_path(), lambda: load_users()['users'])
+
 # Función para cargar usuarios desde JSON
 def load_users():
     try:
-        users_path = os.path.join(os.getcwd(), 'users.json')
-        if not os.path.exists(users_path):
-            # Try alternative path
-            users_path = os.path.join('static', 'data', 'users.json')
+        users_path = get_users_path()
         
         if os.path.exists(users_path):
-            with open(users_path, 'r') as f:
-                data = json.load(f)
+            data = get_json_cache(users_path).load()
                 
             # Handle both formats: {"users": [...]} or [...]
+            # Copia por registro para no modificar la caché compartida
             if isinstance(data, dict) and 'users' in data:
                 print("[DEBUG] auth.py: Loaded users from wrapped format")
-                return data
+                return {**data, "users": [dict(u) for u in data['users']]}
             elif isinstance(data, list):
                 print("[DEBUG] auth.py: Loaded users from array format")
-                return {"users": data}
+                return {"users": [dict(u) for u in data]}
             else:
                 print("[WARNING] auth.py: Unknown format, returning empty")
                 return {"users": []}
@@ -49,17 +91,17 @@ def save_users(data):
         if isinstance(data, list):
             data = {"users": data}
         
-        users_path = os.path.join(os.getcwd(), 'users.json')
-        if not os.path.exists(users_path):
-            users_path = os.path.join('static', 'data', 'users.json')
+        users_path = get_users_path()
         
         dir_path = os.path.dirname(users_path) if os.path.exists(users_path) else '.'
         
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json', dir=dir_path) as temp_file:
-            json.dump(data, temp_file, indent=4)
+        with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', delete=False, suffix='.json', dir=dir_path) as temp_file:
+            jsonio.dump(data, temp_file)
             temp_file.flush()
             os.fsync(temp_file.fileno())
         os.replace(temp_file.name, users_path)
+        get_json_cache(users_path).store(data)
+        users_snapshot.publish(data['users'], users_path)
         print("[DEBUG] auth.py: Users saved successfully")
     except Exception as e:
         print(f"Error saving users: {e}")
@@ -68,16 +110,15 @@ def save_users(data):
 # Endpoint: /api/auth/register
 @auth_bp.route('/register', methods=['POST'])
 def register():
-    data = request.get_json()
-    first_name = data.get('first_name')
-    last_name = data.get('last_name')
-    email = data.get('email')
-    id_card = data.get('id_card')
-    password = data.get('password')
-    phone = data.get('phone')
-
-    if not all([first_name, last_name, email, id_card, password, phone]):
-        return jsonify({"message": "Faltan datos requeridos"}), 400
+    values, errors = REGISTER_SCHEMA.validate(request.get_json(silent=True))
+    if errors:
+        return error_response(errors)
+    first_name = values['first_name']
+    last_name = values['last_name']
+    email = values['email']
+    id_card = values['id_card']
+    password = values['password']
+    phone = values['phone']
 
     users_data = load_users()
     # Check if user already exists
@@ -104,33 +145,77 @@ def register():
 
     return jsonify({"message": "Usuario registrado con éxito"}), 201
 
-# Endpoint: /api/auth/login
-@auth_bp.route('/login', methods=['POST'])
-def login():
-    data = request.get_json()
-    email = data.get('email')
-    password = data.get('password')
-
-    users_data = load_users()
+def check_password(password, user):
+    import bcrypt  # Importación diferida (ver database/db.py)
+    # Los hashes guardados cubren solo los primeros BCRYPT_MAX_BYTES bytes
+    return bcrypt.checkpw(password.encode('utf-8')[:BCRYPT_MAX_BYTES], user['password_hash'].encode('utf-8'))
 
-    for user in users_data['users']:
-        if user['email'] == email and bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
-            session['user_id'] = len(users_data['users'])  # Simple ID based on index
-            session['username'] = user['email']
-            session['role'] = user['role']
-            return jsonify({"message": "Login exitoso", "role": user['role'], "user": {"first_name": user['first_name'], "last_name": user['last_name'], "email": user['email'], "phone": user.get('phone', ''), "cedula": user.get('cedula', '')}, "redirect": "/"}), 200
+def _login_success(user, users):
+    session['user_id'] = len(users)  # Simple ID based on index
+    session['username'] = user['email']
+    session['role'] = user['role']
+    return jsonify({"message": "Login exitoso", "role": user['role'], "user": {"first_name": user['first_name'], "last_name": user['last_name'], "email": user['email'], "phone": user.get('phone', ''), "cedula": user.get('cedula', '')}, "redirect": "/"}), 200
 
+def _login_failed():
     return jsonify({"message": "Usuario o contraseña inválidos"}), 401
 
+# Endpoint: /api/auth/login
+@auth_bp.route('/login', methods=['POST'])
+def login():
+    values, errors = LOGIN_SCHEMA.validate(request.get_json(silent=True))
+    if errors:
+        return error_response(errors)
+    email = values['email']
+    password = values['password']
+
+    # Búsqueda por email en el índice compartido, sin cargar la lista de usuarios
+    users = get_users_snapshot()
+    matches = users.get_all(email)
+
+    for user in matches:
+        if check_password(password, user):
+            return _login_success(user, users)
+
+    return _login_failed()
+
+@async_views.view('auth.login')
+async def login_async():
+    # Modo ASGI: el índice se abre en el ejecutor de E/S y bcrypt corre en su
+    # propio ejecutor acotado (la admisión y el límite de tasa ya se aplicaron
+    # en los before_request)
+    values, errors = LOGIN_SCHEMA.validate(request.get_json(silent=True))
+    if errors:
+        return error_response(errors)
+    email = values['email']
+    password = values['password']
+
+    users = await io_executor.run(get_users_snapshot)
+    matches = users.get_all(email)
+
+    for user in matches:
+        if await bcrypt_executor.run(check_password, password, user):
+            return _login_success(user, users)
+
+    return _login_failed()
+
 # Endpoint: /api/auth/status
-@auth_bp.route('/status')
-def status():
+def auth_status():
+    """Estado de sesión de la petición actual (también lo usa /api/bootstrap)"""
     # Check localStorage via query parameter or fallback to session
     is_logged_in = request.args.get('localStorage', 'false') == 'true' or 'user_id' in session
-    return jsonify({
+    return {
         "is_logged_in": is_logged_in,
         "role": session.get('role') or 'cliente'
-    })
+    }
+
+@auth_bp.route('/status')
+def status():
+    return jsonify(auth_status())
+
+@async_views.view('auth.status')
+async def status_async():
+    # Solo lee la sesión: en modo ASGI se responde en el event loop, sin ocupar un hilo
+    return status()
 
 # Endpoint: /api/auth/logout
 @auth_bp.route('/logout')
@@ -1,103 +1,93 @@
+import csv
+import io
 import json
 import os
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, session
 from datetime import datetime
+from config import Config
+from database import jsonio
+from database.file_lock import FileLock
+from database.cache import get_json_cache
+from services.latest_sales import latest_sales
+from api.validation import EMAIL_PATTERN, Field, Schema, error_response, first_error
+from services.idempotency import idempotency
+from services.tasks import tasks
+from api.users import get_cached_users
+from api.purchases import get_cached_purchases
+from api.products import product_versions
 
 billing_bp = Blueprint('billing', __name__)
 
 # File path for storing billing data
 BILLING_DATA_FILE = os.path.join(os.path.dirname(__file__), '..', 'billing_data.json')
 
+# Serializes read-modify-write cycles on billing_data.json, across threads
+# and gunicorn workers (ids come from the highest stored billing_id)
+billing_lock = FileLock(Config.BILLING_LOCK_FILE)
+
+def get_cached_billing_data():
+    """Shared in-memory billing data (read only)"""
+    try:
+        return get_json_cache(BILLING_DATA_FILE).load(default=[])
+    except:
+        return []
+
 def load_billing_data():
     """Load billing data from JSON file"""
-    if os.path.exists(BILLING_DATA_FILE):
-        try:
-            with open(BILLING_DATA_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+    # Per-record copy so callers can modify it without touching the cache
+    return [dict(bill) for bill in get_cached_billing_data()]
 
 def save_billing_data(data):
-    """Save billing data to JSON file"""
-    with open(BILLING_DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    """Save billing data to JSON file (temp file + os.replace, never half written)"""
+    jsonio.dump_atomic(data, BILLING_DATA_FILE, indent=2)
+    get_json_cache(BILLING_DATA_FILE).store(data)
+
+# Invoice fields, as sent by the form or by an import row (compiled once, see api/validation.py)
+BILLING_SCHEMA = Schema(
+    Field('invoice_date', label='Fecha de factura'),
+    Field('client_cedula', int, label='Cédula', max_digits=8),
+    Field('client_name', label='Nombre del cliente', max_length=30),
+    Field('client_phone', label='Número de teléfono', pattern=r'\d{11}',
+          messages={'pattern': 'Número de teléfono debe tener exactamente 11 dígitos'}),
+    Field('client_email', label='Correo electrónico', max_length=255, pattern=EMAIL_PATTERN,
+          messages={'pattern': 'Formato de correo electrónico inválido'}),
+    Field('product_name', label='Nombre del producto', max_length=50),
+    Field('quantity', int, label='Cantidad', max_digits=3),
+    Field('unit_price', float, label='Precio unitario'),
+    Field('total', float, label='Total')
+)
+
+def validate_billing_fields(fields):
+    """Validate and convert one invoice. Returns (values, None) or (None, {field: message})"""
+    return BILLING_SCHEMA.validate(fields)
+
+def next_billing_id(billing_data):
+    """First free invoice ID (IDs are never reused after a delete)"""
+    return max((bill.get('billing_id', 0) for bill in billing_data), default=0) + 1
 
 @billing_bp.route('/create', methods=['POST'])
+@idempotency.idempotent
 def create_billing():
     try:
-        # Get form data
-        invoice_date = request.form.get('invoice_date')
-        client_cedula = request.form.get('client_cedula')
-        client_name = request.form.get('client_name')
-        client_phone = request.form.get('client_phone')
-        client_email = request.form.get('client_email')
-        product_name = request.form.get('product_name')
-        quantity = request.form.get('quantity')
-        unit_price = request.form.get('unit_price')
-        total = request.form.get('total')
-
-        # Validate required fields
-        if not all([invoice_date, client_cedula, client_name, client_phone, client_email, product_name, quantity, unit_price, total]):
-            return jsonify({'success': False, 'message': 'Todos los campos son requeridos'}), 400
-
-        # Validate data types and lengths
-        try:
-            client_cedula = int(client_cedula)
-            if len(str(client_cedula)) > 8:
-                return jsonify({'success': False, 'message': 'Cédula debe tener máximo 8 dígitos'}), 400
-
-            quantity = int(quantity)
-            if len(str(quantity)) > 3:
-                return jsonify({'success': False, 'message': 'Cantidad debe tener máximo 3 dígitos'}), 400
-
-            unit_price = float(unit_price)
-            total = float(total)
-
-            if len(client_name) > 30:
-                return jsonify({'success': False, 'message': 'Nombre del cliente debe tener máximo 30 caracteres'}), 400
-
-            # Validate phone number (11 digits)
-            if len(str(client_phone)) != 11 or not str(client_phone).isdigit():
-                return jsonify({'success': False, 'message': 'Número de teléfono debe tener exactamente 11 dígitos'}), 400
-
-            # Validate email format and length
-            import re
-            email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-            if len(client_email) > 255:
-                return jsonify({'success': False, 'message': 'Correo electrónico debe tener máximo 255 caracteres'}), 400
-            if not re.match(email_pattern, client_email):
-                return jsonify({'success': False, 'message': 'Formato de correo electrónico inválido'}), 400
-
-            if len(product_name) > 50:
-                return jsonify({'success': False, 'message': 'Nombre del producto debe tener máximo 50 caracteres'}), 400
-
-        except ValueError:
-            return jsonify({'success': False, 'message': 'Datos numéricos inválidos'}), 400
-
-        # Load existing billing data
-        billing_data = load_billing_data()
-
-        # Create new billing record
-        new_billing = {
-            'billing_id': len(billing_data) + 1,
-            'invoice_date': invoice_date,
-            'client_cedula': client_cedula,
-            'client_name': client_name,
-            'client_phone': client_phone,
-            'client_email': client_email,
-            'product_name': product_name,
-            'quantity': quantity,
-            'unit_price': unit_price,
-            'total': total,
-            'created_at': datetime.now().isoformat()
-        }
+        values, errors = validate_billing_fields(request.form)
+        if errors:
+            return error_response(errors, success=False)
+
+        with billing_lock:
+            # Load existing billing data
+            billing_data = load_billing_data()
+
+            # Create new billing record
+            new_billing = {'billing_id': next_billing_id(billing_data)}
+            new_billing.update(values)
+            new_billing['created_at'] = datetime.now().isoformat()
 
-        # Add to billing data
-        billing_data.append(new_billing)
+            # Add to billing data
+            billing_data.append(new_billing)
 
-        # Save to file
-        save_billing_data(billing_data)
+            # Save to file
+            save_billing_data(billing_data)
+            latest_sales.add(new_billing, billing_data)
 
         return jsonify({'success': True, 'message': 'Factura creada exitosamente'}), 201
 
@@ -105,31 +95,228 @@ def create_billing():
         print(f"Error creating billing: {e}")
         return jsonify({'success': False, 'message': 'Error interno del servidor'}), 500
 
+def _iter_import_rows(stream, file_format):
+    """Yield (row number, fields) from a CSV or NDJSON upload without reading it all at once"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        for fields in reader:
+            yield reader.line_num, fields
+    else:
+        for line_num, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                fields = json.loads(line)
+            except json.JSONDecodeError:
+                fields = None
+            yield line_num, fields if isinstance(fields, dict) else None
+
+@billing_bp.route('/import', methods=['POST'])
+def import_billing():
+    """Bulk import invoices from a CSV or NDJSON upload (one invoice per row)"""
+    try:
+        if session.get('role') != 'admin':
+            return jsonify({'success': False, 'message': 'No autorizado'}), 403
+
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'success': False, 'message': 'No se recibió el archivo'}), 400
+
+        file_format = request.args.get('format') or os.path.splitext(upload.filename or '')[1].lstrip('.').lower()
+        if file_format in ('ndjson', 'jsonl'):
+            file_format = 'ndjson'
+        elif file_format != 'csv':
+            return jsonify({'success': False, 'message': 'Formato no soportado (use csv o ndjson)'}), 400
+
+        accepted, errors = [], []
+        for row_number, fields in _iter_import_rows(upload.stream, file_format):
+            if fields is None:
+                errors.append({'row': row_number, 'message': 'JSON inválido'})
+                continue
+            values, field_errors = validate_billing_fields(fields)
+            if field_errors:
+                errors.append({'row': row_number, 'message': first_error(field_errors), 'fields': field_errors})
+            else:
+                accepted.append(values)
+
+        if accepted:
+            created_at = datetime.now().isoformat()
+            with billing_lock:
+                billing_data = load_billing_data()
+                # Allocate the whole block of IDs at once
+                first_id = next_billing_id(billing_data)
+                new_bills = []
+                for offset, values in enumerate(accepted):
+                    bill = {'billing_id': first_id + offset}
+                    bill.update(values)
+                    bill['created_at'] = created_at
+                    new_bills.append(bill)
+                billing_data.extend(new_bills)
+                save_billing_data(billing_data)
+                latest_sales.extend(new_bills, billing_data)
+
+        return jsonify({
+            'success': True,
+            'imported': len(accepted),
+            'rejected': len(errors),
+            'first_id': first_id if accepted else None,
+            'errors': errors
+        }), 201 if accepted else 200
+
+    except Exception as e:
+        print(f"Error importing billing: {e}")
+        return jsonify({'success': False, 'message': 'Error interno del servidor'}), 500
+
+# --- Invoices from approved purchases ---
+
+# Purchases in this status are invoiced by /from_purchases
+INVOICEABLE_STATUS = 'Completada'
+
+def _client_index():
+    """Hash lookups of the users store: (by lower-cased email, by cédula)"""
+    by_email, by_cedula = {}, {}
+    for user in get_cached_users():
+        email = str(user.get('email') or '').strip().lower()
+        cedula = str(user.get('cedula') or '').strip()
+        if email:
+            by_email.setdefault(email, user)
+        if cedula:
+            by_cedula.setdefault(cedula, user)
+    return by_email, by_cedula
+
+def _line_total(line):
+    try:
+        return round(float(line.get('price') or 0) * int(line.get('quantity') or 0), 2)
+    except (TypeError, ValueError):
+        return None
+
+def _purchase_invoices(purchase, client):
+    """(invoice values per line, None) or (None, error) for one purchase"""
+    invoices = []
+    name = f"{client.get('first_name', '')} {client.get('last_name', '')}".strip()
+    for position, line in enumerate(product_versions.expand(purchase.get('products') or [])):
+        fields = {
+            'invoice_date': str(purchase.get('purchase_date') or '')[:10],
+            'client_cedula': client.get('cedula'),
+            'client_name': name,
+            'client_phone': client.get('phone'),
+            'client_email': client.get('email'),
+            'product_name': line.get('name') or f"Producto {line.get('product_id', '')}".strip(),
+            'quantity': line.get('quantity'),
+            'unit_price': line.get('price'),
+            'total': _line_total(line)
+        }
+        values, errors = validate_billing_fields(fields)
+        if errors:
+            return None, {'purchase_id': purchase.get('id'), 'line': position,
+                          'message': first_error(errors), 'fields': errors}
+        values['purchase_id'] = purchase.get('id')
+        values['purchase_line'] = position
+        invoices.append(values)
+    if not invoices:
+        return None, {'purchase_id': purchase.get('id'), 'message': 'La compra no tiene productos'}
+    return invoices, None
+
+@tasks.task('generate_invoices')
+def generate_invoices(day=None, dry_run=False):
+    """One invoice per line of every approved purchase not invoiced yet
+
+    Invoices carry purchase_id/purchase_line, so purchases already linked to
+    an invoice are skipped and running the job again creates nothing. Clients
+    are joined from the users store by email, then by cédula. A purchase
+    whose client or lines do not validate is reported and left for a later
+    run; everything else is written in a single save.
+    """
+    by_email, by_cedula = _client_index()
+    with billing_lock:
+        billing_data = get_cached_billing_data()
+        invoiced = {bill['purchase_id'] for bill in billing_data if bill.get('purchase_id')}
+        pending = [
+            purchase for purchase in get_cached_purchases()
+            if purchase.get('status') == INVOICEABLE_STATUS and purchase.get('id') not in invoiced
+            and (day is None or str(purchase.get('purchase_date') or '').startswith(day))
+        ]
+
+        accepted, errors, purchase_ids = [], [], []
+        for purchase in pending:
+            user = purchase.get('user') or {}
+            client = (by_email.get(str(user.get('email') or '').strip().lower())
+                      or by_cedula.get(str(user.get('cedula') or '').strip()))
+            if client is None:
+                errors.append({'purchase_id': purchase.get('id'), 'message': 'Cliente no encontrado en usuarios'})
+                continue
+            invoices, error = _purchase_invoices(purchase, client)
+            if error:
+                errors.append(error)
+                continue
+            accepted.extend(invoices)
+            purchase_ids.append(purchase.get('id'))
+
+        first_id = None
+        if accepted and not dry_run:
+            billing_data = load_billing_data()
+            first_id = next_billing_id(billing_data)
+            created_at = datetime.now().isoformat()
+            new_bills = []
+            for offset, values in enumerate(accepted):
+                bill = {'billing_id': first_id + offset}
+                bill.update(values)
+                bill['created_at'] = created_at
+                new_bills.append(bill)
+            billing_data.extend(new_bills)
+            save_billing_data(billing_data)
+            latest_sales.extend(new_bills, billing_data)
+
+    return {
+        'invoiced_purchases': len(purchase_ids),
+        'created': 0 if dry_run else len(accepted),
+        'invoices': len(accepted),
+        'first_id': first_id,
+        'purchase_ids': purchase_ids,
+        'skipped': len(errors),
+        'errors': errors,
+        'dry_run': dry_run
+    }
+
+@billing_bp.route('/from_purchases', methods=['POST'])
+def invoice_purchases():
+    """Invoice approved purchases in one operation (optionally only one day's)
+
+    JSON body: date (YYYY-MM-DD, optional), dry_run, background (enqueue the job).
+    """
+    try:
+        if session.get('role') != 'admin':
+            return jsonify({'success': False, 'message': 'No autorizado'}), 403
+
+        data = request.get_json(silent=True) or {}
+        day = data.get('date') or None
+        if day is not None:
+            try:
+                day = datetime.strptime(str(day), '%Y-%m-%d').date().isoformat()
+            except ValueError:
+                return jsonify({'success': False, 'message': 'date debe tener el formato YYYY-MM-DD'}), 400
+
+        if data.get('background'):
+            task_id = tasks.enqueue('generate_invoices', {'day': day}, key=f"generate_invoices:{day or '*'}")
+            return jsonify({'success': True, 'task_id': task_id}), 202
+
+        summary = generate_invoices(day, bool(data.get('dry_run')))
+        return jsonify({'success': True, **summary}), 201 if summary['created'] else 200
+
+    except Exception as e:
+        print(f"Error invoicing purchases: {e}")
+        return jsonify({'success': False, 'message': 'Error interno del servidor'}), 500
+
 @billing_bp.route('/latest_sales', methods=['GET'])
 def get_latest_sales():
     try:
-        # Load billing data from JSON file
-        billing_data = load_billing_data()
-
-        # Sort by creation date (most recent first) and get last 10
-        sorted_billing = sorted(billing_data, key=lambda x: x.get('created_at', ''), reverse=True)
-        latest_sales = sorted_billing[:10]
-
-        # Format data for the table
-        sales_list = []
-        for sale in latest_sales:
-            sales_list.append({
-                'id': sale.get('billing_id', 0),
-                'fecha': sale.get('invoice_date', ''),
-                'cedula_cliente': str(sale.get('client_cedula', '')),
-                'nombre_cliente': sale.get('client_name', ''),
-                'telefono_cliente': str(sale.get('client_phone', '')),
-                'correo_cliente': sale.get('client_email', ''),
-                'cantidad_total': sale.get('quantity', 0),
-                'total_factura': float(sale.get('total', 0))
-            })
-
-        return jsonify({'success': True, 'sales': sales_list}), 200
+        # Most recent invoices are kept up to date by create/delete
+        # (see services/latest_sales.py); rebuilt only if the file changed
+        # outside this process
+        latest_sales.sync(get_cached_billing_data())
+
+        return jsonify({'success': True, 'sales': latest_sales.rows()}), 200
 
     except Exception as e:
         print(f"Error getting latest sales: {e}")
@@ -138,17 +325,19 @@ def get_latest_sales():
 @billing_bp.route('/delete/<int:billing_id>', methods=['DELETE'])
 def delete_billing(billing_id):
     try:
-        # Load billing data from JSON file
-        billing_data = load_billing_data()
+        with billing_lock:
+            # Load billing data from JSON file
+            billing_data = load_billing_data()
 
-        # Find and remove the billing record
-        updated_data = [bill for bill in billing_data if bill.get('billing_id') != billing_id]
+            # Find and remove the billing record
+            updated_data = [bill for bill in billing_data if bill.get('billing_id') != billing_id]
 
-        if len(updated_data) == len(billing_data):
-            return jsonify({'success': False, 'message': 'Factura no encontrada'}), 404
+            if len(updated_data) == len(billing_data):
+                return jsonify({'success': False, 'message': 'Factura no encontrada'}), 404
 
-        # Save updated data
-        save_billing_data(updated_data)
+            # Save updated data
+            save_billing_data(updated_data)
+            latest_sales.remove(billing_id, updated_data)
 
         return jsonify({'success': True, 'message': 'Factura eliminada exitosamente'}), 200
 
@@ -0,0 +1,124 @@
+import hashlib
+from threading import Lock
+from flask import Blueprint, Response, jsonify, request
+from database import jsonio
+from api.auth import auth_status
+from api.products import get_catalog_snapshot
+from services.pricing import pricing
+from services.async_views import async_views, io_executor
+
+bootstrap_bp = Blueprint('bootstrap', __name__)
+
+# Everything a storefront page needs on load, in one round trip:
+# catalog summary, exchange rate, auth status and (optionally) the quote of
+# the cart kept in localStorage.
+#
+# /api/bootstrap?cart=<id>:<quantity>[:<price>],...
+#
+# The response is assembled from state every worker already holds in memory:
+# the published catalog snapshot (the same one the pricing engine uses, so
+# the catalog and the cart quote always agree), the cached exchange rate and
+# the session. The catalog summary is encoded once per snapshot version.
+#
+# The ETag is derived from the catalog version, the rate, the auth status and
+# the cart, so a revalidation is answered with 304 before any body is built.
+# The response depends on the session cookie: it is private and revalidated
+# on every load (no-cache).
+
+CATALOG_FIELDS = ('product_id', 'name', 'description', 'price', 'stock_quantity', 'category', 'image_url')
+MAX_CART_LINES = 100
+
+
+class CatalogSummary:
+    """Encoded catalog summary, rebuilt only when a new catalog version is published"""
+
+    def __init__(self, fields):
+        self.fields = fields
+        self._lock = Lock()
+        self._cached = (None, b'[]')
+
+    def body(self, snapshot):
+        version, body = self._cached
+        if version == snapshot.version:
+            return body
+        with self._lock:
+            version, body = self._cached
+            if version != snapshot.version:
+                summary = [{field: product.get(field) for field in self.fields} for product in snapshot.records()]
+                body = jsonio.dumps(summary).encode('utf-8')
+                self._cached = (snapshot.version, body)
+            return body
+
+
+catalog_summary = CatalogSummary(CATALOG_FIELDS)
+
+
+def parse_cart(text):
+    """Cart lines from the `cart` query parameter; ValueError if malformed"""
+    items = []
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        fields = part.split(':')
+        if len(fields) not in (2, 3):
+            raise ValueError(part)
+        item = {'id': int(fields[0]), 'quantity': int(fields[1])}
+        if len(fields) == 3:
+            item['price'] = float(fields[2])
+        items.append(item)
+    if len(items) > MAX_CART_LINES:
+        raise ValueError(text)
+    return items
+
+
+def _matching_etag(etag):
+    """The client's tag for this representation (plain or per-encoding, see services/compression.py)"""
+    for tag in request.if_none_match.as_set():
+        if tag == etag or tag.startswith(f'{etag}-'):
+            return tag
+    return None
+
+
+def _bootstrap_response(snapshot, rate):
+    cart_param = request.args.get('cart', '')
+    try:
+        cart = parse_cart(cart_param)
+    except ValueError:
+        return jsonify({'success': False,
+                        'message': f'cart debe ser una lista id:cantidad[:precio] de máximo {MAX_CART_LINES} líneas'}), 400
+    auth = auth_status()
+    key = f"{snapshot.version}|{rate}|{auth['is_logged_in']}|{auth['role']}|{cart_param}"
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    matched = _matching_etag(etag)
+    if matched is not None:
+        response = Response(status=304)
+        response.set_etag(matched)
+    else:
+        rest = jsonio.dumps({
+            'exchange_rate': rate,
+            'auth': auth,
+            'cart': pricing.price_cart(cart) if cart else None
+        })
+        # The pre-encoded catalog is spliced in as is: '{"catalog":[...],' + rest without its '{'
+        body = b'{"catalog":' + catalog_summary.body(snapshot) + b',' + rest[1:].encode('utf-8')
+        response = Response(body, status=200, mimetype='application/json')
+        response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@bootstrap_bp.route('', methods=['GET'])
+def get_bootstrap():
+    return _bootstrap_response(get_catalog_snapshot(), pricing.exchange_rate())
+
+
+@async_views.view('bootstrap.get_bootstrap')
+async def get_bootstrap_async():
+    # ASGI mode: a snapshot rebuild or an expired rate goes to the I/O executor
+    snapshot = await io_executor.run(get_catalog_snapshot)
+    rate = pricing.cached_exchange_rate()
+    if rate is None:
+        rate = await io_executor.run(pricing.exchange_rate)
+    return _bootstrap_response(snapshot, rate)
@@ -1,47 +1,75 @@
 from flask import Blueprint, request, jsonify
-import bcrypt
-import json
 import os
+from database import jsonio
+from database.cache import get_json_cache
+from services.client_directory import client_directory
+from api.users import get_cached_users, USER_ROLES
+from api.validation import EMAIL_PATTERN, Field, Schema, error_response
 
 clients_bp = Blueprint('clients', __name__)
 
+# Alta y edición de clientes (ver api/validation.py); el formulario de alta
+# envía los nombres con guion
+REGISTER_CLIENT_SCHEMA = Schema(
+    Field('first_name', source='first-name', label='Nombre', max_length=50),
+    Field('last_name', source='last-name', label='Apellido', max_length=50),
+    Field('email', label='Correo electrónico', max_length=255, pattern=EMAIL_PATTERN,
+          messages={'pattern': 'Formato de correo electrónico inválido'}),
+    Field('cedula', label='Cédula', max_length=20),
+    Field('phone', label='Teléfono', max_length=20)
+)
+
+UPDATE_CLIENT_SCHEMA = Schema(
+    Field('first_name', label='Nombre', max_length=50),
+    Field('last_name', label='Apellido', max_length=50),
+    Field('email', label='Correo electrónico', max_length=255, pattern=EMAIL_PATTERN,
+          messages={'pattern': 'Formato de correo electrónico inválido'}),
+    Field('phone', label='Teléfono', max_length=20),
+    Field('role', required=False, default='cliente', label='Rol', choices=USER_ROLES)
+)
+
 # Función de ayuda para hashear
 def hash_password(password):
+    import bcrypt  # Importación diferida (ver database/db.py)
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
 
 # Función para cargar usuarios desde JSON
 def load_users():
     # Try static/data/users.json first (primary location)
     if os.path.exists('static/data/users.json'):
-        with open('static/data/users.json', 'r') as f:
-            return json.load(f)
+        data = get_json_cache('static/data/users.json').load()
     # Fallback to root users.json
     elif os.path.exists('users.json'):
-        with open('users.json', 'r') as f:
-            return json.load(f)
-    return {"users": []}
+        data = get_json_cache('users.json').load()
+    else:
+        return {"users": []}
+    # Copia por registro para no modificar la caché compartida
+    if isinstance(data, dict) and 'users' in data:
+        return {**data, "users": [dict(u) for u in data['users']]}
+    return [dict(u) for u in data] if isinstance(data, list) else data
 
 # Función para guardar usuarios en JSON
 def save_users(data):
     # Save to static/data/users.json (primary)
-    with open('static/data/users.json', 'w') as f:
-        json.dump(data, f, indent=4)
+    with open('static/data/users.json', 'w', encoding='utf-8') as f:
+        jsonio.dump(data, f)
+    get_json_cache('static/data/users.json').store(data)
     # Also save to root users.json for backup
-    with open('users.json', 'w') as f:
-        json.dump(data, f, indent=4)
+    with open('users.json', 'w', encoding='utf-8') as f:
+        jsonio.dump(data, f)
+    get_json_cache('users.json').store(data)
 
 # Endpoint: /api/clients/register
 @clients_bp.route('/register', methods=['POST'])
 def register_client():
-    data = request.get_json()
-    first_name = data.get('first-name')
-    last_name = data.get('last-name')
-    email = data.get('email')
-    cedula = data.get('cedula')
-    phone = data.get('phone')
-
-    if not all([first_name, last_name, email, cedula, phone]):
-        return jsonify({"message": "Faltan datos requeridos"}), 400
+    values, errors = REGISTER_CLIENT_SCHEMA.validate(request.get_json(silent=True))
+    if errors:
+        return error_response(errors)
+    first_name = values['first_name']
+    last_name = values['last_name']
+    email = values['email']
+    cedula = values['cedula']
+    phone = values['phone']
 
     users_data = load_users()
 
@@ -73,23 +101,22 @@ def register_client():
 # Endpoint: /api/clients (GET) - List all clients
 @clients_bp.route('', methods=['GET'])
 def get_clients():
-    users_data = load_users()
-    # Include both 'client' and 'cliente' roles
-    clients = [user for user in users_data['users'] if user.get('role') in ['client', 'cliente']]
-    return jsonify(clients), 200
+    # Both 'client' and 'cliente' roles, from the directory's sanitized
+    # projection (see /api/users/directory for pagination and search)
+    client_directory.sync(get_cached_users())
+    return jsonify(client_directory.by_role('cliente')), 200
 
 # Endpoint: /api/clients/<cedula> (PUT) - Update client
 @clients_bp.route('/<cedula>', methods=['PUT'])
 def update_client(cedula):
-    data = request.get_json()
-    first_name = data.get('first_name')
-    last_name = data.get('last_name')
-    email = data.get('email')
-    phone = data.get('phone')
-    role = data.get('role', 'cliente')  # Default to 'cliente'
-
-    if not all([first_name, last_name, email, phone]):
-        return jsonify({"message": "Faltan datos requeridos"}), 400
+    values, errors = UPDATE_CLIENT_SCHEMA.validate(request.get_json(silent=True))
+    if errors:
+        return error_response(errors)
+    first_name = values['first_name']
+    last_name = values['last_name']
+    email = values['email']
+    phone = values['phone']
+    role = values['role']  # Default to 'cliente'
 
     users_data = load_users()
     for user in users_data['users']:
@@ -1,22 +1,99 @@
+import csv
+import importlib.util
+import io
 import os
-import json
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, Response, jsonify, request, session, current_app
 from werkzeug.utils import secure_filename
-from database.db import get_db_connection
+from config import Config
+from database.db import get_db_connection, fetch_all
+from database import jsonio
+from database.cache import get_json_cache
+from database.file_lock import FileLock
+from database.snapshot import SharedSnapshot
+from database.product_versions import ProductVersionStore
+from services.inventory import inventory
+from services.pricing import pricing
+from services.tasks import tasks
+from services.async_views import async_views, io_executor
+from api.validation import Field, Schema, error_response, first_error
 
 products_bp = Blueprint('products', __name__)
 
 PRODUCTS_FILE = 'products.json'
 
+# Serializa los ciclos leer-modificar-escribir de products.json entre hilos y
+# workers (registro/eliminación de productos y escrituras del inventario)
+products_lock = FileLock(Config.PRODUCTS_LOCK_FILE)
+
+def get_cached_products():
+    """Catálogo compartido en memoria (solo lectura)"""
+    return get_json_cache(PRODUCTS_FILE).load(default=[])
+
+# Catálogo publicado como instantánea mmap compartida por todos los workers
+catalog_snapshot = SharedSnapshot('catalog', key=lambda p: p['product_id'])
+
+def get_catalog_snapshot():
+    """Versión vigente del catálogo (búsqueda por product_id sin parsear JSON)"""
+    return catalog_snapshot.current(PRODUCTS_FILE, get_cached_products)
+
+# Nombre/imagen/categoría de cada versión de los productos, para las líneas de compra
+product_versions = ProductVersionStore(Config.PRODUCT_VERSIONS_FILE)
+
+def current_product_versions(product_ids):
+    """{product_id: versión vigente}; registra el catálogo si algún producto no tiene versión"""
+    versions = {product_id: product_versions.current(product_id) for product_id in product_ids}
+    if None in versions.values():
+        # products.json editado fuera de la aplicación
+        product_versions.record(get_cached_products())
+        versions = {product_id: product_versions.current(product_id) for product_id in product_ids}
+    return versions
+
 def load_products():
-    if os.path.exists(PRODUCTS_FILE):
-        with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+    # Copia por registro: quien modifica la lista no altera la caché compartida
+    return [dict(p) for p in get_cached_products()]
 
 def save_products(products):
-    with open(PRODUCTS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(products, f, indent=4, ensure_ascii=False)
+    # El stock vigente está en los contadores compartidos (services/inventory.py)
+    inventory.apply_stock(products)
+    # Temporal + os.replace: una escritura interrumpida no deja el catálogo a medias
+    jsonio.dump_atomic(products, PRODUCTS_FILE)
+    get_json_cache(PRODUCTS_FILE).store(products)
+    catalog_snapshot.publish(products, PRODUCTS_FILE)
+    product_versions.record(products)
+
+# Catalog fields (see api/validation.py); bulk rows validate only the fields they carry
+PRODUCT_SCHEMA = Schema(
+    Field('name', label='Nombre', max_length=100),
+    Field('description', required=False, default='', label='Descripción', max_length=1000),
+    Field('price', float, label='Precio', min_value=0),
+    Field('stock_quantity', int, label='Stock', min_value=0),
+    Field('category', required=False, default='', label='Categoría', max_length=50),
+    Field('image_url', required=False, label='Imagen', max_length=255)
+)
+
+# Pillow is optional (not in requirements.txt); checked without importing it
+PILLOW_AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+@tasks.task('resize_product_image')
+def resize_product_image(path, max_size=Config.PRODUCT_IMAGE_MAX_SIZE):
+    """Shrink an uploaded product image in place (requires Pillow)"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return {'resized': False, 'reason': 'Pillow is not installed'}
+    if not os.path.exists(path):
+        return {'resized': False, 'reason': 'Image not found'}
+    with Image.open(path) as image:
+        if max(image.size) <= max_size:
+            return {'resized': False, 'size': list(image.size)}
+        image_format = image.format
+        image.thumbnail((max_size, max_size))
+        # Write next to the original and swap, so the file is never served half written
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        image.save(temp_path, format=image_format, optimize=True)
+        size = list(image.size)
+    os.replace(temp_path, path)
+    return {'resized': True, 'size': size}
 
 @products_bp.route('/', methods=['GET'])
 def get_products():
@@ -29,19 +106,32 @@ def get_products():
         conn.close()
         return jsonify(products), 200
     else:
-        # Load from JSON
-        products = load_products()
+        # Serve the published snapshot body as is (no parsing or re-encoding)
+        body = bytes(get_catalog_snapshot().body())
+        return Response(body, status=200, mimetype='application/json')
+
+@async_views.view('products.get_products')
+async def get_products_async():
+    # ASGI mode: the MySQL attempt and a snapshot rebuild run on the I/O executor
+    conn = await io_executor.run(get_db_connection)
+    if conn:
+        products = await io_executor.run(fetch_all, conn, "SELECT * FROM Products")
         return jsonify(products), 200
+    snapshot = await io_executor.run(get_catalog_snapshot)
+    return Response(bytes(snapshot.body()), status=200, mimetype='application/json')
 
 @products_bp.route('/register', methods=['POST'])
 def register_product():
     try:
-        # Get form data
-        name = request.form.get('name')
-        price = float(request.form.get('price'))
-        stock_quantity = int(request.form.get('stock_quantity'))
-        description = request.form.get('description')
-        category = request.form.get('category')
+        # Validate the form before touching the image or the catalog
+        values, errors = PRODUCT_SCHEMA.validate(request.form)
+        if errors:
+            return error_response(errors, success=False)
+        name = values['name']
+        price = values['price']
+        stock_quantity = values['stock_quantity']
+        description = values['description']
+        category = values['category']
 
         # Handle image upload
         if 'image' not in request.files:
@@ -56,67 +146,290 @@ def register_product():
         image_path = os.path.join(current_app.root_path, 'static', 'img', 'products', filename)
         image_file.save(image_path)
         image_url = f'/static/img/products/{filename}'
+        # Resizing happens in the background; the upload returns right away.
+        # Without Pillow the task could only fail, so it is not enqueued
+        image_task_id = tasks.enqueue('resize_product_image', {'path': image_path}) if PILLOW_AVAILABLE else None
 
-        # Load existing products
-        products = load_products()
+        with products_lock:
+            # Load existing products
+            products = load_products()
 
-        # Generate new ID
-        if products:
-            new_id = max(p['product_id'] for p in products) + 1
-        else:
-            new_id = 1
-
-        # Create new product
-        new_product = {
-            'product_id': new_id,
-            'name': name,
-            'description': description,
-            'price': price,
-            'stock_quantity': stock_quantity,
-            'category': category,
-            'image_url': image_url
-        }
-
-        # Add to list and save
-        products.append(new_product)
-        save_products(products)
-
-        return jsonify({'success': True, 'message': 'Producto registrado exitosamente', 'product': new_product}), 201
+            # Generate new ID
+            if products:
+                new_id = max(p['product_id'] for p in products) + 1
+            else:
+                new_id = 1
+
+            # Create new product
+            new_product = {
+                'product_id': new_id,
+                'name': name,
+                'description': description,
+                'price': price,
+                'stock_quantity': stock_quantity,
+                'category': category,
+                'image_url': image_url
+            }
+
+            # Add to list and save
+            products.append(new_product)
+            inventory.set_stock(new_id, stock_quantity)
+            save_products(products)
+
+        return jsonify({'success': True, 'message': 'Producto registrado exitosamente', 'product': new_product,
+                        'image_task_id': image_task_id}), 201
 
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @products_bp.route('/exchange-rate', methods=['GET'])
 def get_exchange_rate():
-    # Simulate exchange rate similar to pyBCV
-    # In a real implementation, this would fetch from an API
-    # For now, return a fixed rate (USD to VES)
-    exchange_rate = 355.55  # Example rate
-    return jsonify({'rate': exchange_rate}), 200
+    # Cached USD to VES rate (see services/pricing.py)
+    return jsonify({'rate': pricing.exchange_rate()}), 200
+
+@async_views.view('products.get_exchange_rate')
+async def get_exchange_rate_async():
+    # ASGI mode: only an expired rate (upstream fetch) goes to the I/O executor
+    rate = pricing.cached_exchange_rate()
+    if rate is None:
+        rate = await io_executor.run(pricing.exchange_rate)
+    return jsonify({'rate': rate}), 200
+
+@products_bp.route('/batch', methods=['GET'])
+def get_products_batch():
+    # /api/products/batch?ids=1,2,3
+    try:
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+    except ValueError:
+        return jsonify({'success': False, 'message': 'ids debe ser una lista de enteros'}), 400
+    products, missing = pricing.get_products(ids)
+    return jsonify({'products': products, 'missing': missing}), 200
+
+@products_bp.route('/quote', methods=['POST'])
+def quote_cart():
+    # Price a whole cart with catalog prices, IVA and the exchange rate
+    data = request.get_json(silent=True) or {}
+    cart = data.get('cart')
+    if not isinstance(cart, list):
+        return jsonify({'success': False, 'message': 'cart debe ser una lista'}), 400
+    return jsonify(pricing.price_cart(cart)), 200
 
 @products_bp.route('/delete/<int:product_id>', methods=['DELETE'])
 def delete_product(product_id):
     try:
-        # Load existing products
-        products = load_products()
+        with products_lock:
+            # Load existing products
+            products = load_products()
 
-        # Find and remove the product
-        product_index = None
-        for i, product in enumerate(products):
-            if product['product_id'] == product_id:
-                product_index = i
-                break
+            # Find and remove the product
+            product_index = None
+            for i, product in enumerate(products):
+                if product['product_id'] == product_id:
+                    product_index = i
+                    break
 
-        if product_index is None:
-            return jsonify({'success': False, 'message': 'Producto no encontrado'}), 404
+            if product_index is None:
+                return jsonify({'success': False, 'message': 'Producto no encontrado'}), 404
 
-        # Remove the product
-        deleted_product = products.pop(product_index)
+            # Remove the product
+            deleted_product = products.pop(product_index)
 
-        # Save updated products
-        save_products(products)
+            # Save updated products
+            save_products(products)
+            inventory.remove_product(product_id)
 
         return jsonify({'success': True, 'message': 'Producto eliminado exitosamente', 'product': deleted_product}), 200
 
     except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'message': str(e)}), 500
+# --- Bulk operations (supplier price lists, catalog cleanups) ---
+
+BULK_FIELDS = ('name', 'description', 'price', 'stock_quantity', 'category', 'image_url')
+
+def _read_bulk_items():
+    """Items from a JSON body (list or {"products": [...]}) or from an uploaded CSV"""
+    upload = request.files.get('file')
+    if upload is not None:
+        text = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        # Empty CSV cells mean "field not provided"
+        return [{k: v for k, v in row.items() if v not in (None, '')} for row in csv.DictReader(text)]
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('products', data.get('items'))
+    if not isinstance(data, list):
+        raise ValueError('Se esperaba una lista de productos o un archivo CSV')
+    return data
+
+class _CatalogIndex:
+    """product_id and lower-cased name lookups over a loaded product list"""
+
+    def __init__(self, products):
+        self.by_id = {p['product_id']: p for p in products}
+        self.by_name = {str(p.get('name', '')).strip().lower(): p for p in products}
+
+    def rename(self, product, old_name):
+        """Keep the name lookup in sync after a product changes its name"""
+        old_key = str(old_name or '').strip().lower()
+        if self.by_name.get(old_key) is product:
+            del self.by_name[old_key]
+        self.by_name[str(product.get('name', '')).strip().lower()] = product
+
+    def match(self, item):
+        if item.get('product_id') not in (None, ''):
+            return self.by_id.get(int(item['product_id']))
+        if item.get('name'):
+            return self.by_name.get(str(item['name']).strip().lower())
+        return None
+
+def _clean_fields(item):
+    """Convert the provided fields of a bulk row; raises ValueError on bad values"""
+    fields, errors = PRODUCT_SCHEMA.validate(item, partial=True)
+    if errors:
+        raise ValueError(first_error(errors))
+    return {field: fields[field] for field in BULK_FIELDS if field in fields}
+
+def _commit_bulk(products, stock_changes, deleted_ids):
+    """Write the catalog once and refresh derived state once"""
+    # Stock counters first: save_products copies them into the catalog
+    for product_id, quantity in stock_changes.items():
+        inventory.set_stock(product_id, quantity)
+    for product_id in deleted_ids:
+        inventory.remove_product(product_id)
+    save_products(products)  # The pricing index rebuilds itself from the new cache entry
+
+def _bulk_response(summary, errors):
+    if errors:
+        return jsonify({'success': False, 'message': 'No se aplicó ningún cambio', 'errors': errors}), 400
+    return jsonify({'success': True, **summary}), 200
+
+@products_bp.route('/bulk', methods=['POST'])
+def bulk_upsert_products():
+    """Create or update many products in one write; matched by product_id or name"""
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    try:
+        items = _read_bulk_items()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    with products_lock:
+        products = load_products()
+        index = _CatalogIndex(products)
+        next_id = max(index.by_id, default=0) + 1
+        created, updated, errors = [], [], []
+        unchanged = 0
+        stock_changes = {}
+
+        for row, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError('Fila inválida')
+                fields = _clean_fields(item)
+                product = index.match(item)
+                if product is None:
+                    if item.get('product_id') not in (None, ''):
+                        raise ValueError('Producto no encontrado')
+                    if not fields.get('name') or 'price' not in fields:
+                        raise ValueError('name y price son requeridos para productos nuevos')
+                    product = {
+                        'product_id': next_id,
+                        'name': fields['name'],
+                        'description': fields.get('description', ''),
+                        'price': fields['price'],
+                        'stock_quantity': fields.get('stock_quantity', 0),
+                        'category': fields.get('category', ''),
+                        'image_url': fields.get('image_url', '')
+                    }
+                    next_id += 1
+                    products.append(product)
+                    index.by_id[product['product_id']] = product
+                    index.by_name[product['name'].strip().lower()] = product
+                    stock_changes[product['product_id']] = product['stock_quantity']
+                    created.append(product['product_id'])
+                    continue
+                changes = {f: [product.get(f), v] for f, v in fields.items() if product.get(f) != v}
+                if not changes:
+                    unchanged += 1
+                    continue
+                product.update(fields)
+                if 'name' in changes:
+                    index.rename(product, changes['name'][0])
+                if 'stock_quantity' in changes:
+                    stock_changes[product['product_id']] = product['stock_quantity']
+                updated.append({'product_id': product['product_id'], 'changes': changes})
+            except (ValueError, TypeError) as e:
+                errors.append({'row': row, 'message': str(e)})
+
+        if not errors and (created or updated):
+            _commit_bulk(products, stock_changes, [])
+
+    return _bulk_response({'created': created, 'updated': updated, 'unchanged': unchanged}, errors)
+
+@products_bp.route('/bulk/prices', methods=['POST'])
+def bulk_update_prices():
+    """Reprice many products in one write: [{product_id | name, price}]"""
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    try:
+        items = _read_bulk_items()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    with products_lock:
+        products = load_products()
+        index = _CatalogIndex(products)
+        updated, errors = [], []
+        unchanged = 0
+
+        for row, item in enumerate(items):
+            try:
+                if not isinstance(item, dict) or item.get('price') in (None, ''):
+                    raise ValueError('price es requerido')
+                price = _clean_fields({'price': item['price']})['price']
+                product = index.match(item)
+                if product is None:
+                    raise ValueError('Producto no encontrado')
+                if product.get('price') == price:
+                    unchanged += 1
+                    continue
+                updated.append({'product_id': product['product_id'], 'changes': {'price': [product.get('price'), price]}})
+                product['price'] = price
+            except (ValueError, TypeError) as e:
+                errors.append({'row': row, 'message': str(e)})
+
+        if not errors and updated:
+            _commit_bulk(products, {}, [])
+
+    return _bulk_response({'updated': updated, 'unchanged': unchanged}, errors)
+
+@products_bp.route('/bulk/delete', methods=['POST'])
+def bulk_delete_products():
+    """Delete many products in one write: [{product_id | name}] or a list of IDs"""
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    try:
+        items = _read_bulk_items()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    with products_lock:
+        products = load_products()
+        index = _CatalogIndex(products)
+        to_delete, errors = set(), []
+
+        for row, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    item = {'product_id': item}
+                product = index.match(item)
+                if product is None:
+                    raise ValueError('Producto no encontrado')
+                to_delete.add(product['product_id'])
+            except (ValueError, TypeError) as e:
+                errors.append({'row': row, 'message': str(e)})
+
+        if not errors and to_delete:
+            products = [p for p in products if p['product_id'] not in to_delete]
+            _commit_bulk(products, {}, to_delete)
+
+    return _bulk_response({'deleted': sorted(to_delete)}, errors)
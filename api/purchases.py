@@ -1,53 +1,224 @@
 import json
 import os
+import time
 from datetime import datetime
-from flask import Blueprint, jsonify, request, session
-from database.db import get_db_connection
+from flask import Blueprint, Response, jsonify, request, session
+from config import Config
+from database.db import get_db_connection, fetch_all
+from database import jsonio
+from database.file_lock import FileLock
+from database.purchase_store import PurchaseStore
+from database.product_versions import display_fields
+from services.inventory import inventory, cart_lines, InsufficientStockError
+from services.pricing import pricing
+from services.purchase_analytics import purchase_snapshot
+from services.purchase_events import purchase_events, RESET
+from services.customer_history import customer_history
+from services.tasks import tasks
+from api.validation import Field, Schema, ISO_DATE_PATTERN, error_response, is_iso_date
+from api.products import product_versions, current_product_versions, get_cached_products
+from services.idempotency import idempotency
+from services.async_views import async_views, io_executor, ExecutorBusy
+from services.reconciliation import read_statement, reconcile
 
 purchases_bp = Blueprint('purchases', __name__)
 
 PURCHASES_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'purchases.json')
 
-def _load_purchases():
-    """Load purchases from JSON file"""
+# Serializes read-modify-write cycles on the purchase partitions, across
+# threads and gunicorn workers (ids come from the highest stored number)
+purchases_lock = FileLock(Config.PURCHASES_LOCK_FILE)
+
+# purchases.json holds the open (current) month; closed months are sealed
+# into gzip partitions under PURCHASE_ARCHIVE_DIR
+purchase_store = PurchaseStore(PURCHASES_FILE, Config.PURCHASE_ARCHIVE_DIR, lock=purchases_lock)
+
+# Purchases in this status do not hold inventory
+CANCELLED_STATUS = 'Cancelada'
+
+# Allowed status changes for batch updates (current status -> new statuses)
+STATUS_TRANSITIONS = {
+    'Pendiente': {'Procesando', 'Completada', 'Cancelada'},
+    'Procesando': {'Pendiente', 'Completada', 'Cancelada'},
+    'Completada': {'Procesando', 'Cancelada'},
+    'Cancelada': {'Pendiente'}
+}
+
+# Maximum number of items accepted by /update_status/batch
+MAX_BATCH_STATUS_UPDATES = 500
+
+# Only purchases in this status are reconciled against the bank statement
+RECONCILE_FROM_STATUS = 'Pendiente'
+
+# Maximum number of matches accepted by /reconcile/apply
+MAX_RECONCILE_MATCHES = 5000
+
+# Stored fields of a purchase line item; name, image_url and category are
+# resolved from product_versions by (product_id, version) when listing
+LINE_ITEM_FIELDS = ('product_id', 'version', 'quantity', 'price')
+
+# Request bodies (see api/validation.py)
+REGISTER_PURCHASE_SCHEMA = Schema(
+    Field('cart', list, label='Carrito', min_length=1,
+          messages={'min_length': 'El carrito no puede estar vacío'}),
+    Field('user', dict, label='Usuario'),
+    Field('payment_proof', required=False, default='', label='Comprobante de pago'),
+    Field('bank_reference', required=False, default='', label='Referencia bancaria', max_length=50)
+)
+
+CREATE_PURCHASE_SCHEMA = Schema(
+    Field('user_id', None, label='user_id'),
+    Field('user', dict, label='Usuario'),
+    Field('products', list, label='Productos'),
+    Field('total_amount', float, label='Monto total', min_value=0),
+    Field('status', required=False, default='Pendiente', label='Estado', choices=tuple(STATUS_TRANSITIONS)),
+    Field('purchase_date', required=False, label='Fecha de compra', max_length=40,
+          pattern=ISO_DATE_PATTERN, validator=is_iso_date,
+          messages={'pattern': 'Fecha de compra debe tener el formato AAAA-MM-DD[THH:MM:SS]',
+                    'validator': 'Fecha de compra no es una fecha válida'}),
+    Field('payment_proof', required=False, default='', label='Comprobante de pago'),
+    Field('bank_reference', required=False, default='', label='Referencia bancaria', max_length=50)
+)
+
+UPDATE_STATUS_SCHEMA = Schema(
+    Field('purchase_id', label='purchase_id', max_length=40),
+    Field('status', label='Estado', choices=tuple(STATUS_TRANSITIONS))
+)
+
+def get_cached_purchases():
+    """Shared in-memory list of every purchase, all partitions (read only)"""
     try:
-        if os.path.exists(PURCHASES_FILE):
-            with open(PURCHASES_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
+        return purchase_store.all()
     except Exception as e:
         print(f"Error loading purchases: {e}")
         return []
 
-def _save_purchases(purchases):
-    """Save purchases to JSON file"""
+def _load_purchases(start_date=None, end_date=None):
+    """Load purchases, only from the partitions overlapping the date range if given
+
+    The range is not applied to individual purchases; callers filter by date.
+    """
     try:
-        print(f"Saving to {PURCHASES_FILE}")
-        with open(PURCHASES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(purchases, f, indent=4, ensure_ascii=False)
-        print("Save successful")
+        if start_date or end_date:
+            source = purchase_store.query(start_date, end_date)
+        else:
+            source = get_cached_purchases()
+        # Copia por registro: los handlers modifican y ordenan la lista devuelta
+        return [dict(p) for p in source]
     except Exception as e:
-        print(f"Error saving purchases: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Error loading purchases: {e}")
+        return []
+
+def _save_purchases(purchases, month='', changed=(), deleted=()):
+    """Save one partition: the open one (purchases.json) or a sealed month
+
+    `changed` (purchases created or with a new status) and `deleted` (ids)
+    are applied to this worker's analytics snapshot, so it never rescans the
+    whole history after its own writes. Write errors propagate: callers roll
+    back what they did (e.g. release the reserved stock) and answer 500.
+
+    Returns the storage versions (before, after) of the write.
+    """
+    previous = purchase_store.version()
+    purchase_store.save(purchases, month)
+    if month == '' and purchase_store.open_month_changed():
+        # Once a month, move the closed month out of the open partition
+        tasks.enqueue('seal_purchases', key='seal_purchases')
+    version = purchase_store.version()
+    purchase_snapshot.apply(changed, deleted, pricing.catalog_index(), previous, version)
+    return previous, version
+
+@tasks.task('seal_purchases')
+def seal_purchases():
+    """Move purchases of closed months into their sealed partitions (under purchases_lock)"""
+    return {'sealed': purchase_store.seal()}
+
+def _parse_line(item):
+    """(product_id, quantity, price) of a posted or legacy line item; raises ValueError"""
+    try:
+        return (int(item.get('product_id', item.get('id'))), int(item.get('quantity', 1)),
+                float(item.get('price') or 0))
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError('Producto inválido: se requieren product_id, quantity y price')
+
+def _line_items(items):
+    """Normalized line items for posted products, versioned by their display fields"""
+    parsed = [_parse_line(item) for item in items]
+    current_product_versions({product_id for product_id, _, _ in parsed})
+    versions = product_versions.versions_for(
+        [(product_id, display_fields(item)) for (product_id, _, _), item in zip(parsed, items)])
+    return [
+        {'product_id': product_id, 'version': version, 'quantity': quantity, 'price': price}
+        for (product_id, quantity, price), version in zip(parsed, versions)
+    ]
+
+def present_purchase(purchase):
+    """Copy of a purchase with its line items expanded with their display fields"""
+    return {**purchase, 'products': product_versions.expand(purchase.get('products') or [])}
+
+def present_purchases(purchases):
+    return [present_purchase(purchase) for purchase in purchases]
+
+def _is_normalized(item):
+    return isinstance(item, dict) and 'product_id' in item and set(item) <= set(LINE_ITEM_FIELDS)
+
+def migrate_line_items(dry_run=False):
+    """Rewrite embedded cart copies as normalized line items, in every partition
+
+    Items without a usable product_id are left as they are (counted as skipped).
+    Display fields that differ from the catalog (renamed or deleted products)
+    become historical versions, so old purchases keep showing what was bought.
+    """
+    summary = dict.fromkeys(('partitions', 'purchases', 'lines', 'skipped', 'bytes_before', 'bytes_after'), 0)
+    with purchases_lock:
+        if not dry_run:
+            product_versions.record(get_cached_products())
+        for month in [''] + sorted(purchase_store.index()):
+            purchases = purchase_store.load(month)
+            pending = []   # (line list, position, product_id, quantity, price, display fields)
+            for purchase in purchases:
+                products = purchase.get('products')
+                if not isinstance(products, list) or all(_is_normalized(item) for item in products):
+                    continue
+                products = purchase['products'] = list(products)
+                converted = len(pending)
+                for position, item in enumerate(products):
+                    if _is_normalized(item):
+                        continue
+                    try:
+                        product_id, quantity, price = _parse_line(item)
+                    except ValueError:
+                        summary['skipped'] += 1
+                        continue
+                    pending.append((products, position, product_id, quantity, price, display_fields(item)))
+                if len(pending) > converted:
+                    summary['purchases'] += 1
+            if not pending:
+                continue
+            before = len(jsonio.dumps(purchases))
+            if dry_run:
+                versions = [None] * len(pending)
+            else:
+                versions = product_versions.versions_for([(entry[2], entry[5]) for entry in pending])
+            for (products, position, product_id, quantity, price, _), version in zip(pending, versions):
+                products[position] = {'product_id': product_id, 'version': version,
+                                      'quantity': quantity, 'price': price}
+            summary['partitions'] += 1
+            summary['lines'] += len(pending)
+            summary['bytes_before'] += before
+            summary['bytes_after'] += len(jsonio.dumps(purchases))
+            if not dry_run:
+                purchase_store.save(purchases, month)
+    return summary
 
 def generate_purchase_id():
     """Generate a unique purchase ID"""
-    purchases = _load_purchases()
-    if not purchases:
+    if not purchase_store.hot() and not purchase_store.index():
         return "REF-2024-001"
 
-    # Find the highest ID number
-    max_id = 0
-    for purchase in purchases:
-        try:
-            # Extract number from ID like "REF-2024-001"
-            id_parts = purchase['id'].split('-')
-            if len(id_parts) >= 3:
-                num = int(id_parts[2])
-                max_id = max(max_id, num)
-        except (ValueError, IndexError):
-            continue
+    # Highest ID number (like "REF-2024-001"): open partition plus the
+    # per-partition maximum kept in the archive index
+    max_id = purchase_store.max_id_number()
 
     return f"PUR-2024-{str(max_id + 1).zfill(3)}"
 
@@ -77,7 +248,7 @@ def get_purchases():
             return jsonify(purchases), 200
         else:
             # Fallback to JSON file
-            purchases = _load_purchases()
+            purchases = present_purchases(get_cached_purchases())
             # Sort by date descending
             purchases.sort(key=lambda x: x.get('purchase_date', ''), reverse=True)
             return jsonify(purchases), 200
@@ -86,63 +257,131 @@ def get_purchases():
         return jsonify({'error': 'Failed to retrieve purchases'}), 500
 
 @purchases_bp.route('/register', methods=['POST'])
+@idempotency.idempotent
 def register_purchase():
     """Register a new purchase from frontend"""
     try:
-        data = request.get_json()
-
-        # Validate required fields
-        if not data or 'cart' not in data or 'user' not in data:
-            return jsonify({'error': 'Cart and user data are required'}), 400
+        data, errors = REGISTER_PURCHASE_SCHEMA.validate(request.get_json(silent=True))
+        if errors:
+            return error_response(errors, key='error')
 
         cart = data['cart']
         user = data['user']
 
-        if not cart or len(cart) == 0:
-            return jsonify({'error': 'Cart cannot be empty'}), 400
-
-        # Calculate total amount from cart
-        total_amount = sum(item.get('price', 0) * item.get('quantity', 1) for item in cart)
+        # Price the cart with catalog prices (client prices are ignored)
+        quote = pricing.price_cart(cart)
+        if quote['errors']:
+            return jsonify({'error': 'Invalid cart items', 'details': quote['errors']}), 400
 
-        # Generate purchase ID
-        purchase_id = generate_purchase_id()
-
-        # Ensure products have image_url
-        products = []
-        for item in cart:
-            product = dict(item)
-            if 'image' in product and 'image_url' not in product:
-                product['image_url'] = product['image']
-            products.append(product)
-
-        # Create purchase object
-        purchase = {
-            'id': purchase_id,
-            'user': user,  # User object from localStorage
-            'products': products,  # Cart items with image_url
-            'total_amount': total_amount,
-            'status': 'Pendiente',
-            'purchase_date': datetime.now().isoformat(),
-            'payment_proof': data.get('payment_proof', ''),
-            'bank_reference': data.get('bank_reference', '')
-        }
+        # Reserve stock for every cart line (all-or-nothing)
+        lines = cart_lines(quote['lines'])
+        try:
+            inventory.reserve(lines)
+        except InsufficientStockError as e:
+            return jsonify({'error': 'Insufficient stock', 'shortages': e.shortages}), 409
 
-        # Save to storage
-        purchases = _load_purchases()
-        purchases.append(purchase)
-        _save_purchases(purchases)
+        try:
+            total_amount = quote['total_usd']
+
+            # Line items keep only what was bought at which price; name and
+            # image come from the product version current at purchase time
+            versions = current_product_versions({line['product_id'] for line in quote['lines']})
+            products = [
+                {'product_id': line['product_id'], 'version': versions[line['product_id']],
+                 'quantity': line['quantity'], 'price': line['unit_price']}
+                for line in quote['lines']
+            ]
+
+            with purchases_lock:
+                # Generate purchase ID
+                purchase_id = generate_purchase_id()
+
+                # Create purchase object
+                purchase = {
+                    'id': purchase_id,
+                    'user': user,  # User object from localStorage
+                    'products': products,  # Normalized line items (LINE_ITEM_FIELDS)
+                    'subtotal': quote['subtotal'],
+                    'iva': quote['iva'],
+                    'total_amount': total_amount,
+                    'exchange_rate': quote['exchange_rate'],
+                    'total_ves': quote['total_ves'],
+                    'status': 'Pendiente',
+                    'purchase_date': datetime.now().isoformat(),
+                    'payment_proof': data['payment_proof'],
+                    'bank_reference': data['bank_reference'],
+                    'stock_reserved': True
+                }
+
+                # Save to storage
+                purchases = purchase_store.load()
+                purchases.append(purchase)
+                previous, version = _save_purchases(purchases, changed=[purchase])
+                purchase_events.publish('purchase_created', present_purchase(purchase), version)
+                customer_history.upsert(purchase, previous, version)
+        except Exception:
+            inventory.release(lines)
+            raise
 
         return jsonify({
             'success': True,
             'message': 'Purchase registered successfully',
             'purchase_id': purchase_id,
-            'total_amount': total_amount
+            'subtotal': quote['subtotal'],
+            'iva': quote['iva'],
+            'total_amount': total_amount,
+            'total_ves': quote['total_ves']
         }), 201
 
     except Exception as e:
         print(f"Error registering purchase: {e}")
         return jsonify({'error': 'Failed to register purchase'}), 500
 
+def customer_purchase_history(email):
+    """(purchases most recent first, lifetime stats) of one customer"""
+    customer_history.sync(purchase_store.version(), get_cached_purchases)
+    purchases, stats = customer_history.history(email)
+    return present_purchases(purchases), stats
+
+@purchases_bp.route('/history', methods=['GET'])
+def get_purchase_history():
+    """Purchase history and lifetime stats of the logged-in customer
+
+    Admins may pass ?email= to see any customer's history.
+    """
+    try:
+        if 'username' not in session:
+            return jsonify({'error': 'User not logged in'}), 401
+
+        email = session['username']
+        if request.args.get('email') and session.get('role') == 'admin':
+            email = request.args['email']
+
+        purchases, stats = customer_purchase_history(email)
+        return jsonify({'email': email, 'purchases': purchases, 'stats': stats}), 200
+    except Exception as e:
+        print(f"Error getting purchase history: {e}")
+        return jsonify({'error': 'Failed to retrieve purchase history'}), 500
+
+@async_views.view('purchases.get_purchase_history')
+async def get_purchase_history_async():
+    """ASGI mode: the index sync (partition reads) runs on the I/O executor"""
+    try:
+        if 'username' not in session:
+            return jsonify({'error': 'User not logged in'}), 401
+
+        email = session['username']
+        if request.args.get('email') and session.get('role') == 'admin':
+            email = request.args['email']
+
+        purchases, stats = await io_executor.run(customer_purchase_history, email)
+        return jsonify({'email': email, 'purchases': purchases, 'stats': stats}), 200
+    except ExecutorBusy:
+        raise
+    except Exception as e:
+        print(f"Error getting purchase history: {e}")
+        return jsonify({'error': 'Failed to retrieve purchase history'}), 500
+
 @purchases_bp.route('/user', methods=['GET'])
 def get_user_purchases():
     """Get purchases for the logged-in user"""
@@ -162,17 +401,38 @@ def get_user_purchases():
             conn.close()
             return jsonify(purchases), 200
         else:
-            # Fallback to JSON file
-            purchases = _load_purchases()
-            # Filter by user email
-            user_purchases = [p for p in purchases if p.get('user', {}).get('email') == user_email]
-            # Sort by date descending
-            user_purchases.sort(key=lambda x: x.get('purchase_date', ''), reverse=True)
+            # Fallback to JSON files: per-customer index, most recent first
+            user_purchases, _ = customer_purchase_history(user_email)
             return jsonify(user_purchases), 200
     except Exception as e:
         print(f"Error getting user purchases: {e}")
         return jsonify({'error': 'Failed to retrieve user purchases'}), 500
 
+@async_views.view('purchases.get_user_purchases')
+async def get_user_purchases_async():
+    """ASGI mode: MySQL and partition reads run on the I/O executor"""
+    try:
+        if 'username' not in session:
+            return jsonify({'error': 'User not logged in'}), 401
+
+        user_email = session['username']
+
+        conn = await io_executor.run(get_db_connection)
+        if conn:
+            purchases = await io_executor.run(
+                fetch_all, conn,
+                "SELECT * FROM purchases WHERE JSON_EXTRACT(user, '$.email') = %s ORDER BY purchase_date DESC",
+                (user_email,)
+            )
+            return jsonify(purchases), 200
+        user_purchases, _ = await io_executor.run(customer_purchase_history, user_email)
+        return jsonify(user_purchases), 200
+    except ExecutorBusy:
+        raise
+    except Exception as e:
+        print(f"Error getting user purchases: {e}")
+        return jsonify({'error': 'Failed to retrieve user purchases'}), 500
+
 @purchases_bp.route('/admin', methods=['GET'])
 def get_admin_purchases():
     """Get all purchases for admin"""
@@ -180,6 +440,9 @@ def get_admin_purchases():
         if 'role' not in session or session['role'] != 'admin':
             return jsonify({'error': 'Unauthorized'}), 403
 
+        # Position in the change feed before reading, so /events can resume from it
+        headers = {'X-Event-ID': purchase_events.event_id()}
+
         conn = get_db_connection()
         if conn:
             # If database is available, use it
@@ -188,47 +451,47 @@ def get_admin_purchases():
             purchases = cursor.fetchall()
             cursor.close()
             conn.close()
-            return jsonify(purchases), 200
+            return jsonify(purchases), 200, headers
         else:
             # Fallback to JSON file
-            purchases = _load_purchases()
+            purchases = present_purchases(get_cached_purchases())
             # Sort by date descending
             purchases.sort(key=lambda x: x.get('purchase_date', ''), reverse=True)
-            return jsonify(purchases), 200
+            return jsonify(purchases), 200, headers
     except Exception as e:
         print(f"Error getting admin purchases: {e}")
         return jsonify({'error': 'Failed to retrieve purchases'}), 500
 
 @purchases_bp.route('/', methods=['POST'])
+@idempotency.idempotent
 def create_purchase():
     """Create a new purchase"""
     try:
-        data = request.get_json()
-
-        # Validate required fields
-        required_fields = ['user_id', 'products', 'total_amount']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
+        data, errors = CREATE_PURCHASE_SCHEMA.validate(request.get_json(silent=True))
+        if errors:
+            return error_response(errors, key='error')
 
-        # Generate purchase ID
-        purchase_id = generate_purchase_id()
+        try:
+            products = _line_items(data['products'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        # Create purchase object
+        # Create purchase object (the id is assigned when it is stored)
         purchase = {
-            'id': purchase_id,
+            'id': None,
             'user': data['user'],  # User object with name, cedula, phone, email
-            'products': data['products'],  # Array of product objects
+            'products': products,  # Normalized line items (LINE_ITEM_FIELDS)
             'total_amount': data['total_amount'],
-            'status': data.get('status', 'Pendiente'),
-            'purchase_date': data.get('purchase_date', datetime.now().isoformat()),
-            'payment_proof': data.get('payment_proof', ''),
-            'bank_reference': data.get('bank_reference', '')
+            'status': data['status'],
+            'purchase_date': data['purchase_date'] or datetime.now().isoformat(),
+            'payment_proof': data['payment_proof'],
+            'bank_reference': data['bank_reference']
         }
 
         conn = get_db_connection()
         if conn:
             # If database is available, use it
+            purchase['id'] = generate_purchase_id()
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO purchases (id, user_id, products, total_amount, status, purchase_date, payment_proof, bank_reference)
@@ -246,16 +509,21 @@ def create_purchase():
             conn.commit()
             cursor.close()
             conn.close()
+            purchase_events.publish('purchase_created', present_purchase(purchase))
         else:
             # Fallback to JSON file
-            purchases = _load_purchases()
-            purchases.append(purchase)
-            _save_purchases(purchases)
+            with purchases_lock:
+                purchase['id'] = generate_purchase_id()
+                purchases = purchase_store.load()
+                purchases.append(purchase)
+                previous, version = _save_purchases(purchases, changed=[purchase])
+                purchase_events.publish('purchase_created', present_purchase(purchase), version)
+                customer_history.upsert(purchase, previous, version)
 
         return jsonify({
             'success': True,
             'message': 'Purchase created successfully',
-            'purchase': purchase
+            'purchase': present_purchase(purchase)
         }), 201
 
     except Exception as e:
@@ -278,16 +546,26 @@ def delete_purchase(purchase_id):
 
             if not deleted:
                 return jsonify({'error': 'Purchase not found'}), 404
+            purchase_events.publish('purchase_deleted', {'id': purchase_id})
         else:
             # Fallback to JSON file
-            purchases = _load_purchases()
-            initial_length = len(purchases)
-            purchases = [p for p in purchases if p['id'] != purchase_id]
+            with purchases_lock:
+                month = purchase_store.locate(purchase_id)
+                if month is None:
+                    return jsonify({'error': 'Purchase not found'}), 404
 
-            if len(purchases) == initial_length:
-                return jsonify({'error': 'Purchase not found'}), 404
+                purchases = purchase_store.load(month)
+                deleted = [p for p in purchases if p['id'] == purchase_id]
+                purchases = [p for p in purchases if p['id'] != purchase_id]
+
+                previous, version = _save_purchases(purchases, month, deleted=[purchase_id])
+                purchase_events.publish('purchase_deleted', {'id': purchase_id}, version)
+                customer_history.remove(purchase_id, previous, version)
 
-            _save_purchases(purchases)
+            # Return reserved stock to inventory
+            for purchase in deleted:
+                if purchase.get('stock_reserved'):
+                    inventory.release(cart_lines(purchase.get('products', [])))
 
         return jsonify({
             'success': True,
@@ -298,40 +576,52 @@ def delete_purchase(purchase_id):
         print(f"Error deleting purchase: {e}")
         return jsonify({'error': 'Failed to delete purchase'}), 500
 
+def _apply_status(purchase, new_status):
+    """Set a purchase status, keeping its stock reservation in sync
+
+    Cancelling releases reserved stock; reopening a cancelled purchase has to
+    reserve it again (raises InsufficientStockError if there is not enough).
+    """
+    if 'stock_reserved' in purchase:
+        lines = cart_lines(purchase.get('products', []))
+        if new_status == CANCELLED_STATUS and purchase['stock_reserved']:
+            inventory.release(lines)
+            purchase['stock_reserved'] = False
+        elif new_status != CANCELLED_STATUS and not purchase['stock_reserved']:
+            inventory.reserve(lines)
+            purchase['stock_reserved'] = True
+
+    purchase['status'] = new_status
+
 @purchases_bp.route('/update_status', methods=['PUT'])
 def update_purchase_status():
     """Update purchase status"""
     try:
-        # Parse JSON data manually
-        import json
-        raw_data = request.data.decode('utf-8')
-        print(f"Raw request data: '{raw_data}'")
-        try:
-            data = json.loads(raw_data)
-        except Exception as e:
-            print(f"JSON parse error: {e}")
-            return jsonify({'error': 'Invalid JSON data'}), 400
-
-        if not data or 'status' not in data or 'purchase_id' not in data:
-            return jsonify({'error': 'Status and purchase_id fields are required'}), 400
+        # The body is parsed as JSON whatever the Content-Type
+        data, errors = UPDATE_STATUS_SCHEMA.validate(request.get_json(force=True, silent=True))
+        if errors:
+            return error_response(errors, key='error')
 
         purchase_id = data['purchase_id']
         new_status = data['status']
 
         # Fallback to JSON file (since database connection fails)
-        purchases = _load_purchases()
-        purchase_found = False
+        with purchases_lock:
+            month = purchase_store.locate(purchase_id)
+            if month is None:
+                return jsonify({'error': 'Purchase not found'}), 404
 
-        for purchase in purchases:
-            if purchase['id'] == purchase_id:
-                purchase['status'] = new_status
-                purchase_found = True
-                break
+            purchases = purchase_store.load(month)
+            purchase = next(p for p in purchases if p['id'] == purchase_id)
 
-        if not purchase_found:
-            return jsonify({'error': 'Purchase not found'}), 404
+            try:
+                _apply_status(purchase, new_status)
+            except InsufficientStockError as e:
+                return jsonify({'error': 'Insufficient stock', 'shortages': e.shortages}), 409
 
-        _save_purchases(purchases)
+            previous, version = _save_purchases(purchases, month, changed=[purchase])
+            purchase_events.publish('status_changed', {'id': purchase_id, 'status': new_status}, version)
+            customer_history.upsert(purchase, previous, version)
 
         return jsonify({
             'success': True,
@@ -341,6 +631,240 @@ def update_purchase_status():
     except Exception as e:
         return jsonify({'error': f'Failed to update purchase status: {str(e)}'}), 500
 
+def _apply_status_updates(updates, on_change=None):
+    """Apply status updates in order, with one write per touched partition
+
+    Each update is {"purchase_id", "status"} plus an optional "expected_status"
+    (the change is refused if the purchase is no longer in that status).
+    `on_change(purchase, update)` may add fields to each changed purchase
+    before it is saved. Returns (results, number of purchases changed).
+    """
+    results = []
+    changed = []
+    with purchases_lock:
+        ids = [u.get('purchase_id') for u in updates if isinstance(u, dict)]
+        months = purchase_store.locate_many(ids)
+        # One copy and one id index per touched partition
+        partitions = {}
+        for month in set(months.values()):
+            purchases = purchase_store.load(month)
+            partitions[month] = (purchases, {p['id']: p for p in purchases})
+        dirty = set()
+
+        for update in updates:
+            purchase_id = update.get('purchase_id') if isinstance(update, dict) else None
+            new_status = update.get('status') if isinstance(update, dict) else None
+            result = {'purchase_id': purchase_id, 'status': new_status}
+            results.append(result)
+
+            if not purchase_id or not new_status:
+                result.update(ok=False, error='purchase_id and status are required')
+                continue
+            if new_status not in STATUS_TRANSITIONS:
+                result.update(ok=False, error='Unknown status')
+                continue
+            month = months.get(purchase_id)
+            if month is None:
+                result.update(ok=False, error='Purchase not found')
+                continue
+
+            purchase = partitions[month][1][purchase_id]
+            result['purchase'] = purchase
+            previous = purchase.get('status')
+            result['previous_status'] = previous
+            expected = update.get('expected_status')
+            if expected and previous != expected and previous != new_status:
+                result.update(ok=False, error=f'Purchase is no longer {expected} (now {previous})')
+                continue
+            if previous == new_status:
+                result.update(ok=True, changed=False)
+                continue
+            if previous in STATUS_TRANSITIONS and new_status not in STATUS_TRANSITIONS[previous]:
+                result.update(ok=False, error=f'Cannot change status from {previous} to {new_status}')
+                continue
+            try:
+                _apply_status(purchase, new_status)
+            except InsufficientStockError as e:
+                result.update(ok=False, error='Insufficient stock', shortages=e.shortages)
+                continue
+            if on_change is not None:
+                on_change(purchase, update)
+
+            result.update(ok=True, changed=True)
+            changed.append(result)
+            dirty.add(month)
+
+        previous = version = purchase_store.version()
+        for month in dirty:
+            _, version = _save_purchases(partitions[month][0], month,
+                                         changed=[r['purchase'] for r in changed if months[r['purchase_id']] == month])
+        if dirty:
+            for result in changed:
+                purchase_events.publish('status_changed',
+                                        {'id': result['purchase_id'], 'status': result['status']}, version)
+            customer_history.upsert_many([result['purchase'] for result in changed], previous, version)
+        for result in results:
+            result.pop('purchase', None)
+    return results, len(changed)
+
+@purchases_bp.route('/update_status/batch', methods=['PUT'])
+def update_purchase_status_batch():
+    """Update the status of many purchases in one request
+
+    Body: {"updates": [{"purchase_id": ..., "status": ...}, ...]}. Items are
+    applied in order and reported one by one; valid items are saved with a
+    single write per touched partition even if others fail.
+    """
+    try:
+        if 'role' not in session or session['role'] != 'admin':
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        data = request.get_json(silent=True) or {}
+        updates = data.get('updates')
+        if not isinstance(updates, list) or not updates:
+            return jsonify({'error': 'updates must be a non-empty list'}), 400
+        if len(updates) > MAX_BATCH_STATUS_UPDATES:
+            return jsonify({'error': f'At most {MAX_BATCH_STATUS_UPDATES} updates per request'}), 400
+
+        results, updated = _apply_status_updates(updates)
+
+        failed = sum(1 for r in results if not r['ok'])
+        return jsonify({
+            'success': failed == 0,
+            'updated': updated,
+            'failed': failed,
+            'results': results
+        }), 200
+
+    except Exception as e:
+        print(f"Error updating purchase statuses: {e}")
+        return jsonify({'error': 'Failed to update purchase statuses'}), 500
+
+# --- Bank statement reconciliation (see services/reconciliation.py) ---
+
+def _statement_amount(currency):
+    """Expected statement amount of a purchase in the statement currency (None if unknown)"""
+    def amount_of(purchase):
+        try:
+            if currency == 'USD':
+                return float(purchase['total_amount'])
+            if purchase.get('total_ves') is not None:
+                return float(purchase['total_ves'])
+            return round(float(purchase['total_amount']) * float(purchase['exchange_rate']), 2)
+        except (KeyError, TypeError, ValueError):
+            return None
+    return amount_of
+
+def _reconciled(purchase, match):
+    purchase['reconciliation'] = {
+        'reference': match.get('reference', ''),
+        'amount': match.get('amount'),
+        'kind': match.get('kind', ''),
+        'statement_date': match.get('date', ''),
+        'reconciled_at': datetime.now().isoformat()
+    }
+
+def _apply_reconciliation(matches, status):
+    """Apply reconciliation matches as one batch of status changes"""
+    updates = [{**match, 'status': match.get('status') or status, 'expected_status': RECONCILE_FROM_STATUS}
+               for match in matches if isinstance(match, dict)]
+    return _apply_status_updates(updates, on_change=_reconciled)
+
+@purchases_bp.route('/reconcile', methods=['POST'])
+def reconcile_statement():
+    """Match an uploaded bank statement (CSV) against the pending purchases
+
+    Form fields: file, currency (VES or USD), tolerance, status (proposed
+    status) and apply=1 to apply the matches right away. Without apply the
+    response only proposes the changes; /reconcile/apply applies them.
+    """
+    try:
+        if 'role' not in session or session['role'] != 'admin':
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'error': 'No statement file received'}), 400
+        currency = (request.form.get('currency') or Config.RECONCILE_CURRENCY).upper()
+        if currency not in Config.RECONCILE_TOLERANCE:
+            return jsonify({'error': f"currency must be one of: {', '.join(Config.RECONCILE_TOLERANCE)}"}), 400
+        try:
+            tolerance = float(request.form.get('tolerance') or Config.RECONCILE_TOLERANCE[currency])
+        except ValueError:
+            return jsonify({'error': 'tolerance must be a number'}), 400
+        status = request.form.get('status') or Config.RECONCILE_STATUS
+        if status not in STATUS_TRANSITIONS[RECONCILE_FROM_STATUS]:
+            return jsonify({'error': f'Cannot change status from {RECONCILE_FROM_STATUS} to {status}'}), 400
+
+        try:
+            rows, errors, ignored = read_statement(upload.stream)
+        except (ValueError, UnicodeDecodeError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        pending = [p for p in get_cached_purchases() if p.get('status') == RECONCILE_FROM_STATUS]
+        result = reconcile(rows, pending, _statement_amount(currency), abs(tolerance))
+        for match in result['matches']:
+            match['current_status'] = RECONCILE_FROM_STATUS
+            match['status'] = status
+
+        body = {
+            'success': True,
+            'currency': currency,
+            'tolerance': abs(tolerance),
+            'rows': len(rows),
+            'ignored_rows': ignored,
+            'pending_purchases': len(pending),
+            'matched': len(result['matches']),
+            'matches': result['matches'],
+            'unmatched': result['unmatched'],
+            'errors': errors,
+            'applied': False
+        }
+        if request.form.get('apply') in ('1', 'true') and result['matches']:
+            results, updated = _apply_reconciliation(result['matches'], status)
+            body.update(applied=True, updated=updated, results=results)
+        return jsonify(body), 200
+
+    except Exception as e:
+        print(f"Error reconciling statement: {e}")
+        return jsonify({'error': 'Failed to reconcile statement'}), 500
+
+@purchases_bp.route('/reconcile/apply', methods=['POST'])
+def apply_reconciliation():
+    """Apply reviewed reconciliation matches in one write per touched partition
+
+    Body: {"matches": [...], "status": ...}: the matches returned by /reconcile
+    (purchase_id plus reference/amount/kind, recorded on the purchase). A
+    purchase that is no longer pending is reported and left unchanged.
+    """
+    try:
+        if 'role' not in session or session['role'] != 'admin':
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        data = request.get_json(silent=True) or {}
+        matches = data.get('matches')
+        if not isinstance(matches, list) or not matches:
+            return jsonify({'error': 'matches must be a non-empty list'}), 400
+        if len(matches) > MAX_RECONCILE_MATCHES:
+            return jsonify({'error': f'At most {MAX_RECONCILE_MATCHES} matches per request'}), 400
+        status = data.get('status') or Config.RECONCILE_STATUS
+        if status not in STATUS_TRANSITIONS[RECONCILE_FROM_STATUS]:
+            return jsonify({'error': f'Cannot change status from {RECONCILE_FROM_STATUS} to {status}'}), 400
+
+        results, updated = _apply_reconciliation(matches, status)
+
+        failed = sum(1 for r in results if not r['ok'])
+        return jsonify({
+            'success': failed == 0,
+            'updated': updated,
+            'failed': failed,
+            'results': results
+        }), 200
+
+    except Exception as e:
+        print(f"Error applying reconciliation: {e}")
+        return jsonify({'error': 'Failed to apply reconciliation'}), 500
+
 @purchases_bp.route('/reports', methods=['GET'])
 def get_reports():
     """Get purchases filtered by date range for reports"""
@@ -377,8 +901,8 @@ def get_reports():
             cursor.close()
             conn.close()
         else:
-            # Fallback to JSON file
-            purchases = _load_purchases()
+            # Fallback to JSON files: only the partitions that overlap the range
+            purchases = _load_purchases(start_dt.date().isoformat(), end_dt.date().isoformat())
             # Filter by date range
             filtered_purchases = []
             for purchase in purchases:
@@ -390,7 +914,7 @@ def get_reports():
                             filtered_purchases.append(purchase)
                     except ValueError:
                         continue
-            purchases = filtered_purchases
+            purchases = present_purchases(filtered_purchases)
             # Sort by date descending
             purchases.sort(key=lambda x: x.get('purchase_date', ''), reverse=True)
 
@@ -398,4 +922,84 @@ def get_reports():
 
     except Exception as e:
         print(f"Error getting reports: {e}")
-        return jsonify({'error': 'Failed to retrieve reports'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to retrieve reports'}), 500
+
+@purchases_bp.route('/analytics', methods=['GET'])
+def get_analytics():
+    """Aggregate purchase line items: revenue, units and lines per group
+
+    Query params: group_by (product|category|client|status|week), start_date,
+    end_date (YYYY-MM-DD), status, top
+    """
+    try:
+        if 'role' not in session or session['role'] != 'admin':
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        group_by = request.args.get('group_by', 'product')
+        try:
+            start_date = request.args.get('start_date')
+            end_date = request.args.get('end_date')
+            start = datetime.fromisoformat(start_date).date() if start_date else None
+            end = datetime.fromisoformat(end_date).date() if end_date else None
+            top = int(request.args['top']) if request.args.get('top') else None
+        except ValueError:
+            return jsonify({'error': 'Invalid date or top. Use YYYY-MM-DD and an integer'}), 400
+
+        catalog = pricing.catalog_index()
+        # Version first: a write in between only makes the next query rescan
+        version = purchase_store.version()
+        purchase_snapshot.refresh(get_cached_purchases(), catalog, version)
+        try:
+            groups, summary = purchase_snapshot.aggregate(
+                group_by, start=start, end=end, status=request.args.get('status'),
+                top=top, catalog=catalog
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify({'group_by': group_by, 'groups': groups, 'summary': summary}), 200
+
+    except Exception as e:
+        print(f"Error getting analytics: {e}")
+        return jsonify({'error': 'Failed to compute analytics'}), 500
+
+def _sse(event_id, event_type, data):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {jsonio.dumps(data)}\n\n"
+
+@purchases_bp.route('/events', methods=['GET'])
+def purchase_event_stream():
+    """Server-Sent Events feed of purchase changes for the admin board
+
+    Resumes after the Last-Event-ID header (sent by EventSource on reconnect)
+    or the last_event_id query param (X-Event-ID of the /admin response).
+    """
+    if 'role' not in session or session['role'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    # Every open stream holds a worker thread: cap them per process
+    if not purchase_events.open_stream():
+        return jsonify({'error': 'Too many open event streams'}), 503, {'Retry-After': '30'}
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    cursor, reset = purchase_events.resume(last_event_id)
+
+    def generate(cursor):
+        yield f"retry: {Config.PURCHASE_EVENT_RETRY_MS}\n\n"
+        if reset:
+            yield _sse(purchase_events.event_id(cursor), RESET, {})
+        # Streams end after a while; EventSource reconnects with Last-Event-ID
+        deadline = time.monotonic() + Config.PURCHASE_EVENT_STREAM_TIMEOUT
+        while time.monotonic() < deadline:
+            events = purchase_events.wait(cursor, Config.PURCHASE_EVENT_HEARTBEAT)
+            if not events:
+                purchase_events.check_source(purchase_store.version())
+                yield ': keep-alive\n\n'
+                continue
+            for seq, event_type, data in events:
+                cursor = seq
+                yield _sse(purchase_events.event_id(seq), event_type, data)
+
+    response = Response(generate(cursor), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(purchase_events.close_stream)
+    return response
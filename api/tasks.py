@@ -0,0 +1,27 @@
+from flask import Blueprint, jsonify, request, session
+from services.tasks import tasks
+
+tasks_bp = Blueprint('tasks', __name__)
+
+# Estado de las tareas en segundo plano (ver services/tasks.py), solo para administradores
+
+@tasks_bp.route('/', methods=['GET'])
+def list_tasks():
+    # /api/tasks/?status=failed&name=resize_product_image&limit=50
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+    except ValueError:
+        return jsonify({'error': 'limit debe ser un entero'}), 400
+    recent = tasks.queue.recent(status=request.args.get('status'), name=request.args.get('name'), limit=limit)
+    return jsonify({'counts': tasks.queue.counts(), 'tasks': recent}), 200
+
+@tasks_bp.route('/<int:task_id>', methods=['GET'])
+def get_task(task_id):
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    task = tasks.status(task_id)
+    if task is None:
+        return jsonify({'error': 'Tarea no encontrada'}), 404
+    return jsonify(task), 200
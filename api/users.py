@@ -5,9 +5,28 @@ import json
 import os
 from threading import Lock
 import sys
+from functools import lru_cache
+from database import jsonio
+from database.cache import get_json_cache
+from services.client_directory import client_directory
+from api.validation import EMAIL_PATTERN, Field, Schema, error_response
 
 users_bp = Blueprint('users', __name__)
 
+# Roles válidos de un usuario ('client' y 'cliente' conviven en los datos)
+USER_ROLES = ('admin', 'client', 'cliente')
+
+# Datos editables de un usuario (ver api/validation.py)
+UPDATE_USER_SCHEMA = Schema(
+    Field('cedula', label='Cédula', max_length=20),
+    Field('first_name', label='Nombre', max_length=50),
+    Field('last_name', label='Apellido', max_length=50),
+    Field('email', label='Correo electrónico', max_length=255, pattern=EMAIL_PATTERN,
+          messages={'pattern': 'Formato de correo electrónico inválido'}),
+    Field('phone', label='Teléfono', max_length=20),
+    Field('role', label='Rol', choices=USER_ROLES)
+)
+
 # Lock para evitar corrupción de datos en escrituras concurrentes
 file_lock = Lock()
 
@@ -19,8 +38,12 @@ POSSIBLE_PATHS = [
     os.path.join('data', 'users.json')
 ]
 
+@lru_cache(maxsize=None)
 def get_users_file_path():
-    """Encuentra el archivo users.json en las ubicaciones posibles"""
+    """Encuentra el archivo users.json en las ubicaciones posibles.
+
+    Se resuelve en el primer uso (no al importar el módulo) y se memoriza.
+    """
     for path in POSSIBLE_PATHS:
         if os.path.exists(path):
             print(f"[DEBUG] Found users.json at: {path}", file=sys.stderr)
@@ -29,35 +52,34 @@ def get_users_file_path():
     print(f"[DEBUG] Using default path: {POSSIBLE_PATHS[0]}", file=sys.stderr)
     return POSSIBLE_PATHS[0]
 
-USERS_FILE = get_users_file_path()
-
 # ========================================
 # FUNCIONES AUXILIARES
 # ========================================
 
 def read_users():
     """Lee el archivo users.json de forma segura"""
+    users_file = get_users_file_path()
     try:
-        if not os.path.exists(USERS_FILE):
-            print(f"[DEBUG] File does not exist: {USERS_FILE}", file=sys.stderr)
+        if not os.path.exists(users_file):
+            print(f"[DEBUG] File does not exist: {users_file}", file=sys.stderr)
             # Crear directorio si no existe
-            os.makedirs(os.path.dirname(USERS_FILE), exist_ok=True)
+            os.makedirs(os.path.dirname(users_file), exist_ok=True)
             # Crear archivo vacío con array
-            with open(USERS_FILE, 'w', encoding='utf-8') as f:
-                json.dump([], f, ensure_ascii=False, indent=4)
+            with open(users_file, 'w', encoding='utf-8') as f:
+                jsonio.dump([], f)
             print("[DEBUG] Created empty users.json file", file=sys.stderr)
             return []
         
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = get_json_cache(users_file).load()
             
         # Handle both formats: {"users": [...]} or [...]
+        # Copia por registro para no modificar la caché compartida
         if isinstance(data, dict) and 'users' in data:
             print("[DEBUG] Loaded users from wrapped format {users: [...]}", file=sys.stderr)
-            return data['users']
+            return [dict(u) for u in data['users']]
         elif isinstance(data, list):
             print(f"[DEBUG] Datos recibidos del servidor: {len(data)} usuarios", file=sys.stderr)
-            return data
+            return [dict(u) for u in data]
         else:
             print(f"[WARNING] users.json tiene formato inesperado: {type(data)}", file=sys.stderr)
             return []
@@ -66,18 +88,30 @@ def read_users():
         print(f"[ERROR] Error al cargar JSON: {e}", file=sys.stderr)
         return []
     except Exception as e:
-        print(f"[ERROR] Error al leer {USERS_FILE}: {str(e)}", file=sys.stderr)
+        print(f"[ERROR] Error al leer {users_file}: {str(e)}", file=sys.stderr)
+        return []
+
+def get_cached_users():
+    """Lista compartida de usuarios en memoria (solo lectura)"""
+    try:
+        data = get_json_cache(get_users_file_path()).load(default=[])
+    except Exception as e:
+        print(f"[ERROR] Error al leer usuarios: {str(e)}", file=sys.stderr)
         return []
+    if isinstance(data, dict):
+        return data.get('users', [])
+    return data if isinstance(data, list) else []
 
 def write_users(users_data):
     """Escribe el archivo users.json de forma segura con mecanismo de respaldo"""
+    users_file = get_users_file_path()
     try:
         with file_lock:
             # Crear backup antes de escribir (solo si el archivo existe y no está vacío)
-            if os.path.exists(USERS_FILE) and os.path.getsize(USERS_FILE) > 0:
-                backup_file = USERS_FILE + '.backup'
+            if os.path.exists(users_file) and os.path.getsize(users_file) > 0:
+                backup_file = users_file + '.backup'
                 try:
-                    with open(USERS_FILE, 'r', encoding='utf-8') as f:
+                    with open(users_file, 'r', encoding='utf-8') as f:
                         backup_data = f.read()
                     with open(backup_file, 'w', encoding='utf-8') as f:
                         f.write(backup_data)
@@ -86,25 +120,26 @@ def write_users(users_data):
                     print(f"[WARNING] Could not create backup: {e}", file=sys.stderr)
             
             # Escribir nuevos datos primero a un archivo temporal
-            temp_file = USERS_FILE + '.tmp'
+            temp_file = users_file + '.tmp'
             with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(users_data, f, ensure_ascii=False, indent=4)
+                jsonio.dump(users_data, f)
             
             # Renombrar archivo temporal al archivo original (operación atómica)
-            os.replace(temp_file, USERS_FILE)
+            os.replace(temp_file, users_file)
+            get_json_cache(users_file).store(users_data)
             
             print("[DEBUG] Guardado exitoso en users.json", file=sys.stderr)
             return True
             
     except Exception as e:
-        print(f"[ERROR] Error al escribir {USERS_FILE}: {str(e)}", file=sys.stderr)
+        print(f"[ERROR] Error al escribir {users_file}: {str(e)}", file=sys.stderr)
         # Intentar restaurar desde backup si existe
-        backup_file = USERS_FILE + '.backup'
+        backup_file = users_file + '.backup'
         if os.path.exists(backup_file):
             try:
                 with open(backup_file, 'r', encoding='utf-8') as f:
                     backup_data = f.read()
-                with open(USERS_FILE, 'w', encoding='utf-8') as f:
+                with open(users_file, 'w', encoding='utf-8') as f:
                     f.write(backup_data)
                 print("[DEBUG] Restaurado desde backup después de error", file=sys.stderr)
             except:
@@ -119,62 +154,56 @@ def write_users(users_data):
 def get_users():
     """Obtiene todos los usuarios"""
     try:
-        users = read_users()
-        
-        # Asegurar que siempre retornamos un array
-        if not isinstance(users, list):
-            print(f"[WARNING] users.json no contiene un array. Retornando array vacío.", file=sys.stderr)
-            return jsonify([]), 200
-        
-        print(f"[DEBUG] Enviando {len(users)} usuarios al cliente", file=sys.stderr)
-        
-        # Filtrar datos sensibles antes de enviar
-        safe_users = []
-        for user in users:
-            safe_user = {
-                'cedula': user.get('cedula', ''),
-                'first_name': user.get('first_name', ''),
-                'last_name': user.get('last_name', ''),
-                'email': user.get('email', ''),
-                'phone': user.get('phone', ''),
-                'role': user.get('role', 'cliente')
-            }
-            safe_users.append(safe_user)
-        
-        return jsonify(safe_users), 200
+        # La proyección sin datos sensibles se mantiene en el directorio
+        # (services/client_directory.py); solo se reconstruye si el archivo cambió
+        client_directory.sync(get_cached_users())
+        return jsonify(client_directory.all()), 200
     except Exception as e:
         print(f"[ERROR] Error in get_users: {str(e)}", file=sys.stderr)
         return jsonify([]), 200  # Retornar array vacío en caso de error
 
+@users_bp.route('/directory', methods=['GET'])
+def get_directory():
+    """Directorio paginado con búsqueda por prefijo (nombre, correo o cédula)
+
+    Parámetros: q, field (name|email|cedula), role, page, per_page
+    """
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', 50)), 1), 200)
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "page y per_page deben ser números"
+        }), 400
+
+    client_directory.sync(get_cached_users())
+    items, total = client_directory.search(
+        query=request.args.get('q', ''),
+        field=request.args.get('field'),
+        role=request.args.get('role'),
+        page=page,
+        per_page=per_page
+    )
+    return jsonify({
+        "items": items,
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": (total + per_page - 1) // per_page
+    }), 200
+
 @users_bp.route('/update', methods=['POST'])
 def update_user():
     """Actualiza un usuario existente en users.json"""
     try:
-        # Obtener datos del request
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                "status": "error",
-                "message": "No se recibieron datos"
-            }), 400
-        
-        # Validar que se recibió la cédula (identificador único)
-        cedula = data.get('cedula')
-        if not cedula:
-            return jsonify({
-                "status": "error",
-                "message": "La cédula es requerida"
-            }), 400
-        
-        # Validar campos requeridos
-        required_fields = ['first_name', 'last_name', 'email', 'phone', 'role']
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({
-                    "status": "error",
-                    "message": f"El campo {field} es requerido"
-                }), 400
+        # Validar todos los campos antes de leer el archivo
+        data, errors = UPDATE_USER_SCHEMA.validate(request.get_json(silent=True))
+        if errors:
+            return error_response(errors, status="error")
+
+        # La cédula es el identificador único
+        cedula = data['cedula']
         
         # Leer usuarios actuales
         users = read_users()
@@ -204,6 +233,7 @@ def update_user():
         
         # Guardar cambios en el archivo
         if write_users(users):
+            client_directory.upsert(users[i], users)
             return jsonify({
                 "status": "success",
                 "message": "Usuario actualizado correctamente",
@@ -255,6 +285,7 @@ def delete_user(cedula):
         
         if len(users) < original_count:
             if write_users(users):
+                client_directory.remove(cedula, users)
                 return jsonify({
                     "status": "success",
                     "message": "Usuario eliminado correctamente"
@@ -0,0 +1,222 @@
+import math
+import re
+from datetime import datetime
+from flask import jsonify
+
+# Validación declarativa de los datos de entrada, compartida por los blueprints.
+#
+# Cada endpoint declara su esquema una vez, a nivel de módulo, como un Schema
+# de Field. Al crearse, el esquema se compila en una función de chequeo por
+# campo (patrones ya compilados, conversión de tipo y límites resueltos), así
+# que validar una petición no vuelve a interpretar la declaración.
+#
+# `validate()` recorre todos los campos en una sola pasada y junta los errores
+# como {campo: mensaje}; `error_response()` los devuelve con el formato común.
+# Los handlers validan antes de leer o escribir archivos: el tráfico inválido
+# se rechaza sin tocar el disco.
+
+EMAIL_PATTERN = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+ISO_DATE_PATTERN = r'\d{4}-\d{2}-\d{2}([T ].*)?'
+
+MESSAGES = {
+    'required': 'El campo {label} es requerido',
+    'type': '{label} tiene un tipo inválido',
+    'min_length': '{label} debe tener al menos {min_length} caracteres',
+    'max_length': '{label} debe tener máximo {max_length} caracteres',
+    'max_digits': '{label} debe tener máximo {max_digits} dígitos',
+    'pattern': '{label} tiene un formato inválido',
+    'choices': '{label} debe ser uno de: {choices}',
+    'min_value': '{label} debe ser mayor o igual a {min_value}',
+    'max_value': '{label} debe ser menor o igual a {max_value}',
+    'validator': '{label} no es válido'
+}
+
+TYPE_MESSAGES = {
+    str: '{label} debe ser texto',
+    int: '{label} debe ser un número entero',
+    float: '{label} debe ser un número',
+    list: '{label} debe ser una lista',
+    dict: '{label} debe ser un objeto'
+}
+
+
+def is_iso_date(value):
+    """True si es una fecha o fecha y hora ISO ('AAAA-MM-DD[THH:MM[:SS...]]') válida"""
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+# --- Conversión de tipos ---
+
+def _to_str(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise TypeError(value)
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise TypeError(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return int(value.strip())
+    raise ValueError(value)
+
+
+def _to_float(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise TypeError(value)
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(value)
+    return value
+
+
+def _expect(kind):
+    def convert(value):
+        if not isinstance(value, kind):
+            raise TypeError(value)
+        return value
+    return convert
+
+
+CONVERTERS = {
+    str: _to_str,
+    int: _to_int,
+    float: _to_float,
+    list: _expect(list),
+    dict: _expect(dict),
+    None: lambda value: value    # Cualquier valor, sin conversión
+}
+
+
+class Field:
+    """Declaración de un campo: tipo al que se convierte, obligatoriedad y límites
+
+    `source` es la clave en los datos recibidos (por defecto `name`); el valor
+    convertido se devuelve bajo `name`. `validator` es una función extra
+    (valor -> bool) que se aplica después de las demás reglas. `messages`
+    reemplaza los mensajes por regla ('required', 'type', 'max_length', 'pattern', ...).
+    """
+
+    def __init__(self, name, type=str, required=True, source=None, label=None, default=None,
+                 min_length=None, max_length=None, max_digits=None, pattern=None, choices=None,
+                 min_value=None, max_value=None, validator=None, messages=None):
+        self.name = name
+        self.type = type
+        self.required = required
+        self.source = source or name
+        self.label = label or name
+        self.default = default
+        self.min_length = min_length
+        self.max_length = max_length
+        self.max_digits = max_digits
+        self.pattern = pattern
+        self.choices = choices
+        self.min_value = min_value
+        self.max_value = max_value
+        self.validator = validator
+        self.messages = messages or {}
+
+    def _message(self, rule):
+        template = self.messages.get(rule)
+        if template is None:
+            template = TYPE_MESSAGES.get(self.type, MESSAGES['type']) if rule == 'type' else MESSAGES[rule]
+        choices = ', '.join(str(c) for c in self.choices) if self.choices else ''
+        return template.format(label=self.label, min_length=self.min_length, max_length=self.max_length,
+                               max_digits=self.max_digits, choices=choices,
+                               min_value=self.min_value, max_value=self.max_value)
+
+    def compile(self):
+        """Función check(data, values, errors, partial) con todo lo que no depende del valor resuelto"""
+        name, source, required, default = self.name, self.source, self.required, self.default
+        convert = CONVERTERS[self.type]
+        required_message, type_message = self._message('required'), self._message('type')
+
+        rules = []
+        if self.min_length is not None:
+            rules.append((lambda v, n=self.min_length: len(v) >= n, self._message('min_length')))
+        if self.max_length is not None:
+            rules.append((lambda v, n=self.max_length: len(v) <= n, self._message('max_length')))
+        if self.max_digits is not None:
+            rules.append((lambda v, n=self.max_digits: len(str(abs(v))) <= n, self._message('max_digits')))
+        if self.pattern is not None:
+            regex = re.compile(self.pattern)
+            rules.append((lambda v: regex.fullmatch(v) is not None, self._message('pattern')))
+        if self.choices is not None:
+            choices = frozenset(self.choices)
+            rules.append((lambda v: v in choices, self._message('choices')))
+        if self.min_value is not None:
+            rules.append((lambda v, n=self.min_value: v >= n, self._message('min_value')))
+        if self.max_value is not None:
+            rules.append((lambda v, n=self.max_value: v <= n, self._message('max_value')))
+        if self.validator is not None:
+            rules.append((self.validator, self._message('validator')))
+
+        def check(data, values, errors, partial):
+            value = data.get(source)
+            if value is None or value == '':
+                if partial:
+                    return
+                if required:
+                    errors[name] = required_message
+                else:
+                    values[name] = default
+                return
+            try:
+                value = convert(value)
+            except (TypeError, ValueError):
+                errors[name] = type_message
+                return
+            for ok, message in rules:
+                if not ok(value):
+                    errors[name] = message
+                    return
+            values[name] = value
+
+        return check
+
+
+class Schema:
+    """Conjunto de campos de un endpoint, compilado al crearse"""
+
+    def __init__(self, *fields):
+        self.fields = fields
+        self._checks = [field.compile() for field in fields]
+
+    def validate(self, data, partial=False):
+        """(valores convertidos, None) o (None, {campo: mensaje}) con todos los errores
+
+        Con `partial` solo se validan los campos presentes (actualizaciones parciales).
+        """
+        if not hasattr(data, 'get'):
+            return None, {'_body': 'Datos inválidos o ausentes'}
+        values, errors = {}, {}
+        for check in self._checks:
+            check(data, values, errors, partial)
+        if errors:
+            return None, errors
+        return values, None
+
+
+def first_error(errors):
+    return next(iter(errors.values()))
+
+
+def error_response(errors, key='message', **extra):
+    """400 con el formato común: `errors` ({campo: mensaje}) y el primer mensaje bajo `key`
+
+    `extra` agrega las claves propias del endpoint (p. ej. success=False).
+    """
+    body = dict(extra)
+    body[key] = first_error(errors)
+    body['errors'] = errors
+    return jsonify(body), 400
@@ -1,14 +1,29 @@
-import json
 import os
+import click
 from flask import Flask, render_template, request, redirect, url_for, jsonify, session
+from jinja2 import FileSystemBytecodeCache
 from config import Config
+from database import jsonio
 
-from api.auth import auth_bp
-from api.products import products_bp
-from api.billing import billing_bp
+from api.auth import auth_bp, load_users, get_users_snapshot
+from api.products import products_bp, get_cached_products, product_versions
+from api.billing import billing_bp, get_cached_billing_data
 from api.clients import clients_bp
-from api.purchases import purchases_bp
-from api.users import users_bp
+from api.purchases import (purchases_bp, purchase_store, get_cached_purchases, customer_purchase_history,
+                           migrate_line_items)
+from services.customer_history import customer_history
+from api.users import users_bp, read_users, get_cached_users
+from api.tasks import tasks_bp
+from api.bootstrap import bootstrap_bp
+from services.inventory import inventory
+from services.pricing import pricing
+from services.latest_sales import latest_sales
+from services.client_directory import client_directory
+from services.purchase_analytics import purchase_snapshot
+from services.compression import compressor
+from services.tasks import tasks
+from services.admission import admission
+from services.async_views import async_views, io_executor, executor_metrics
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 app.config.from_object(Config)
@@ -16,6 +31,22 @@ app.config.from_object(Config)
 # Configuración de sesiones/cookies seguras
 app.secret_key = app.config['SECRET_KEY']
 
+# Serialización de respuestas con orjson cuando está instalado
+app.json = jsonio.FastJSONProvider(app)
+
+# Compresión gzip/brotli de las respuestas grandes
+compressor.init_app(app)
+
+# Tareas en segundo plano: cada worker arranca su despachador con la primera petición
+tasks.init_app(app)
+
+# Límites de concurrencia de los endpoints caros y token bucket en autenticación
+admission.init_app(app)
+
+# Las plantillas compiladas se guardan en disco y se reutilizan entre reinicios
+os.makedirs(app.config['JINJA_CACHE_DIR'], exist_ok=True)
+app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(app.config['JINJA_CACHE_DIR'])}
+
 # Registro de Blueprints (Módulos API)
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(products_bp, url_prefix='/api/products')
@@ -23,8 +54,82 @@ app.register_blueprint(billing_bp, url_prefix='/api/billing')
 app.register_blueprint(clients_bp, url_prefix='/api/clients')
 app.register_blueprint(purchases_bp, url_prefix='/api/purchases')
 app.register_blueprint(users_bp, url_prefix='/api/users')
+app.register_blueprint(tasks_bp, url_prefix='/api/tasks')
+app.register_blueprint(bootstrap_bp, url_prefix='/api/bootstrap')
 print("Purchases blueprint registered")
 
+# --- Precalentamiento (ver wsgi.py) ---
+
+def warmup():
+    """Carga las cachés de datos y compila las plantillas antes de atender tráfico"""
+    # Dependencias que se importan de forma diferida en los módulos de la API
+    import bcrypt
+    import mysql.connector
+    product_versions.record(get_cached_products())
+    purchase_store.seal()
+    customer_history.sync(purchase_store.version(), get_cached_purchases)
+    read_users()
+    load_users()
+    get_users_snapshot()
+    inventory.load()
+    pricing.load()
+    pricing.exchange_rate()
+    latest_sales.rebuild(get_cached_billing_data())
+    client_directory.sync(get_cached_users())
+    version = purchase_store.version()
+    purchase_snapshot.refresh(get_cached_purchases(), pricing.catalog_index(), version)
+    for template_name in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(template_name)
+        except Exception as e:
+            print(f"[WARNING] No se pudo compilar {template_name}: {e}")
+    app.config['READY'] = True
+
+@app.cli.command('export-json')
+@click.option('--out', default='export', show_default=True, help='Carpeta de destino')
+def export_json(out):
+    """Exporta los archivos de datos con sangría, para leerlos o revisarlos"""
+    from api.billing import BILLING_DATA_FILE
+    from api.products import PRODUCTS_FILE
+    from api.purchases import PURCHASES_FILE
+    os.makedirs(out, exist_ok=True)
+    sources = [PRODUCTS_FILE, PURCHASES_FILE, BILLING_DATA_FILE, 'users.json',
+               os.path.join('static', 'data', 'users.json')]
+    for source in map(os.path.relpath, sources):
+        if not os.path.exists(source):
+            continue
+        with open(source, 'r', encoding='utf-8') as f:
+            data = jsonio.load(f)
+        target = os.path.join(out, source.replace(os.sep, '_'))
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write(jsonio.dumps(data, indent=4))
+        click.echo(f'{source} -> {target}')
+
+@app.cli.command('migrate-purchase-lines')
+@click.option('--dry-run', is_flag=True, help='Solo informa el resultado, sin escribir')
+def migrate_purchase_lines(dry_run):
+    """Convierte las copias del carrito guardadas en las compras en líneas normalizadas"""
+    summary = migrate_line_items(dry_run)
+    click.echo(f"{summary['purchases']} compras, {summary['lines']} líneas en {summary['partitions']} particiones"
+               f" ({summary['skipped']} líneas sin product_id se dejaron igual)")
+    if summary['bytes_before']:
+        click.echo(f"{summary['bytes_before']} -> {summary['bytes_after']} bytes en las particiones migradas")
+    if dry_run:
+        click.echo('Sin cambios (--dry-run)')
+
+@app.route('/api/ready')
+def ready():
+    # Readiness probe: 503 hasta que warmup() haya terminado
+    if not app.config.get('READY'):
+        return jsonify({"ready": False}), 503
+    return jsonify({"ready": True}), 200
+
+@app.route('/api/metrics')
+def metrics():
+    # Métricas de este worker: ocupación y colas de admisión, descartes y límites de tasa
+    # y, en modo ASGI, ocupación de los ejecutores acotados
+    return jsonify({"pid": os.getpid(), "admission": admission.metrics(), "executors": executor_metrics()}), 200
+
 # Error handlers to return JSON instead of HTML
 @app.errorhandler(404)
 def not_found(error):
@@ -39,16 +144,13 @@ def internal_error(error):
 @app.route('/')
 def index():
     # Load products for frontend display
-    products = []
-    if os.path.exists('products.json'):
-        with open('products.json', 'r', encoding='utf-8') as f:
-            all_products = json.load(f)
-            # Filter active products (for now, assume all are active since no status field)
-            products = [p for p in all_products if p.get('status', 'active') == 'active']
-            # Sort by ID descending for most recent
-            products.sort(key=lambda x: x['product_id'], reverse=True)
-            # Limit to, say, 6 products
-            products = products[:6]
+    all_products = get_cached_products()
+    # Filter active products (for now, assume all are active since no status field)
+    products = [p for p in all_products if p.get('status', 'active') == 'active']
+    # Sort by ID descending for most recent
+    products.sort(key=lambda x: x['product_id'], reverse=True)
+    # Limit to, say, 6 products
+    products = products[:6]
     return render_template('index.html', products=products)
 
 @app.route('/cart')
@@ -122,28 +224,30 @@ def api_my_purchases():
     if 'username' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     user_email = session.get('username')
-    purchases = []
-    if os.path.exists('purchases.json'):
-        with open('purchases.json', 'r', encoding='utf-8') as f:
-            all_purchases = json.load(f)
-            purchases = [p for p in all_purchases if p.get('user', {}).get('email') == user_email]
-            # Sort by most recent first
-            purchases.sort(key=lambda x: x.get('purchase_date', ''), reverse=True)
+    # Same per-customer index as /api/purchases/history (most recent first)
+    purchases, _ = customer_purchase_history(user_email)
+    return jsonify(purchases)
+
+@async_views.view('api_my_purchases')
+async def api_my_purchases_async():
+    # Modo ASGI: la sincronización del índice corre en el ejecutor de E/S
+    if 'username' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    purchases, _ = await io_executor.run(customer_purchase_history, session.get('username'))
     return jsonify(purchases)
 
 @app.route('/catalog')
 def catalog_page():
     # Load all products for catalog display
-    products = []
-    if os.path.exists('products.json'):
-        with open('products.json', 'r', encoding='utf-8') as f:
-            all_products = json.load(f)
-            # Filter active products
-            products = [p for p in all_products if p.get('status', 'active') == 'active']
-            # Sort by ID descending for most recent
-            products.sort(key=lambda x: x['product_id'], reverse=True)
+    all_products = get_cached_products()
+    # Filter active products
+    products = [p for p in all_products if p.get('status', 'active') == 'active']
+    # Sort by ID descending for most recent
+    products.sort(key=lambda x: x['product_id'], reverse=True)
     return render_template('catalog.html', products=products)
 
 if __name__ == '__main__':
     # Usar debug=True solo para desarrollo
+    # En producción usar: gunicorn -c gunicorn.conf.py wsgi:application
+    warmup()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,27 @@
+# asgi.py - Punto de entrada del modo asíncrono
+#
+#   uvicorn asgi:application --host 0.0.0.0 --port 5000
+#   gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:application
+#
+# Los endpoints con variante asíncrona (catálogo, tasa de cambio, login y
+# estado de sesión, historial de compras) se atienden en el event loop y
+# esperan el trabajo bloqueante en ejecutores acotados; el resto de las vistas
+# corre en un pool de hilos (ver services/asgi.py). Así un proceso sostiene
+# muchas conexiones lentas o simultáneas sin agotar sus hilos.
+
+import gc
+
+from app import app, warmup
+from config import Config
+from services.admission import admission
+from services.asgi import AsgiAdapter
+
+warmup()
+
+# Las peticiones en cola de admisión esperan en el pool de hilos del adaptador
+admission.resize(Config.ASGI_WSGI_THREADS)
+
+# Igual que en wsgi.py: los objetos ya cargados no los recorre el GC
+gc.freeze()
+
+application = AsgiAdapter(app)
@@ -1,6 +1,129 @@
+import os
+
 class Config:
     SECRET_KEY = 'tu_clave_secreta_aqui' # Sujeto a cambios
     MYSQL_HOST = 'localhost'
     MYSQL_USER = 'root'
     MYSQL_PASSWORD = 'tu_password'
-    MYSQL_DB = 'inversiones_moto_suarez'
\ No newline at end of file
+    MYSQL_DB = 'inversiones_moto_suarez'
+
+    # Caché de bytecode de las plantillas Jinja (acelera los reinicios)
+    JINJA_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.jinja_cache')
+
+    # Instantáneas compartidas (mmap) del catálogo y del índice de usuarios
+    SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.snapshots')
+
+    # Meses cerrados de compras, sellados en archivos gzip (ver database/purchase_store.py)
+    PURCHASE_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'purchases_archive')
+
+    # Versiones de nombre/imagen/categoría de los productos, usadas para mostrar
+    # las líneas de las compras (ver database/product_versions.py)
+    PRODUCT_VERSIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'product_versions.json')
+
+    # Inventario (ver services/inventory.py): contadores de stock compartidos
+    # por los workers y segundos entre escrituras por lotes del stock a products.json
+    INVENTORY_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.inventory', 'stock.sqlite3')
+    INVENTORY_FLUSH_INTERVAL = 2.0
+
+    # Locks entre procesos (workers de gunicorn) de los ciclos leer-modificar-escribir
+    # de los archivos de datos (ver database/file_lock.py)
+    LOCK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.locks')
+    PRODUCTS_LOCK_FILE = os.path.join(LOCK_DIR, 'products.lock')
+    PURCHASES_LOCK_FILE = os.path.join(LOCK_DIR, 'purchases.lock')
+    BILLING_LOCK_FILE = os.path.join(LOCK_DIR, 'billing.lock')
+
+    # Precios: IVA aplicado en el servidor y vigencia (segundos) de la tasa USD -> VES cacheada
+    IVA_RATE = 0.16
+    EXCHANGE_RATE_TTL = 3600
+
+    # Cantidad de facturas que muestra 'Últimas ventas' en el panel
+    LATEST_SALES_SIZE = 10
+
+    # Archivos de datos JSON sin sangría (más chicos y rápidos de leer/escribir).
+    # `flask export-json` genera copias legibles; JSON_STORAGE_COMPACT=0 lo desactiva
+    JSON_STORAGE_COMPACT = os.environ.get('JSON_STORAGE_COMPACT', '1') != '0'
+
+    # Compresión de respuestas (gzip/brotli) según Accept-Encoding
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1') != '0'
+    COMPRESSION_MIN_SIZE = 1024
+    COMPRESSION_MIMETYPES = ('application/json', 'text/html', 'text/css', 'text/plain',
+                             'text/javascript', 'application/javascript', 'image/svg+xml')
+    # Bytes máximos de cuerpos comprimidos cacheados por ETag
+    COMPRESSION_CACHE_BYTES = 32 * 1024 * 1024
+
+    # Canal SSE de compras del panel: eventos guardados para reconexión,
+    # conexiones abiertas por proceso y tiempos (segundos) de cada conexión
+    PURCHASE_EVENT_LOG_SIZE = 1000
+    PURCHASE_EVENT_MAX_STREAMS = 4
+    PURCHASE_EVENT_STREAM_TIMEOUT = 300
+    PURCHASE_EVENT_HEARTBEAT = 15
+    PURCHASE_EVENT_RETRY_MS = 3000
+
+    # Tareas en segundo plano (ver services/tasks.py): cola SQLite, hilos por
+    # worker, segundos entre revisiones de la cola y de vigencia de una toma,
+    # reintentos con espera exponencial y segundos que se conservan las terminadas
+    TASK_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.tasks', 'tasks.sqlite3')
+    TASK_WORKERS = int(os.environ.get('TASK_WORKERS', 2))
+    TASK_POLL_INTERVAL = 1.0
+    TASK_LEASE = 300
+    TASK_MAX_ATTEMPTS = 5
+    TASK_RETRY_BASE = 2.0
+    TASK_RETRY_MAX = 300
+    TASK_RETENTION = 24 * 3600
+
+    # Lado mayor (px) de las imágenes de productos; las más grandes se reducen en segundo plano
+    PRODUCT_IMAGE_MAX_SIZE = 1024
+
+    # Control de admisión por proceso (ver services/admission.py). Por clase de
+    # endpoints: peticiones en ejecución y en cola como fracción de los hilos
+    # del worker, segundos máximos en cola y Retry-After (segundos) del 503
+    # cuando está saturada. Una petición en cola también ocupa un hilo: entre
+    # todas las clases nunca toman más que los hilos que deja libres
+    # ADMISSION_FREE_SHARE (fracción reservada para el resto de las rutas)
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') != '0'
+    ADMISSION_FREE_SHARE = 0.5
+    ADMISSION_CLASSES = {
+        'auth': {
+            'endpoints': ('auth.login', 'auth.register', 'clients.register_client'),
+            'limit': 0.25, 'queue': 0.125, 'timeout': 2.0, 'retry_after': 2
+        },
+        'reports': {
+            'endpoints': ('purchases.get_reports', 'purchases.get_analytics', 'billing.import_billing',
+                          'billing.invoice_purchases', 'purchases.reconcile_statement'),
+            'limit': 0.125, 'queue': 0.0625, 'timeout': 5.0, 'retry_after': 10
+        }
+    }
+
+    # Hilos por worker gthread de gunicorn (misma variable que gunicorn.conf.py)
+    GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 8))
+
+    # Token bucket de las rutas de autenticación: (ráfaga, fichas por segundo)
+    AUTH_RATE_LIMITED_ENDPOINTS = ('auth.login', 'auth.register')
+    AUTH_RATE_LIMIT_IP = (30, 0.5)
+    AUTH_RATE_LIMIT_EMAIL = (10, 1 / 30)
+    RATE_LIMIT_MAX_KEYS = 10000
+
+    # Conciliación con el extracto bancario (ver services/reconciliation.py):
+    # moneda del extracto, tolerancia de monto por moneda y estado propuesto
+    # para las compras conciliadas
+    RECONCILE_CURRENCY = 'VES'
+    RECONCILE_TOLERANCE = {'VES': 5.0, 'USD': 0.05}
+    RECONCILE_STATUS = 'Completada'
+
+    # Modo ASGI (ver asgi.py): hilos para las vistas síncronas y ejecutores
+    # acotados (hilos, cola máxima) del trabajo bloqueante de las variantes
+    # asíncronas; con la cola llena se responde 503 con ASGI_RETRY_AFTER
+    ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 16))
+    ASGI_IO_WORKERS = int(os.environ.get('ASGI_IO_WORKERS', 8))
+    ASGI_IO_QUEUE = 256
+    ASGI_BCRYPT_WORKERS = int(os.environ.get('ASGI_BCRYPT_WORKERS', 4))
+    ASGI_BCRYPT_QUEUE = 32
+    ASGI_RETRY_AFTER = 2
+
+    # Claves de idempotencia (ver services/idempotency.py): respuestas guardadas
+    # en SQLite durante IDEMPOTENCY_TTL segundos; una petición en curso reserva
+    # su clave como máximo IDEMPOTENCY_LOCK_TIMEOUT segundos
+    IDEMPOTENCY_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.idempotency', 'keys.sqlite3')
+    IDEMPOTENCY_TTL = 24 * 3600
+    IDEMPOTENCY_LOCK_TIMEOUT = 60
+    IDEMPOTENCY_PURGE_INTERVAL = 600
@@ -0,0 +1,73 @@
+import gzip
+import os
+from threading import Lock
+
+from database import jsonio
+
+# Caché en memoria de los archivos JSON usados como almacenamiento.
+# Cada entrada se invalida sola cuando cambia el inodo, el mtime o el tamaño del
+# archivo, de modo que una escritura hecha por otro proceso se detecta en la
+# siguiente lectura. Las escrituras atómicas (os.replace) siempre cambian el
+# inodo, aunque el mtime no avance (resolución del reloj) y el tamaño coincida.
+
+_caches = {}
+_registry_lock = Lock()
+
+
+class JsonFileCache:
+    """Contenido parseado de un archivo JSON, recargado solo si el archivo cambia"""
+
+    def __init__(self, path, compressed=False):
+        self.path = path
+        self.compressed = compressed
+        self._lock = Lock()
+        self._stamp = None
+        self._data = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def load(self, default=None):
+        """Devuelve los datos compartidos (solo lectura) o `default` si el archivo no existe"""
+        stamp = self._stat()
+        if stamp is None:
+            return default
+        if stamp == self._stamp:
+            return self._data
+        with self._lock:
+            if stamp != self._stamp:
+                opener = gzip.open if self.compressed else open
+                with opener(self.path, 'rt', encoding='utf-8') as f:
+                    self._data = jsonio.load(f)
+                self._stamp = stamp
+        return self._data
+
+    def store(self, data):
+        """Registra los datos recién escritos para no tener que volver a parsearlos"""
+        with self._lock:
+            self._data = data
+            self._stamp = self._stat()
+
+    @property
+    def stamp(self):
+        """Sello (inodo, mtime, tamaño) de los datos cargados o registrados"""
+        return self._stamp
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+            self._stamp = None
+
+
+def get_json_cache(path, compressed=False):
+    """Obtiene (o crea) la caché asociada a una ruta de archivo (gzip si `compressed`)"""
+    key = os.path.abspath(path)
+    cache = _caches.get(key)
+    if cache is None:
+        with _registry_lock:
+            cache = _caches.setdefault(key, JsonFileCache(key, compressed))
+    return cache
@@ -1,7 +1,9 @@
-import mysql.connector
 from config import Config
 
 def get_db_connection():
+    # Importación diferida: mysql.connector es costoso de importar y solo se
+    # necesita cuando realmente se intenta abrir una conexión
+    import mysql.connector
     try:
         conn = mysql.connector.connect(
             host=Config.MYSQL_HOST,
@@ -12,4 +14,14 @@ def get_db_connection():
         return conn
     except mysql.connector.Error as err:
         print(f"Error al conectar a MySQL: {err}")
-        return None
\ No newline at end of file
+        return None
+def fetch_all(conn, query, params=()):
+    """Filas (dict) de una consulta; cierra la conexión (para correr en un ejecutor)"""
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    finally:
+        conn.close()
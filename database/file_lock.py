@@ -0,0 +1,45 @@
+import os
+from threading import RLock
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo exclusión entre hilos del mismo proceso
+    fcntl = None
+
+# Lock de un archivo de datos entre hilos y entre procesos (workers de gunicorn).
+#
+# Reentrante dentro del mismo hilo: el flock del archivo de lock se toma solo
+# en la adquisición más externa y se suelta al salir de ella.
+
+
+class FileLock:
+    def __init__(self, path):
+        self.path = path
+        self._lock = RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            if self._depth == 0 and fcntl is not None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._file = open(self.path, 'a')
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+        except Exception:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._lock.release()
+            raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
+        return False
@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+# Respuestas guardadas por clave de idempotencia (SQLite, ver services/idempotency.py).
+#
+# Una clave pasa por 'pending' (la petición original se está ejecutando) y
+# 'done' (respuesta guardada hasta `expires_at`). La reserva se hace en una
+# transacción IMMEDIATE, así que dos reintentos simultáneos, aunque lleguen a
+# workers distintos, no ejecutan la escritura dos veces. Si el proceso muere
+# con la clave en 'pending', la reserva vence en `locked_until` y un
+# reintento puede tomarla.
+
+NEW = 'new'
+REPLAY = 'replay'
+IN_PROGRESS = 'in_progress'
+MISMATCH = 'mismatch'
+
+PENDING = 'pending'
+DONE = 'done'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    state TEXT NOT NULL,
+    status INTEGER,
+    body BLOB,
+    mimetype TEXT,
+    locked_until REAL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_expires ON idempotency_keys (expires_at);
+"""
+
+
+class IdempotencyStore:
+    def __init__(self, path):
+        self.path = path
+        self._ready = False
+
+    def _connect(self):
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._ready:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            self._ready = True
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def begin(self, key, fingerprint, lock_timeout, ttl):
+        """Reserva la clave: (NEW, None), (REPLAY, respuesta), (IN_PROGRESS, None) o (MISMATCH, None)"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT * FROM idempotency_keys WHERE key = ?', (key,)).fetchone()
+                takeover = row is None or row['expires_at'] < now or (
+                    row['state'] == PENDING and row['locked_until'] < now)
+                if not takeover:
+                    conn.execute('COMMIT')
+                    if row['fingerprint'] != fingerprint:
+                        return MISMATCH, None
+                    if row['state'] == PENDING:
+                        return IN_PROGRESS, None
+                    return REPLAY, {'status': row['status'], 'body': row['body'], 'mimetype': row['mimetype']}
+                conn.execute(
+                    'INSERT OR REPLACE INTO idempotency_keys (key, fingerprint, state, locked_until, expires_at)'
+                    ' VALUES (?, ?, ?, ?, ?)',
+                    (key, fingerprint, PENDING, now + lock_timeout, now + ttl)
+                )
+                conn.execute('COMMIT')
+                return NEW, None
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def complete(self, key, status, body, mimetype, ttl):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                'UPDATE idempotency_keys SET state = ?, status = ?, body = ?, mimetype = ?, locked_until = NULL,'
+                ' expires_at = ? WHERE key = ?',
+                (DONE, status, body, mimetype, time.time() + ttl, key)
+            )
+
+    def release(self, key):
+        """Libera una reserva sin respuesta guardada (el reintento vuelve a ejecutar)"""
+        with closing(self._connect()) as conn:
+            conn.execute('DELETE FROM idempotency_keys WHERE key = ? AND state = ?', (key, PENDING))
+
+    def purge(self):
+        with closing(self._connect()) as conn:
+            return conn.execute('DELETE FROM idempotency_keys WHERE expires_at < ?', (time.time(),)).rowcount
@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+
+from flask.json.provider import DefaultJSONProvider
+
+from config import Config
+
+# Codificación JSON de la aplicación: respuestas de la API y archivos de datos.
+#
+# Si orjson está instalado se usa para serializar y parsear (varias veces más
+# rápido que el módulo json); si no, se usa el módulo estándar. En disco los
+# archivos se escriben compactos cuando Config.JSON_STORAGE_COMPACT está activo;
+# `flask export-json` genera copias con sangría para leerlas o revisarlas.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_COMPACT_SEPARATORS = (',', ':')
+
+
+def loads(data):
+    """Parsea un documento JSON (str o bytes)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj, indent=None):
+    """Serializa a str; sin `indent` el resultado es compacto"""
+    if orjson is not None:
+        # orjson solo admite sangría de 2 espacios
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option).decode('utf-8')
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=indent)
+    return json.dumps(obj, ensure_ascii=False, separators=_COMPACT_SEPARATORS)
+
+
+def load(f):
+    return loads(f.read())
+
+
+def dump(obj, f, indent=4):
+    """Escribe un archivo de datos: compacto, o con `indent` si el modo compacto está desactivado"""
+    f.write(dumps(obj, indent=None if Config.JSON_STORAGE_COMPACT else indent))
+
+
+def dump_atomic(obj, path, indent=4, opener=open):
+    """Escribe un archivo de datos completo sin que nadie lo vea a medias
+
+    Se escribe en un temporal junto al archivo y se reemplaza con os.replace:
+    si el proceso muere a mitad de la escritura queda el archivo anterior.
+    El temporal es propio del proceso y del hilo: dos hilos de un worker
+    gthread que escriben el mismo archivo no se pisan. `opener` permite
+    escribir comprimido (gzip.open).
+    """
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with opener(temp_path, 'wt', encoding='utf-8') as f:
+            dump(obj, f, indent)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Proveedor de app.json que usa orjson cuando está disponible"""
+
+    def dumps(self, obj, **kwargs):
+        # Flask pasa `separators` (salida compacta) o `indent`; otras opciones van al módulo json
+        if orjson is None or set(kwargs) - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        # Las fechas pasan por `default` para conservar el formato HTTP de Flask
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
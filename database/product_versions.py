@@ -0,0 +1,147 @@
+from threading import Lock
+
+from database import jsonio
+from database.cache import get_json_cache
+
+# Versiones de los datos de presentación de cada producto.
+#
+# Las líneas de una compra guardan solo product_id, versión, cantidad y precio
+# (el precio es el cobrado, no el del catálogo). El nombre, la imagen y la
+# categoría se resuelven aquí por (product_id, versión) al listar, así que un
+# producto renombrado o eliminado sigue mostrándose como era al comprarlo.
+#
+# Cada vez que se guarda el catálogo, `record()` agrega una versión a los
+# productos cuyos campos de presentación cambiaron; las versiones no se borran
+# aunque el producto se elimine. La migración de compras viejas agrega además
+# versiones históricas (`versions_for`) con los datos que traía cada compra.
+#
+# Formato: {"products": {"<product_id>": {"current": n, "versions": [campos, ...]}}}
+# (la versión n es versions[n - 1]).
+
+DISPLAY_FIELDS = ('name', 'image_url', 'category')
+EMPTY = {'products': {}}
+
+
+def display_fields(item):
+    """Campos de presentación de un producto o de un ítem de carrito ('image' cuenta como image_url)"""
+    fields = {field: item[field] for field in DISPLAY_FIELDS if item.get(field) not in (None, '')}
+    if 'image_url' not in fields and item.get('image'):
+        fields['image_url'] = item['image']
+    return fields
+
+
+def _matches(version, fields):
+    return all(version.get(field) == value for field, value in fields.items())
+
+
+class ProductVersionStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+
+    def _entries(self):
+        return get_json_cache(self.path).load(default=EMPTY)['products']
+
+    def _write(self, entries):
+        data = {'products': entries}
+        jsonio.dump_atomic(data, self.path)
+        get_json_cache(self.path).store(data)
+
+    # --- Lectura ---
+
+    def current(self, product_id):
+        """Versión vigente del producto (None si nunca se registró)"""
+        entry = self._entries().get(str(product_id))
+        return entry['current'] if entry is not None else None
+
+    def get(self, product_id, version=None):
+        """Campos de presentación de una versión (la vigente si no se indica); None si no existe"""
+        entry = self._entries().get(str(product_id))
+        if entry is None:
+            return None
+        version = version or entry['current']
+        if not 1 <= version <= len(entry['versions']):
+            return None
+        return entry['versions'][version - 1]
+
+    def expand(self, lines):
+        """Líneas de compra con sus campos de presentación, sin modificar las originales
+
+        Los campos guardados en la línea (compras todavía sin migrar) tienen prioridad.
+        """
+        entries = self._entries()
+        expanded = []
+        for line in lines:
+            entry = entries.get(str(line.get('product_id')))
+            fields = None
+            if entry is not None:
+                version = line.get('version') or entry['current']
+                if 1 <= version <= len(entry['versions']):
+                    fields = entry['versions'][version - 1]
+            expanded.append({**fields, **line} if fields else line)
+        return expanded
+
+    # --- Escritura ---
+
+    def record(self, products):
+        """Versión nueva para cada producto del catálogo cuyos campos cambiaron
+
+        Escribe solo si algo cambió (las escrituras de stock no agregan versiones).
+        Devuelve la cantidad de productos con versión nueva.
+        """
+        with self._lock:
+            entries = self._entries()
+            changed = {}
+            for product in products:
+                key = str(product['product_id'])
+                fields = display_fields(product)
+                entry = entries.get(key)
+                if entry is not None and entry['versions'][entry['current'] - 1] == fields:
+                    continue
+                versions = list(entry['versions']) if entry is not None else []
+                # Si vuelve a datos de una versión anterior, se reutiliza esa versión
+                if fields in versions:
+                    current = versions.index(fields) + 1
+                else:
+                    versions.append(fields)
+                    current = len(versions)
+                changed[key] = {'current': current, 'versions': versions}
+            if changed:
+                self._write({**entries, **changed})
+            return len(changed)
+
+    def versions_for(self, items):
+        """Versión de cada (product_id, campos) dado, agregando versiones históricas si faltan
+
+        Se prefiere la vigente si coincide con los campos dados (sin campos, la
+        vigente). Las versiones nuevas no cambian la vigente, salvo para
+        productos que no estaban registrados. Una sola escritura para todo el lote.
+        """
+        with self._lock:
+            entries = self._entries()
+            changed = {}
+            result = []
+            for product_id, fields in items:
+                key = str(product_id)
+                entry = changed.get(key) or entries.get(key)
+                if entry is not None:
+                    versions = entry['versions']
+                    if _matches(versions[entry['current'] - 1], fields):
+                        result.append(entry['current'])
+                        continue
+                    match = next((n for n, version in enumerate(versions, 1) if _matches(version, fields)), None)
+                    if match is not None:
+                        result.append(match)
+                        continue
+                if not fields:
+                    result.append(None)
+                    continue
+                if entry is None:
+                    entry = {'current': 1, 'versions': [fields]}
+                else:
+                    entry = {'current': entry['current'], 'versions': entry['versions'] + [fields]}
+                changed[key] = entry
+                result.append(len(entry['versions']))
+            if changed:
+                self._write({**entries, **changed})
+            return result
@@ -0,0 +1,252 @@
+import gzip
+import os
+import re
+from datetime import date
+from threading import Lock, RLock
+
+from database import jsonio
+from database.cache import get_json_cache
+
+# Almacenamiento de compras particionado por mes.
+#
+# - purchases.json (partición abierta) guarda las compras de los meses que
+#   todavía no se cerraron: normalmente solo el mes en curso, así que las
+#   operaciones del día a día leen y escriben un archivo chico.
+# - Al cambiar de mes, las compras de meses cerrados se sellan en
+#   <archivo>/AAAA-MM.json.gz, que no se modifican en el lugar: un cambio
+#   posterior (estado, eliminación) reescribe el archivo completo y lo
+#   reemplaza con os.replace.
+# - <archivo>/index.json tiene un resumen por partición (rango de fechas,
+#   cantidad, total, mayor número de id) para abrir solo las particiones que
+#   se cruzan con el rango pedido y generar ids sin leer el historial.
+#
+# `lock` serializa las escrituras entre workers (database/file_lock.py): quien
+# lee una partición para modificarla debe tomarlo antes de leer y soltarlo
+# después de guardar; save() y seal() también lo toman (es reentrante), así
+# que el sellado nunca reescribe la abierta con una copia que no tiene las
+# compras que otro worker acaba de agregar.
+
+INDEX_FILE = 'index.json'
+EMPTY_INDEX = {'partitions': {}}
+
+MONTH_PATTERN = re.compile(r'\d{4}-(0[1-9]|1[0-2])')
+
+
+def purchase_month(purchase):
+    """'AAAA-MM' de la fecha de compra ('' si no tiene fecha o no es una fecha ISO)
+
+    Las compras con '' se quedan en la partición abierta: una fecha como
+    '15/03/2024' no puede convertirse en el nombre de una partición.
+    """
+    value = str(purchase.get('purchase_date') or '')
+    month = value[:7]
+    if not MONTH_PATTERN.fullmatch(month) or value[7:8] not in ('', '-'):
+        return ''
+    return month
+
+
+def id_number(purchase_id):
+    """Número de un id como 'PUR-2024-015' (0 si no tiene ese formato)"""
+    try:
+        parts = str(purchase_id).split('-')
+        return int(parts[2]) if len(parts) >= 3 else 0
+    except ValueError:
+        return 0
+
+
+def _summary(file_name, purchases):
+    dates = [str(p.get('purchase_date') or '') for p in purchases]
+    return {
+        'file': file_name,
+        'count': len(purchases),
+        'first_date': min(dates)[:10],
+        'last_date': max(dates)[:10],
+        'total_amount': round(sum(float(p.get('total_amount') or 0) for p in purchases), 2),
+        'max_id_number': max((id_number(p.get('id')) for p in purchases), default=0)
+    }
+
+
+def _write_atomic(path, data, compressed=False):
+    jsonio.dump_atomic(data, path, opener=gzip.open if compressed else open)
+
+
+class PurchaseStore:
+    def __init__(self, hot_file, archive_dir, lock=None):
+        self.hot_file = hot_file
+        self.archive_dir = archive_dir
+        self.lock = lock if lock is not None else RLock()
+        self.index_file = os.path.join(archive_dir, INDEX_FILE)
+        self._lock = Lock()
+        self._all = None
+        self._all_sources = (None, None)
+        self._open_month = None
+
+    # --- Lectura ---
+
+    def hot(self):
+        """Compras de la partición abierta (compartidas, solo lectura)"""
+        return get_json_cache(self.hot_file).load(default=[])
+
+    def index(self):
+        """{mes: resumen} de las particiones selladas"""
+        return get_json_cache(self.index_file).load(default=EMPTY_INDEX)['partitions']
+
+    def partition(self, month):
+        entry = self.index().get(month)
+        if entry is None:
+            return []
+        path = os.path.join(self.archive_dir, entry['file'])
+        return get_json_cache(path, compressed=True).load(default=[])
+
+    def months_between(self, start=None, end=None):
+        """Meses sellados cuyo rango de fechas se cruza con [start, end] (fechas ISO)"""
+        return sorted(
+            month for month, entry in self.index().items()
+            if (start is None or entry['last_date'] >= start)
+            and (end is None or entry['first_date'] <= end)
+        )
+
+    def query(self, start=None, end=None):
+        """Compras de las particiones que se cruzan con el rango, más la abierta
+
+        No filtra por fecha: quien llama aplica el filtro exacto.
+        """
+        purchases = []
+        for month in self.months_between(start, end):
+            purchases.extend(self.partition(month))
+        purchases.extend(self.hot())
+        return purchases
+
+    def all(self):
+        """Todo el historial; la lista se reutiliza mientras nada cambie"""
+        hot, index = self.hot(), self.index()
+        if self._all is None or self._all_sources[0] is not hot or self._all_sources[1] is not index:
+            with self._lock:
+                if self._all is None or self._all_sources[0] is not hot or self._all_sources[1] is not index:
+                    # Sin particiones selladas la lista es la abierta tal cual
+                    self._all = self.query() if index else hot
+                    self._all_sources = (hot, index)
+        return self._all
+
+    def version(self):
+        """Sello de los datos: cambia con cualquier escritura, de este u otro proceso"""
+        self.hot()
+        self.index()
+        return (get_json_cache(self.hot_file).stamp, get_json_cache(self.index_file).stamp)
+
+    def locate(self, purchase_id):
+        """Mes de la partición que contiene la compra ('' = abierta) o None"""
+        if any(p.get('id') == purchase_id for p in self.hot()):
+            return ''
+        # Las más recientes primero: son las que más se modifican
+        for month in sorted(self.index(), reverse=True):
+            if any(p.get('id') == purchase_id for p in self.partition(month)):
+                return month
+        return None
+
+    def locate_many(self, purchase_ids):
+        """{id: mes} de varias compras en una pasada por partición (las no encontradas se omiten)"""
+        pending = set(purchase_ids)
+        found = {}
+        for month in [''] + sorted(self.index(), reverse=True):
+            if not pending:
+                break
+            for purchase in (self.hot() if month == '' else self.partition(month)):
+                purchase_id = purchase.get('id')
+                if purchase_id in pending:
+                    found[purchase_id] = month
+                    pending.discard(purchase_id)
+        return found
+
+    def load(self, month=''):
+        """Copia por registro de una partición ('' = abierta), para modificarla"""
+        source = self.hot() if month == '' else self.partition(month)
+        return [dict(p) for p in source]
+
+    def max_id_number(self):
+        archived = max((entry.get('max_id_number', 0) for entry in self.index().values()), default=0)
+        return max(archived, max((id_number(p.get('id')) for p in self.hot()), default=0))
+
+    # --- Escritura ---
+
+    def save(self, purchases, month=''):
+        """Guarda una partición completa ('' = abierta)"""
+        with self.lock:
+            self._save(purchases, month)
+
+    def _save(self, purchases, month):
+        if month == '':
+            _write_atomic(self.hot_file, purchases)
+            get_json_cache(self.hot_file).store(purchases)
+            return
+        if not MONTH_PATTERN.fullmatch(month):
+            raise ValueError(f'Partición inválida: {month!r}')
+        index = {m: dict(entry) for m, entry in self.index().items()}
+        entry = index.get(month)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        file_name = f'{month}.json.gz'
+        path = os.path.join(self.archive_dir, file_name)
+        if purchases:
+            _write_atomic(path, purchases, compressed=True)
+            get_json_cache(path, compressed=True).store(purchases)
+            index[month] = _summary(file_name, purchases)
+        elif entry is not None:
+            del index[month]
+        self._save_index(index)
+        if not purchases and entry is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _save_index(self, partitions):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        data = {'partitions': partitions}
+        _write_atomic(self.index_file, data)
+        get_json_cache(self.index_file).store(data)
+
+    def seal(self, today=None):
+        """Mueve las compras de meses cerrados de la partición abierta a su archivo sellado
+
+        Devuelve los meses sellados. Las compras sin fecha ISO quedan en la abierta.
+        """
+        with self.lock:
+            return self._seal(today)
+
+    def _seal(self, today):
+        current = (today or date.today()).strftime('%Y-%m')
+        hot = self.hot()
+        closed = {}
+        keep = []
+        for purchase in hot:
+            month = purchase_month(purchase)
+            if month and month < current:
+                closed.setdefault(month, []).append(purchase)
+            else:
+                keep.append(purchase)
+        if not closed:
+            self._open_month = current
+            return []
+        # Primero los archivos sellados y el índice; luego se quita de la abierta.
+        # Si algo falla a mitad de camino, a lo sumo la compra queda en ambos
+        # lados y el próximo sellado la reemplaza (por id) en lugar de duplicarla.
+        for month, purchases in closed.items():
+            ids = {p.get('id') for p in purchases}
+            merged = [p for p in self.partition(month) if p.get('id') not in ids] + purchases
+            merged.sort(key=lambda p: str(p.get('purchase_date') or ''))
+            self._save(merged, month)
+        self._save(keep, '')
+        self._open_month = current
+        return sorted(closed)
+
+    def open_month_changed(self, today=None):
+        """True la primera vez que se llama en un mes nuevo (hay que sellar)
+
+        Barato de llamar en cada escritura; el sellado lo hace quien llama.
+        """
+        current = (today or date.today()).strftime('%Y-%m')
+        if current == self._open_month:
+            return False
+        self._open_month = current
+        return True
+
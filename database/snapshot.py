@@ -0,0 +1,189 @@
+import glob
+import mmap
+import os
+import struct
+import time
+from threading import Lock
+
+from config import Config
+from database import jsonio
+
+# Instantáneas binarias de solo lectura compartidas entre procesos.
+#
+# Quien escribe un archivo de datos publica una versión nueva e inmutable
+# (<nombre>-<versión>.snap) y luego cambia el puntero <nombre>.current con
+# os.replace, que es atómico. Cada worker mapea la versión vigente con mmap:
+# las páginas las comparte el sistema operativo, así que la memoria no crece
+# con la cantidad de workers, y un cambio llega a todos sin volver a parsear
+# el JSON. Una búsqueda por clave es una búsqueda binaria sobre la tabla de
+# índices y solo decodifica el registro encontrado.
+#
+# Formato: cabecera | claves | tabla de índices (ordenada por clave) | cuerpo.
+# El cuerpo es el arreglo JSON completo, y cada registro es un tramo de él,
+# de modo que el listado se puede enviar tal cual.
+
+MAGIC = b'SNAP0001'
+HEADER = struct.Struct('<8sQqqQQQ')   # magic, versión, mtime_ns y tamaño del origen, registros, tabla, cuerpo
+ENTRY = struct.Struct('<QIQI')        # offset y largo de la clave, offset y largo del registro
+
+# Versiones anteriores que se conservan (un worker puede seguir leyéndolas)
+KEEP_VERSIONS = 3
+
+MISSING_SOURCE = (0, -1)
+
+
+def _source_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return MISSING_SOURCE
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _key_bytes(key):
+    return str(key).encode('utf-8')
+
+
+class Snapshot:
+    """Una versión publicada, mapeada en memoria"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, mtime_ns, size, self._count, self._table, self._body = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f'{path} no es una instantánea válida')
+        self.source_stamp = (mtime_ns, size)
+
+    def __len__(self):
+        return self._count
+
+    def _entry(self, position):
+        return ENTRY.unpack_from(self._mm, self._table + position * ENTRY.size)
+
+    def _key_at(self, position):
+        key_offset, key_length, _, _ = self._entry(position)
+        return self._mm[key_offset:key_offset + key_length]
+
+    def _record_at(self, position):
+        _, _, offset, length = self._entry(position)
+        return jsonio.loads(self._mm[offset:offset + length])
+
+    def get_all(self, key):
+        """Todos los registros con la clave dada (las claves pueden repetirse)"""
+        wanted = _key_bytes(key)
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < wanted:
+                lo = mid + 1
+            else:
+                hi = mid
+        matches = []
+        while lo < self._count and self._key_at(lo) == wanted:
+            matches.append(self._record_at(lo))
+            lo += 1
+        return matches
+
+    def get(self, key, default=None):
+        matches = self.get_all(key)
+        return matches[0] if matches else default
+
+    def body(self):
+        """Arreglo JSON con todos los registros, en el orden original (sin copia)"""
+        return memoryview(self._mm)[self._body:]
+
+    def records(self):
+        return jsonio.loads(bytes(self.body()))
+
+
+def _encode(records, key, version, stamp):
+    chunks = [jsonio.dumps(record).encode('utf-8') for record in records]
+    keys = [_key_bytes(key(record)) for record in records]
+
+    keys_offset = HEADER.size
+    table_offset = keys_offset + sum(len(k) for k in keys)
+    body_offset = table_offset + ENTRY.size * len(records)
+
+    entries = []
+    key_position, record_position = keys_offset, body_offset + 1  # después de '['
+    for key_value, chunk in zip(keys, chunks):
+        entries.append((key_value, key_position, len(key_value), record_position, len(chunk)))
+        key_position += len(key_value)
+        record_position += len(chunk) + 1  # ','
+    entries.sort()
+
+    out = bytearray(HEADER.pack(MAGIC, version, stamp[0], stamp[1], len(records), table_offset, body_offset))
+    out += b''.join(keys)
+    for _, key_offset, key_length, record_offset, record_length in entries:
+        out += ENTRY.pack(key_offset, key_length, record_offset, record_length)
+    out += b'[' + b','.join(chunks) + b']'
+    return out
+
+
+class SharedSnapshot:
+    """Publicación y lectura de las versiones de una instantánea con nombre"""
+
+    def __init__(self, name, key, directory=None):
+        self.name = name
+        self.key = key
+        self.directory = directory or Config.SNAPSHOT_DIR
+        self._pointer = os.path.join(self.directory, f'{name}.current')
+        self._lock = Lock()
+        self._pointer_stamp = None
+        self._snapshot = None
+
+    def publish(self, records, source_path, stamp=None):
+        """Escribe una versión nueva y cambia el puntero de forma atómica"""
+        if stamp is None:
+            stamp = _source_stamp(source_path)
+        os.makedirs(self.directory, exist_ok=True)
+        version = time.time_ns()
+        file_name = f'{self.name}-{version}-{os.getpid()}.snap'
+        path = os.path.join(self.directory, file_name)
+        with open(path, 'wb') as f:
+            f.write(_encode(records, self.key, version, stamp))
+        temp_pointer = f'{self._pointer}.{os.getpid()}.tmp'
+        with open(temp_pointer, 'w', encoding='utf-8') as f:
+            f.write(file_name)
+        os.replace(temp_pointer, self._pointer)
+        self._cleanup()
+        return self._open_current()
+
+    def _cleanup(self):
+        versions = sorted(glob.glob(os.path.join(self.directory, f'{self.name}-*.snap')),
+                          key=lambda p: int(os.path.basename(p).rsplit('-', 2)[1]), reverse=True)
+        for old in versions[KEEP_VERSIONS:]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass  # En Windows no se puede borrar mientras otro proceso la tenga mapeada
+
+    def _open_current(self):
+        try:
+            st = os.stat(self._pointer)
+        except OSError:
+            return None
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self._pointer_stamp:
+            return self._snapshot
+        with self._lock:
+            if stamp != self._pointer_stamp:
+                try:
+                    with open(self._pointer, 'r', encoding='utf-8') as f:
+                        file_name = f.read().strip()
+                    self._snapshot = Snapshot(os.path.join(self.directory, file_name))
+                except (OSError, ValueError, struct.error):
+                    return None
+                self._pointer_stamp = stamp
+        return self._snapshot
+
+    def current(self, source_path, loader):
+        """Versión vigente; si el archivo de origen cambió se vuelve a publicar con `loader()`"""
+        snapshot = self._open_current()
+        stamp = _source_stamp(source_path)
+        if snapshot is None or snapshot.source_stamp != stamp:
+            # El sello se toma antes de leer: si el archivo cambia mientras
+            # tanto, la próxima llamada vuelve a publicar
+            snapshot = self.publish(loader(), source_path, stamp=stamp)
+        return snapshot
@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import threading
+
+# Contadores de stock compartidos por todos los workers (SQLite, ver services/inventory.py).
+#
+# Cada línea de una reserva es un UPDATE condicional en autocommit
+# (`quantity >= ?`), sin una transacción que abarque el carrito: SQLite toma su
+# lock de escritura solo mientras dura esa sentencia, así que las reservas de
+# productos distintos no se esperan más que un UPDATE, y dos workers que venden
+# la misma última unidad se serializan en ella y solo uno la obtiene. Si alguna
+# línea no alcanza, las ya descontadas se devuelven (todo-o-nada por
+# compensación). Mientras tanto otra reserva puede ver ese stock descontado y
+# ser rechazada: el error es siempre hacia no vender, nunca hacia sobrevender.
+#
+# Cada hilo reutiliza su conexión (los PRAGMA se aplican una vez); tras un
+# fork el proceso hijo abre las suyas.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock (
+    product_id INTEGER PRIMARY KEY,
+    quantity INTEGER NOT NULL
+);
+"""
+
+
+class StockStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def seed(self, quantities):
+        """Agrega los productos que todavía no tienen contador ({product_id: cantidad})"""
+        conn = self._connect()
+        # Una sola transacción para todo el catálogo (solo al arrancar o recargar)
+        conn.execute('BEGIN')
+        try:
+            conn.executemany('INSERT OR IGNORE INTO stock (product_id, quantity) VALUES (?, ?)',
+                             list(quantities.items()))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get(self, product_id):
+        row = self._connect().execute('SELECT quantity FROM stock WHERE product_id = ?', (product_id,)).fetchone()
+        return row[0] if row else None
+
+    def all(self):
+        """{product_id: cantidad} de todos los productos"""
+        return dict(self._connect().execute('SELECT product_id, quantity FROM stock'))
+
+    def set(self, product_id, quantity):
+        self._connect().execute('INSERT OR REPLACE INTO stock (product_id, quantity) VALUES (?, ?)',
+                                (product_id, quantity))
+
+    def remove(self, product_id):
+        self._connect().execute('DELETE FROM stock WHERE product_id = ?', (product_id,))
+
+    def reserve(self, lines):
+        """Descuenta todas las líneas ({product_id: cantidad}) o ninguna; devuelve los faltantes"""
+        conn = self._connect()
+        reserved = {}
+        shortages = []
+        try:
+            for product_id in sorted(lines):
+                quantity = lines[product_id]
+                updated = conn.execute(
+                    'UPDATE stock SET quantity = quantity - ? WHERE product_id = ? AND quantity >= ?',
+                    (quantity, product_id, quantity)
+                ).rowcount
+                if updated:
+                    reserved[product_id] = quantity
+                    continue
+                row = conn.execute('SELECT quantity FROM stock WHERE product_id = ?', (product_id,)).fetchone()
+                shortages.append({'product_id': product_id, 'requested': quantity,
+                                  'available': row[0] if row else 0})
+        except Exception:
+            self.release(reserved)
+            raise
+        if shortages:
+            self.release(reserved)
+        return shortages
+
+    def release(self, lines):
+        """Devuelve las líneas al stock (los productos eliminados no se reponen)"""
+        self._connect().executemany('UPDATE stock SET quantity = quantity + ? WHERE product_id = ?',
+                                    [(quantity, product_id) for product_id, quantity in sorted(lines.items())])
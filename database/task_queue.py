@@ -0,0 +1,193 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from database import jsonio
+
+# Cola de tareas persistente en SQLite (ver services/tasks.py).
+#
+# Cada tarea es una fila con su nombre, argumentos (JSON) y estado:
+# 'queued' -> 'running' -> 'done' | 'failed'. Los workers la toman con una
+# transacción IMMEDIATE, así que dos procesos no ejecutan la misma tarea; la
+# toma dura `lease` segundos y, si el proceso muere a mitad de camino, la tarea
+# vuelve a estar disponible cuando vence. Los reintentos vuelven a 'queued' con
+# una hora de ejecución (run_at) posterior.
+#
+# - `key` agrupa tareas equivalentes: si ya hay una en cola con la misma clave
+#   no se agrega otra (p. ej. sellar las compras del mes cerrado).
+# - Toda tarea la puede tomar cualquier worker. El trabajo sobre cachés en
+#   memoria de un worker no pasa por la cola (lo resuelve el propio proceso).
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    key TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    locked_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_due ON tasks (status, run_at);
+CREATE INDEX IF NOT EXISTS tasks_key ON tasks (key, status);
+"""
+
+COLUMNS = ('id', 'name', 'key', 'status', 'attempts', 'max_attempts',
+           'run_at', 'created_at', 'updated_at', 'last_error')
+
+
+def _task(row):
+    task = {column: row[column] for column in COLUMNS}
+    task['payload'] = jsonio.loads(row['payload'])
+    task['result'] = jsonio.loads(row['result']) if row['result'] else None
+    return task
+
+
+class TaskQueue:
+    def __init__(self, path):
+        self.path = path
+        self._ready = False
+
+    def _connect(self):
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # Autocommit: las transacciones se abren explícitamente con BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._ready:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            self._ready = True
+        # Con WAL, NORMAL no sincroniza el disco en cada commit: encolar es barato
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    # --- Escritura ---
+
+    def enqueue(self, name, payload, max_attempts, key=None, delay=0):
+        """Id de la tarea encolada (o de la que ya estaba en cola con la misma clave)"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if key is not None:
+                    row = conn.execute(
+                        'SELECT id FROM tasks WHERE key = ? AND status = ?',
+                        (key, QUEUED)
+                    ).fetchone()
+                    if row is not None:
+                        conn.execute('COMMIT')
+                        return row['id']
+                cursor = conn.execute(
+                    'INSERT INTO tasks (name, payload, key, status, max_attempts, run_at, created_at, updated_at)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (name, jsonio.dumps(payload), key, QUEUED, max_attempts, now + delay, now, now)
+                )
+                conn.execute('COMMIT')
+                return cursor.lastrowid
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def claim(self, limit, lease):
+        """Toma hasta `limit` tareas vencidas (en cola o con la toma expirada)"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    'SELECT * FROM tasks'
+                    ' WHERE (status = ? AND run_at <= ?) OR (status = ? AND locked_until < ?)'
+                    ' ORDER BY run_at, id LIMIT ?',
+                    (QUEUED, now, RUNNING, now, limit)
+                ).fetchall()
+                for row in rows:
+                    conn.execute(
+                        'UPDATE tasks SET status = ?, attempts = attempts + 1, locked_until = ?, updated_at = ?'
+                        ' WHERE id = ?',
+                        (RUNNING, now + lease, now, row['id'])
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        tasks = [_task(row) for row in rows]
+        for task in tasks:
+            task['attempts'] += 1
+        return tasks
+
+    def complete(self, task_id, result=None):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                'UPDATE tasks SET status = ?, result = ?, last_error = NULL, locked_until = NULL, updated_at = ?'
+                ' WHERE id = ?',
+                (DONE, jsonio.dumps(result) if result is not None else None, time.time(), task_id)
+            )
+
+    def fail(self, task_id, error, retry_delay=None):
+        """Marca el error; con `retry_delay` la tarea vuelve a la cola, sin él queda 'failed'"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            if retry_delay is None:
+                conn.execute(
+                    'UPDATE tasks SET status = ?, last_error = ?, locked_until = NULL, updated_at = ? WHERE id = ?',
+                    (FAILED, error, now, task_id)
+                )
+            else:
+                conn.execute(
+                    'UPDATE tasks SET status = ?, last_error = ?, run_at = ?, locked_until = NULL, updated_at = ?'
+                    ' WHERE id = ?',
+                    (QUEUED, error, now + retry_delay, now, task_id)
+                )
+
+    def purge(self, older_than):
+        """Borra las tareas terminadas hace más de `older_than` segundos"""
+        cutoff = time.time() - older_than
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                'DELETE FROM tasks WHERE updated_at < ? AND status IN (?, ?)',
+                (cutoff, DONE, FAILED)
+            )
+            return cursor.rowcount
+
+    # --- Consultas ---
+
+    def get(self, task_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        return _task(row) if row is not None else None
+
+    def counts(self):
+        """{estado: cantidad}"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT status, COUNT(*) AS total FROM tasks GROUP BY status').fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update({row['status']: row['total'] for row in rows})
+        return counts
+
+    def recent(self, status=None, name=None, limit=50):
+        """Últimas tareas actualizadas, opcionalmente filtradas por estado y nombre"""
+        query, params = 'SELECT * FROM tasks WHERE 1 = 1', []
+        if status:
+            query += ' AND status = ?'
+            params.append(status)
+        if name:
+            query += ' AND name = ?'
+            params.append(name)
+        query += ' ORDER BY updated_at DESC, id DESC LIMIT ?'
+        params.append(limit)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [_task(row) for row in rows]
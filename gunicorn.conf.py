@@ -0,0 +1,27 @@
+# gunicorn.conf.py - Configuración del servidor de producción
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# Cargar la app (y precalentar cachés) en el maestro antes de crear los workers
+preload_app = True
+
+# bcrypt libera el GIL mientras calcula el hash, así que varios hilos por worker
+# atienden logins/registros en paralelo sin bloquear el resto de peticiones
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+# Config.GUNICORN_THREADS lee la misma variable: los cupos del control de
+# admisión se calculan con este valor (ver config.py)
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Reciclar workers periódicamente (con jitter para que no reinicien a la vez)
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
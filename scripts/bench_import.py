@@ -0,0 +1,76 @@
+"""Benchmark del tiempo de importación de app.py basado en `python -X importtime`.
+
+Uso:
+    python scripts/bench_import.py [--runs 5] [--budget-ms 250] [--top 15]
+
+Termina con código 1 si la mediana supera el presupuesto o si alguna de las
+dependencias que deben cargarse de forma diferida aparece al importar la app.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Presupuesto por defecto para `import app` (cumulativo, en milisegundos)
+DEFAULT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 250))
+
+# Módulos que no deben importarse al arrancar (se cargan en el primer uso)
+LAZY_MODULES = ('mysql.connector', 'bcrypt')
+
+LINE_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def run_once():
+    """Importa app en un proceso limpio y devuelve {módulo: (self_us, cumulativo_us)}"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit('Error al importar app')
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    totals = [r['app'][1] / 1000 for r in runs if 'app' in r]
+    median_ms = statistics.median(totals)
+    best = runs[totals.index(min(totals))]
+
+    print(f"import app: mediana {median_ms:.1f} ms, mínimo {min(totals):.1f} ms "
+          f"({args.runs} ejecuciones, presupuesto {args.budget_ms:.0f} ms)")
+    print(f"\nTop {args.top} módulos por tiempo acumulado (mejor ejecución):")
+    ranked = sorted(best.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative_us) in ranked[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {self_us / 1000:7.1f} ms  {name}")
+
+    failed = False
+    eager = [m for m in LAZY_MODULES if m in best]
+    if eager:
+        print(f"\nFALLO: se importan al arrancar: {', '.join(eager)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"\nFALLO: {median_ms:.1f} ms supera el presupuesto de {args.budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import math
+import time
+from collections import OrderedDict
+from threading import Condition, Lock
+
+from flask import g, jsonify, request
+
+from config import Config
+
+# Control de admisión para los endpoints caros.
+#
+# Cada clase de endpoints (bcrypt en autenticación, recorridos completos en
+# reportes) tiene un máximo de peticiones en ejecución y una cola corta: si
+# está llena, o la espera supera `timeout`, se responde 503 con Retry-After.
+# Una petición en cola espera en su propio hilo, así que los cupos (en
+# ejecución + en cola) se calculan como fracción de los hilos del worker y
+# entre todas las clases dejan libre una parte fija (ver class_slots): una
+# ráfaga de logins o de reportes no toma todos los hilos y el catálogo sigue
+# respondiendo. Los límites son por proceso (cada worker tiene los suyos).
+#
+# Además, las rutas de autenticación pasan por un limitador token bucket por
+# IP y por email (429 con Retry-After al agotarse).
+
+
+def class_slots(classes, threads, free_share):
+    """{clase: (en ejecución, en cola)} para un worker con `threads` hilos
+
+    Cada clase recibe sus fracciones de los hilos (`limit`, `queue`). Si entre
+    todas superan los hilos que no se reservan con `free_share`, se recortan
+    primero las colas y luego los límites, siempre la clase con más cupos
+    (cada clase conserva al menos una petición en ejecución).
+    """
+    budget = max(threads - math.ceil(threads * free_share), len(classes))
+    slots = {name: [max(1, int(threads * spec['limit'])), int(threads * spec['queue'])]
+             for name, spec in classes.items()}
+    for position, minimum in ((1, 0), (0, 1)):   # colas, luego límites
+        while sum(map(sum, slots.values())) > budget:
+            name = max(slots, key=lambda n: slots[n][position])
+            if slots[name][position] <= minimum:
+                break
+            slots[name][position] -= 1
+    return {name: tuple(values) for name, values in slots.items()}
+
+
+class AdmissionClass:
+    def __init__(self, name, limit, queue, timeout, retry_after):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._cond = Condition()
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    def acquire(self):
+        """True si la petición puede ejecutarse; False si se descarta"""
+        with self._cond:
+            if self.running < self.limit and not self.waiting:
+                self.running += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.queue:
+                self.shed += 1
+                return False
+            self.waiting += 1
+            try:
+                admitted = self._cond.wait_for(lambda: self.running < self.limit, self.timeout)
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                self.timed_out += 1
+                return False
+            self.running += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.running -= 1
+            self._cond.notify_all()
+
+    def resize(self, limit, queue):
+        with self._cond:
+            self.limit = limit
+            self.queue = queue
+            self._cond.notify_all()
+
+    def metrics(self):
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'queue_size': self.queue,
+                'running': self.running,
+                'queue_depth': self.waiting,
+                'admitted': self.admitted,
+                'shed': self.shed,
+                'timed_out': self.timed_out
+            }
+
+
+class TokenBucketLimiter:
+    """Un bucket por clave (capacidad, fichas por segundo), con LRU acotado de claves"""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._lock = Lock()
+        self._buckets = OrderedDict()   # clave -> [fichas, última recarga]
+        self.limited = 0
+
+    def take(self, key, capacity, rate):
+        """0 si se admite; si no, los segundos hasta la próxima ficha"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [capacity, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            self.limited += 1
+            return math.ceil((1 - bucket[0]) / rate)
+
+    def metrics(self):
+        with self._lock:
+            return {'limited': self.limited, 'tracked_keys': len(self._buckets)}
+
+
+class AdmissionController:
+    def __init__(self, classes, threads, free_share, rate_limits, rate_limited_endpoints, max_keys):
+        self.specs = classes
+        self.free_share = free_share
+        self.classes = {}
+        self._endpoint_class = {}
+        for name, (limit, queue) in class_slots(classes, threads, free_share).items():
+            spec = classes[name]
+            admission_class = AdmissionClass(name, limit, queue, spec['timeout'], spec['retry_after'])
+            self.classes[name] = admission_class
+            for endpoint in spec['endpoints']:
+                self._endpoint_class[endpoint] = admission_class
+        self.rate_limits = rate_limits
+        self.rate_limited_endpoints = frozenset(rate_limited_endpoints)
+        self.limiter = TokenBucketLimiter(max_keys)
+        self.enabled = True
+
+    def resize(self, threads):
+        """Recalcula los cupos para otra cantidad de hilos (p. ej. el pool del modo ASGI)"""
+        for name, (limit, queue) in class_slots(self.specs, threads, self.free_share).items():
+            self.classes[name].resize(limit, queue)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ADMISSION_ENABLED', True)
+        if self.enabled:
+            app.before_request(self.before_request)
+            app.teardown_request(self.teardown_request)
+
+    def _rejected(self, status, message, retry_after):
+        response = jsonify({'error': message, 'retry_after': retry_after})
+        response.status_code = status
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    def rate_limit(self):
+        """Respuesta 429 si la petición agotó su bucket (solo rutas de autenticación); si no, None"""
+        if not self.enabled or request.endpoint not in self.rate_limited_endpoints:
+            return None
+        keys = [('ip', request.remote_addr or '')]
+        data = request.get_json(silent=True)
+        email = data.get('email') if isinstance(data, dict) else None
+        if isinstance(email, str) and email:
+            keys.append(('email', email.strip().lower()))
+        for kind, value in keys:
+            capacity, rate = self.rate_limits[kind]
+            wait = self.limiter.take(f'{kind}:{value}', capacity, rate)
+            if wait:
+                return self._rejected(429, 'Demasiados intentos, intente de nuevo más tarde', wait)
+        return None
+
+    def before_request(self):
+        rejected = self.rate_limit()
+        if rejected is not None:
+            return rejected
+        admission_class = self._endpoint_class.get(request.endpoint)
+        if admission_class is None:
+            return None
+        if not admission_class.acquire():
+            return self._rejected(503, 'Servidor ocupado, intente de nuevo en unos segundos',
+                                  admission_class.retry_after)
+        g.admission_class = admission_class
+        return None
+
+    def teardown_request(self, exc=None):
+        admission_class = g.pop('admission_class', None)
+        if admission_class is not None:
+            admission_class.release()
+
+    def metrics(self):
+        return {
+            'classes': {name: c.metrics() for name, c in self.classes.items()},
+            'rate_limit': self.limiter.metrics()
+        }
+
+
+admission = AdmissionController(
+    classes=Config.ADMISSION_CLASSES,
+    threads=Config.GUNICORN_THREADS,
+    free_share=Config.ADMISSION_FREE_SHARE,
+    rate_limits={'ip': Config.AUTH_RATE_LIMIT_IP, 'email': Config.AUTH_RATE_LIMIT_EMAIL},
+    rate_limited_endpoints=Config.AUTH_RATE_LIMITED_ENDPOINTS,
+    max_keys=Config.RATE_LIMIT_MAX_KEYS
+)
@@ -0,0 +1,176 @@
+import asyncio
+import contextvars
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import jsonify
+from werkzeug.exceptions import HTTPException
+
+from config import Config
+from services.async_views import async_views, ExecutorBusy
+from services.tasks import tasks
+
+# Adaptador ASGI de la aplicación Flask (ver asgi.py).
+#
+# Por cada petición se arma el environ WSGI y se busca el endpoint en el
+# url_map de Flask:
+# - Si el endpoint tiene variante asíncrona (services/async_views.py), se
+#   ejecuta como corrutina en el event loop, dentro de un contexto de petición
+#   de Flask (los contextos son ContextVar, propios de cada tarea), así que la
+#   sesión, los before_request (admisión, límites de tasa), los after_request
+#   (compresión, ETag) y los teardown funcionan igual. Los before_request
+#   corren en el pool de hilos: la espera en la cola de una clase de admisión
+#   no debe bloquear el event loop.
+# - Si no, la vista síncrona corre en un pool de ASGI_WSGI_THREADS hilos. Las
+#   respuestas en streaming (SSE) se envían por partes a medida que se generan
+#   y se cortan cuando el cliente se desconecta.
+
+
+def _environ(scope, body):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    server = scope.get('server') or ('localhost', 80)
+    environ['SERVER_NAME'] = server[0]
+    environ['SERVER_PORT'] = str(server[1] or 80)
+    client = scope.get('client')
+    if client:
+        environ['REMOTE_ADDR'] = client[0]
+        environ['REMOTE_PORT'] = str(client[1])
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key in environ:
+            value = f'{environ[key]},{value}'
+        environ[key] = value
+    return environ
+
+
+def _encode_headers(headers):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+
+class AsgiAdapter:
+    def __init__(self, app, wsgi_threads=Config.ASGI_WSGI_THREADS):
+        self.app = app
+        self._wsgi_pool = ThreadPoolExecutor(wsgi_threads, thread_name_prefix='asgi-wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            body = await self._read_body(receive)
+            environ = _environ(scope, body)
+            view, args = self._match(environ)
+            if view is None:
+                await self._call_wsgi(environ, receive, send)
+            else:
+                await self._call_async(view, args, environ, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                tasks.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self._wsgi_pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    def _match(self, environ):
+        """(variante asíncrona, argumentos de URL) o (None, None)"""
+        try:
+            endpoint, args = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None, None
+        return async_views.get(endpoint), args
+
+    # --- Variantes asíncronas ---
+
+    async def _call_async(self, view, args, environ, send):
+        loop = asyncio.get_running_loop()
+        with self.app.request_context(environ):
+            try:
+                try:
+                    # El hilo recibe una copia del contexto: ve la misma petición y el mismo g
+                    rv = await loop.run_in_executor(self._wsgi_pool, contextvars.copy_context().run,
+                                                    self.app.preprocess_request)
+                    if rv is None:
+                        rv = await view(**args)
+                except ExecutorBusy:
+                    rv = (jsonify({'error': 'Servidor ocupado, intente de nuevo en unos segundos',
+                                   'retry_after': Config.ASGI_RETRY_AFTER}),
+                          503, {'Retry-After': str(Config.ASGI_RETRY_AFTER)})
+                except Exception as e:
+                    rv = self.app.handle_user_exception(e)
+                response = self.app.process_response(self.app.make_response(rv))
+            except Exception as e:
+                response = self.app.make_response(self.app.handle_exception(e))
+            body = response.get_data()
+            status, headers = response.status_code, _encode_headers(response.headers.items())
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    # --- Vistas síncronas ---
+
+    async def _call_wsgi(self, environ, receive, send):
+        loop = asyncio.get_running_loop()
+        started = {}
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        def first_chunk():
+            iterable = self.app(environ, start_response)
+            iterator = iter(iterable)
+            return iterable, iterator, next(iterator, None)
+
+        iterable, iterator, chunk = await loop.run_in_executor(self._wsgi_pool, first_chunk)
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await send({'type': 'http.response.start', 'status': started['status'],
+                        'headers': _encode_headers(started['headers'])})
+            while chunk is not None and not disconnected.is_set():
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self._wsgi_pool, next, iterator, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            watcher.cancel()
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(self._wsgi_pool, close)
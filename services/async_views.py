@@ -0,0 +1,95 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from config import Config
+
+# Variantes asíncronas de los endpoints más usados, para el modo ASGI (asgi.py).
+#
+# Cada variante se registra con `@async_views.view('<endpoint>')` junto a la
+# vista síncrona que reemplaza; el adaptador (services/asgi.py) la ejecuta en el
+# event loop, dentro del contexto de petición de Flask, en lugar de ocupar un
+# hilo. El trabajo bloqueante (MySQL, archivos, la tasa de cambio, bcrypt) se
+# espera con `await io_executor.run(...)` / `await bcrypt_executor.run(...)`:
+# cada ejecutor tiene hilos y cola acotados, y con la cola llena lanza
+# ExecutorBusy (el adaptador responde 503). Con gunicorn (wsgi.py) este
+# registro no se usa.
+
+
+class ExecutorBusy(Exception):
+    def __init__(self, name):
+        super().__init__(f'Ejecutor {name} saturado')
+        self.name = name
+
+
+class BoundedExecutor:
+    """Pool de hilos con un máximo de trabajos pendientes (en ejecución más en cola)"""
+
+    def __init__(self, name, workers, queue):
+        self.name = name
+        self.workers = workers
+        self.max_pending = workers + queue
+        self._lock = Lock()
+        self._executor = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=f'asgi-{self.name}')
+        return self._executor
+
+    async def run(self, func, *args):
+        """Resultado de func(*args) ejecutada en el pool; ExecutorBusy si está saturado"""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorBusy(self.name)
+            self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), func, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self.pending,
+                'completed': self.completed,
+                'rejected': self.rejected
+            }
+
+
+class AsyncViews:
+    def __init__(self):
+        self._views = {}
+
+    def view(self, endpoint):
+        """Registra la variante asíncrona de `endpoint` (mismos argumentos de URL)"""
+        def register(func):
+            self._views[endpoint] = func
+            return func
+        return register
+
+    def get(self, endpoint):
+        return self._views.get(endpoint)
+
+
+async_views = AsyncViews()
+
+# MySQL, archivos de datos y llamadas externas (tasa de cambio)
+io_executor = BoundedExecutor('io', Config.ASGI_IO_WORKERS, Config.ASGI_IO_QUEUE)
+
+# Hash y verificación de contraseñas (CPU; bcrypt libera el GIL)
+bcrypt_executor = BoundedExecutor('bcrypt', Config.ASGI_BCRYPT_WORKERS, Config.ASGI_BCRYPT_QUEUE)
+
+
+def executor_metrics():
+    return {executor.name: executor.metrics() for executor in (io_executor, bcrypt_executor)}
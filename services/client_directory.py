@@ -0,0 +1,177 @@
+import unicodedata
+from bisect import bisect_left, insort
+from threading import Lock
+
+# Directorio de usuarios para el panel de administración.
+#
+# Guarda la proyección sin datos sensibles de cada usuario (la que devuelve
+# /api/users) y, por cada grupo de rol, listas ordenadas de (clave, uid) por
+# nombre, correo y cédula. Una búsqueda por prefijo es una búsqueda binaria
+# sobre esas listas y la paginación sin búsqueda es un corte de la lista.
+
+SEARCH_FIELDS = ('name', 'email', 'cedula')
+
+# 'client' y 'cliente' se tratan como el mismo rol
+ROLE_ALIASES = {'client': 'cliente'}
+ALL_ROLES = '*'
+
+
+def normalize(text):
+    """Minúsculas y sin acentos, para que 'José' coincida con 'jose'"""
+    text = unicodedata.normalize('NFKD', str(text or '')).lower().strip()
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def role_group(role):
+    role = (role or 'cliente').lower()
+    return ROLE_ALIASES.get(role, role)
+
+
+def safe_user(user):
+    """Proyección pública de un usuario (sin password_hash)"""
+    return {
+        'cedula': user.get('cedula', ''),
+        'first_name': user.get('first_name', ''),
+        'last_name': user.get('last_name', ''),
+        'email': user.get('email', ''),
+        'phone': user.get('phone', ''),
+        'role': user.get('role', 'cliente')
+    }
+
+
+def _keys(row):
+    """Claves de búsqueda por campo (el nombre se indexa completo y por apellido)"""
+    full_name = normalize(f"{row['first_name']} {row['last_name']}")
+    return {
+        # Una entrada por usuario: orden del listado sin búsqueda
+        'sort': {full_name},
+        'name': {full_name, normalize(row['last_name'])} - {''},
+        'email': {normalize(row['email'])} - {''},
+        'cedula': {normalize(row['cedula'])} - {''}
+    }
+
+
+def _uid(user):
+    return user.get('cedula') or user.get('email')
+
+
+class ClientDirectory:
+    def __init__(self):
+        self._lock = Lock()
+        self._source = None
+        self._rows = {}        # uid -> proyección segura
+        self._order = []       # uids en el orden del archivo (respuesta de /api/users)
+        self._indexes = {}     # grupo de rol -> campo -> [(clave, uid)]
+        self._listing = None   # lista cacheada de todas las proyecciones
+
+    # --- Construcción y mantenimiento ---
+
+    def _index_for(self, group, field):
+        return self._indexes.setdefault(group, {}).setdefault(field, [])
+
+    def _add(self, uid, row):
+        self._rows[uid] = row
+        for field, keys in _keys(row).items():
+            for group in (ALL_ROLES, role_group(row['role'])):
+                index = self._index_for(group, field)
+                for key in keys:
+                    insort(index, (key, uid))
+
+    def _discard(self, uid):
+        row = self._rows.pop(uid, None)
+        if row is None:
+            return
+        for field, keys in _keys(row).items():
+            for group in (ALL_ROLES, role_group(row['role'])):
+                index = self._index_for(group, field)
+                for key in keys:
+                    position = bisect_left(index, (key, uid))
+                    if position < len(index) and index[position] == (key, uid):
+                        del index[position]
+
+    def rebuild(self, users):
+        with self._lock:
+            self._rows, self._indexes, self._order = {}, {}, []
+            entries = {}
+            for user in users:
+                uid = _uid(user)
+                if uid is None or uid in self._rows:
+                    continue
+                row = safe_user(user)
+                self._rows[uid] = row
+                self._order.append(uid)
+                for field, keys in _keys(row).items():
+                    for group in (ALL_ROLES, role_group(row['role'])):
+                        entries.setdefault((group, field), []).extend((key, uid) for key in keys)
+            # Una sola ordenación por índice en lugar de inserciones sucesivas
+            for (group, field), index in entries.items():
+                index.sort()
+                self._indexes.setdefault(group, {})[field] = index
+            self._listing = None
+            self._source = users
+
+    def sync(self, users):
+        """Reconstruye solo si los usuarios cambiaron fuera de este directorio"""
+        if users is not self._source:
+            self.rebuild(users)
+
+    def upsert(self, user, users):
+        with self._lock:
+            uid = _uid(user)
+            if uid not in self._rows:
+                self._order.append(uid)
+            self._discard(uid)
+            self._add(uid, safe_user(user))
+            self._listing = None
+            self._source = users
+
+    def remove(self, uid, users):
+        with self._lock:
+            if uid in self._rows:
+                self._discard(uid)
+                self._order.remove(uid)
+                self._listing = None
+            self._source = users
+
+    # --- Consultas ---
+
+    def all(self):
+        """Todas las proyecciones, en el orden del archivo (cacheado)"""
+        listing = self._listing
+        if listing is None:
+            with self._lock:
+                listing = self._listing = [self._rows[uid] for uid in self._order]
+        return listing
+
+    def by_role(self, role):
+        """Todas las proyecciones de un grupo de rol, ordenadas por nombre"""
+        with self._lock:
+            index = self._indexes.get(role_group(role), {}).get('sort', [])
+            return [self._rows[uid] for _, uid in index]
+
+    def _prefix_range(self, index, prefix):
+        lo = bisect_left(index, (prefix,))
+        hi = bisect_left(index, (prefix + '\uffff',))
+        return index[lo:hi]
+
+    def search(self, query='', field=None, role=None, page=1, per_page=50):
+        """Búsqueda por prefijo y paginación; devuelve (filas, total)"""
+        group = role_group(role) if role else ALL_ROLES
+        prefix = normalize(query)
+        start = (page - 1) * per_page
+        with self._lock:
+            indexes = self._indexes.get(group, {})
+            if not prefix:
+                # Sin búsqueda: la página es un corte del índice ordenado por nombre
+                index = indexes.get('sort', [])
+                return [self._rows[uid] for _, uid in index[start:start + per_page]], len(index)
+            fields = [field] if field in SEARCH_FIELDS else SEARCH_FIELDS
+            uids = []
+            for name in fields:
+                uids.extend(uid for _, uid in self._prefix_range(indexes.get(name, []), prefix))
+            # Un usuario puede coincidir por varias claves: conservar la primera
+            uids = list(dict.fromkeys(uids))
+            return [self._rows[uid] for uid in uids[start:start + per_page]], len(uids)
+
+
+client_directory = ClientDirectory()
@@ -0,0 +1,144 @@
+import gzip
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+from flask import request
+
+from config import Config
+
+# Compresión de respuestas (gzip, y brotli si el paquete está instalado).
+#
+# Solo se comprimen respuestas completas (no streaming ni archivos servidos
+# directamente), de un tipo de contenido permitido y de al menos
+# COMPRESSION_MIN_SIZE bytes. Las respuestas cacheables (GET/HEAD con 200)
+# llevan un ETag por variante; el cuerpo comprimido se guarda por ETag y
+# codificación, así un payload que no cambia se comprime una sola vez, y un
+# cliente que ya lo tiene recibe 304.
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class CompressedBodyCache:
+    """LRU de cuerpos comprimidos, acotado por bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        self._items = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._items.get(key)
+            if body is not None:
+                self._items.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._items[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+
+class ResponseCompressor:
+    def __init__(self, min_size, mimetypes, cache_bytes):
+        self.min_size = min_size
+        self.mimetypes = set(mimetypes)
+        self.cache = CompressedBodyCache(cache_bytes)
+        self.encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    def init_app(self, app):
+        if app.config.get('COMPRESSION_ENABLED', True):
+            app.after_request(self.compress)
+
+    def _encode(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=BROTLI_QUALITY)
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+    def _eligible(self, response):
+        # Los archivos estáticos (direct_passthrough) solo si traen ETag: su
+        # versión comprimida se cachea y el archivo no se vuelve a leer
+        if response.direct_passthrough:
+            complete = response.status_code == 200 and response.get_etag()[0] is not None
+        else:
+            complete = not response.is_streamed
+        return (
+            complete
+            and 'Content-Encoding' not in response.headers
+            and response.mimetype in self.mimetypes
+            and 200 <= response.status_code < 300
+        )
+
+    def compress(self, response):
+        if not self._eligible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+        if response.direct_passthrough:
+            return self._compress_file(response, encoding)
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        cacheable = (request.method in ('GET', 'HEAD') and response.status_code == 200
+                     and not response.cache_control.no_store)
+        if not cacheable:
+            response.set_data(self._encode(data, encoding))
+            response.headers['Content-Encoding'] = encoding
+            return response
+
+        etag, _ = response.get_etag()
+        if etag is None:
+            etag = hashlib.sha1(data).hexdigest()
+        # Cada codificación es una representación distinta: su propio ETag
+        variant = f'{etag}-{encoding}'
+        body = self.cache.get(variant)
+        if body is None:
+            body = self._encode(data, encoding)
+            self.cache.put(variant, body)
+        return self._finish(response, body, encoding, variant)
+
+    def _compress_file(self, response, encoding):
+        if response.content_length is not None and response.content_length < self.min_size:
+            return response
+        variant = f'{response.get_etag()[0]}-{encoding}'
+        body = self.cache.get(variant)
+        if body is None:
+            response.direct_passthrough = False
+            body = self._encode(response.get_data(), encoding)
+            self.cache.put(variant, body)
+        else:
+            response.close()  # Cierra el archivo que ya no se va a leer
+        return self._finish(response, body, encoding, variant)
+
+    def _finish(self, response, body, encoding, variant):
+        response.direct_passthrough = False
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(variant)
+        return response.make_conditional(request.environ)
+
+
+compressor = ResponseCompressor(
+    min_size=Config.COMPRESSION_MIN_SIZE,
+    mimetypes=Config.COMPRESSION_MIMETYPES,
+    cache_bytes=Config.COMPRESSION_CACHE_BYTES
+)
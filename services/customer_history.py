@@ -0,0 +1,134 @@
+from bisect import bisect_left, insort
+from threading import Lock
+
+# Historial de compras por cliente.
+#
+# Índice email -> compras ordenadas por fecha, más estadísticas por cliente
+# (cantidad de pedidos, gasto total, última compra, pendientes). Los handlers
+# de compras lo actualizan en cada escritura, de modo que "Mis compras" cuesta
+# O(pedidos del cliente) y no recorre todas las compras. Si otro worker
+# escribió desde la última versión indexada, el índice se reconstruye.
+
+CANCELLED_STATUS = 'Cancelada'
+PENDING_STATUS = 'Pendiente'
+
+
+def _email(purchase):
+    return (purchase.get('user') or {}).get('email')
+
+
+def _order_key(purchase):
+    return (str(purchase.get('purchase_date') or ''), str(purchase.get('id')))
+
+
+class CustomerHistory:
+    def __init__(self):
+        self._lock = Lock()
+        self._orders = {}      # email -> [(fecha, id)] ordenada
+        self._purchases = {}   # id -> compra
+        self._stats = {}       # email -> estadísticas
+        self._version = None   # Versión del almacenamiento indexada
+
+    # --- Construcción y mantenimiento ---
+
+    def _compute_stats(self, email):
+        orders = [self._purchases[pid] for _, pid in self._orders.get(email, [])]
+        if not orders:
+            self._stats.pop(email, None)
+            return
+        active = [p for p in orders if p.get('status') != CANCELLED_STATUS]
+        self._stats[email] = {
+            'order_count': len(orders),
+            'lifetime_spend': round(sum(float(p.get('total_amount') or 0) for p in active), 2),
+            'last_purchase_date': orders[-1].get('purchase_date'),
+            'pending_count': sum(1 for p in orders if p.get('status') == PENDING_STATUS),
+            'cancelled_count': len(orders) - len(active)
+        }
+
+    def _discard(self, purchase_id):
+        purchase = self._purchases.pop(purchase_id, None)
+        if purchase is None:
+            return None
+        email = _email(purchase)
+        orders = self._orders.get(email, [])
+        position = bisect_left(orders, _order_key(purchase))
+        if position < len(orders) and orders[position] == _order_key(purchase):
+            del orders[position]
+        if not orders:
+            self._orders.pop(email, None)
+        return email
+
+    def rebuild(self, purchases, version):
+        with self._lock:
+            self._purchases = {}
+            self._orders = {}
+            for purchase in purchases:
+                email = _email(purchase)
+                if not email:
+                    continue
+                self._purchases[purchase.get('id')] = purchase
+                self._orders.setdefault(email, []).append(_order_key(purchase))
+            self._stats = {}
+            for email, orders in self._orders.items():
+                orders.sort()
+                self._compute_stats(email)
+            self._version = version
+
+    def sync(self, version, load_purchases):
+        """Reconstruye solo si las compras cambiaron fuera de este índice"""
+        if version != self._version:
+            self.rebuild(load_purchases(), version)
+
+    def upsert(self, purchase, previous, version):
+        """Registra una compra nueva o modificada (ver upsert_many)"""
+        return self.upsert_many([purchase], previous, version)
+
+    def upsert_many(self, purchases, previous, version):
+        """Registra las compras nuevas o modificadas de una escritura
+
+        `previous` y `version` son las versiones del almacenamiento antes y
+        después de la escritura. Si el índice no estaba en `previous` (otro
+        worker escribió en el medio) no se aplica nada: la versión queda vieja
+        y el próximo `sync` reconstruye. Devuelve True si se aplicó.
+        """
+        with self._lock:
+            if self._version is None or self._version != previous:
+                return False
+            for purchase in purchases:
+                previous_email = self._discard(purchase.get('id'))
+                email = _email(purchase)
+                if email:
+                    self._purchases[purchase.get('id')] = purchase
+                    insort(self._orders.setdefault(email, []), _order_key(purchase))
+                    self._compute_stats(email)
+                if previous_email and previous_email != email:
+                    self._compute_stats(previous_email)
+            self._version = version
+            return True
+
+    def remove(self, purchase_id, previous, version):
+        """Quita una compra eliminada (mismas condiciones que upsert_many)"""
+        with self._lock:
+            if self._version is None or self._version != previous:
+                return False
+            email = self._discard(purchase_id)
+            if email:
+                self._compute_stats(email)
+            self._version = version
+            return True
+
+    # --- Consultas ---
+
+    def history(self, email):
+        """(compras más recientes primero, estadísticas) de un cliente"""
+        with self._lock:
+            orders = self._orders.get(email, [])
+            purchases = [self._purchases[pid] for _, pid in reversed(orders)]
+            stats = self._stats.get(email) or {
+                'order_count': 0, 'lifetime_spend': 0.0, 'last_purchase_date': None,
+                'pending_count': 0, 'cancelled_count': 0
+            }
+            return purchases, dict(stats)
+
+
+customer_history = CustomerHistory()
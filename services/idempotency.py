@@ -0,0 +1,101 @@
+import hashlib
+import time
+from functools import wraps
+
+from flask import Response, jsonify, make_response, request, session
+
+from config import Config
+from database import jsonio
+from database.idempotency_store import IdempotencyStore, NEW, REPLAY, IN_PROGRESS, MISMATCH
+
+# Claves de idempotencia para las escrituras que el cliente puede reintentar.
+#
+# Si la petición trae `Idempotency-Key`, la primera ejecución guarda su
+# respuesta y los reintentos con la misma clave reciben esa misma respuesta
+# (con `Idempotent-Replayed: true`) sin volver a ejecutar la escritura. Las
+# respuestas se guardan en disco (database/idempotency_store.py), así que
+# sobreviven a un reinicio y valen entre workers, durante IDEMPOTENCY_TTL.
+#
+# - La clave se asocia al endpoint y al usuario de la sesión.
+# - Un reintento mientras la original sigue en curso recibe 409.
+# - Reusar la clave con otro contenido es un error del cliente: 422.
+# - Los errores 5xx y los rechazos transitorios (409, 429, 503) no se guardan:
+#   el reintento vuelve a ejecutar.
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+TRANSIENT_STATUSES = frozenset({409, 429, 503})
+FORM_MIMETYPES = frozenset({'multipart/form-data', 'application/x-www-form-urlencoded'})
+
+
+def _fingerprint():
+    """Hash del contenido de la petición, para detectar una clave reusada con otros datos"""
+    if request.mimetype in FORM_MIMETYPES:
+        fields = sorted(request.form.items(multi=True))
+        files = sorted((name, f.filename) for name, f in request.files.items(multi=True))
+        data = jsonio.dumps([fields, files]).encode('utf-8')
+    else:
+        data = request.get_data()
+    return hashlib.sha256(data).hexdigest()
+
+
+class IdempotencyCache:
+    def __init__(self, store, ttl, lock_timeout, purge_interval):
+        self.store = store
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.purge_interval = purge_interval
+        self._last_purge = 0
+
+    def _purge(self):
+        now = time.time()
+        if now - self._last_purge > self.purge_interval:
+            self._last_purge = now
+            self.store.purge()
+
+    def idempotent(self, view):
+        """Decorador de vista: aplica la clave de idempotencia si la petición trae una"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'error': f'{HEADER} debe tener máximo {MAX_KEY_LENGTH} caracteres'}), 400
+
+            self._purge()
+            scoped_key = f"{request.endpoint}:{session.get('username', '')}:{key}"
+            state, stored = self.store.begin(scoped_key, _fingerprint(), self.lock_timeout, self.ttl)
+            if state == REPLAY:
+                response = Response(stored['body'], status=stored['status'], mimetype=stored['mimetype'])
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            if state == IN_PROGRESS:
+                response = jsonify({'error': 'La petición original todavía se está procesando'})
+                response.status_code = 409
+                response.headers['Retry-After'] = '1'
+                return response
+            if state == MISMATCH:
+                return jsonify({'error': f'{HEADER} ya se usó con otros datos'}), 422
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                self.store.release(scoped_key)
+                raise
+            if (response.status_code >= 500 or response.status_code in TRANSIENT_STATUSES
+                    or response.is_streamed):
+                self.store.release(scoped_key)
+            else:
+                self.store.complete(scoped_key, response.status_code, response.get_data(),
+                                    response.mimetype, self.ttl)
+            return response
+        return wrapper
+
+
+idempotency = IdempotencyCache(
+    IdempotencyStore(Config.IDEMPOTENCY_DB),
+    ttl=Config.IDEMPOTENCY_TTL,
+    lock_timeout=Config.IDEMPOTENCY_LOCK_TIMEOUT,
+    purge_interval=Config.IDEMPOTENCY_PURGE_INTERVAL
+)
@@ -0,0 +1,159 @@
+import atexit
+import os
+import sys
+import time
+from threading import Event, Lock, Thread
+
+from config import Config
+from database.stock_store import StockStore
+
+# Servicio de inventario: reservas de stock contra contadores compartidos.
+#
+# - La fuente de verdad del stock es un contador por producto en SQLite
+#   (database/stock_store.py), común a todos los workers: una reserva descuenta
+#   con un UPDATE condicional, así que dos workers no pueden vender la misma
+#   última unidad.
+# - Las reservas son todo-o-nada: si falta stock de una línea, las ya
+#   descontadas se devuelven y la reserva falla.
+# - products.json guarda una copia del stock para el catálogo: cada escritura
+#   del catálogo copia los valores absolutos de los contadores, y después de
+#   una venta un hilo la reescribe por lotes. Todo bajo el lock entre procesos
+#   del catálogo (products_lock), así que un worker no pisa escrituras de otros
+#   ni pierde sus ventas.
+# - Los productos que no tienen contador se agregan con el stock de products.json.
+
+
+class InsufficientStockError(Exception):
+    """Una o más líneas del carrito no tienen stock suficiente"""
+
+    def __init__(self, shortages):
+        super().__init__('Stock insuficiente')
+        # [{'product_id', 'requested', 'available'}]
+        self.shortages = shortages
+
+
+def cart_lines(items):
+    """Convierte items de carrito/compra en {product_id: cantidad}"""
+    lines = {}
+    for item in items:
+        product_id = item.get('product_id', item.get('id'))
+        quantity = int(item.get('quantity', 1))
+        if product_id is None or quantity <= 0:
+            raise ValueError('Línea de carrito inválida')
+        product_id = int(product_id)
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    return lines
+
+
+class InventoryService:
+    def __init__(self, store, flush_interval):
+        self.store = store
+        self.flush_interval = flush_interval
+        self._load_lock = Lock()
+        self._loaded = False
+        # Hay cambios de este worker que products.json todavía no refleja
+        self._dirty = False
+        self._flush_event = Event()
+        self._flusher_pid = None
+
+    # --- Carga y sincronización con el catálogo ---
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        from api.products import get_cached_products
+        self.seed(get_cached_products())
+
+    def seed(self, products):
+        """Crea los contadores de los productos del catálogo que aún no tienen uno"""
+        with self._load_lock:
+            self.store.seed({p['product_id']: int(p.get('stock_quantity', 0)) for p in products})
+            self._loaded = True
+
+    def load(self):
+        self._ensure_loaded()
+
+    def available(self, product_id):
+        self._ensure_loaded()
+        return self.store.get(product_id)
+
+    def set_stock(self, product_id, quantity):
+        """Registra el stock de un producto creado o editado en el catálogo"""
+        self._ensure_loaded()
+        self.store.set(product_id, int(quantity))
+
+    def remove_product(self, product_id):
+        self._ensure_loaded()
+        self.store.remove(product_id)
+
+    # --- Reservas ---
+
+    def reserve(self, lines):
+        """Descuenta todas las líneas o ninguna. Lanza InsufficientStockError"""
+        self._ensure_loaded()
+        shortages = self.store.reserve(lines)
+        if shortages:
+            raise InsufficientStockError(shortages)
+        self._changed()
+
+    def release(self, lines):
+        """Devuelve al inventario las líneas de una reserva"""
+        self._ensure_loaded()
+        self.store.release(lines)
+        self._changed()
+
+    # --- Copia en products.json ---
+
+    def _changed(self):
+        self._dirty = True
+        self._start_flusher()
+        self._flush_event.set()
+
+    def _start_flusher(self):
+        # Los hilos no sobreviven al fork: cada worker arranca el suyo
+        if self._flusher_pid == os.getpid():
+            return
+        with self._load_lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            Thread(target=self._flush_loop, name='inventory-flusher', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            self._flush_event.wait()
+            # Agrupar las reservas que lleguen durante el intervalo en una sola escritura
+            time.sleep(self.flush_interval)
+            self._flush_event.clear()
+            self.flush()
+
+    def apply_stock(self, products):
+        """Copia los contadores en los productos dados; True si alguno cambió"""
+        self._ensure_loaded()
+        stock = self.store.all()
+        changed = False
+        for product in products:
+            quantity = stock.get(product['product_id'])
+            if quantity is not None and quantity != product.get('stock_quantity'):
+                product['stock_quantity'] = quantity
+                changed = True
+        return changed
+
+    def flush(self):
+        """Copia los contadores a products.json (una escritura, solo si algo cambió)"""
+        if not self._dirty:
+            return
+        from api.products import products_lock, load_products, save_products
+        self._dirty = False
+        try:
+            with products_lock:
+                products = load_products()
+                if self.apply_stock(products):
+                    save_products(products)
+        except Exception as e:
+            print(f"[ERROR] No se pudo persistir el inventario: {e}", file=sys.stderr)
+            self._changed()
+
+
+inventory = InventoryService(StockStore(Config.INVENTORY_DB), flush_interval=Config.INVENTORY_FLUSH_INTERVAL)
+atexit.register(inventory.flush)
@@ -0,0 +1,94 @@
+import heapq
+from threading import Lock
+
+from config import Config
+
+# Últimas ventas del panel de administración.
+#
+# Se mantienen las N facturas más recientes (más un margen para absorber
+# eliminaciones) ordenadas por fecha de creación. create_billing/delete_billing
+# las actualizan en el momento y el endpoint devuelve la lista ya formateada,
+# sin recorrer ni ordenar todas las facturas.
+
+
+def _sort_key(bill):
+    return (bill.get('created_at', ''), bill.get('billing_id', 0))
+
+
+def format_sale(sale):
+    """Formato de fila que espera la tabla de admin.js"""
+    return {
+        'id': sale.get('billing_id', 0),
+        'fecha': sale.get('invoice_date', ''),
+        'cedula_cliente': str(sale.get('client_cedula', '')),
+        'nombre_cliente': sale.get('client_name', ''),
+        'telefono_cliente': str(sale.get('client_phone', '')),
+        'correo_cliente': sale.get('client_email', ''),
+        'cantidad_total': sale.get('quantity', 0),
+        'total_factura': float(sale.get('total', 0))
+    }
+
+
+class LatestSales:
+    def __init__(self, size):
+        self.size = size
+        self.capacity = size * 2
+        self._lock = Lock()
+        self._items = []        # Facturas más recientes primero (hasta `capacity`)
+        self._total = 0         # Facturas existentes en total
+        self._source = None     # Lista de facturas a partir de la cual se construyó
+        self._rows = []         # Resultado formateado de las primeras `size`
+
+    def _refresh_rows(self):
+        self._rows = [format_sale(sale) for sale in self._items[:self.size]]
+
+    def rebuild(self, billing_data):
+        """Reconstruye desde todas las facturas (O(n log N))"""
+        with self._lock:
+            self._items = heapq.nlargest(self.capacity, billing_data, key=_sort_key)
+            self._total = len(billing_data)
+            self._source = billing_data
+            self._refresh_rows()
+
+    def sync(self, billing_data):
+        """Reconstruye solo si las facturas cambiaron fuera de este proceso"""
+        if billing_data is not self._source:
+            self.rebuild(billing_data)
+
+    def add(self, bill, billing_data):
+        with self._lock:
+            key = _sort_key(bill)
+            position = 0
+            while position < len(self._items) and _sort_key(self._items[position]) > key:
+                position += 1
+            self._items.insert(position, bill)
+            del self._items[self.capacity:]
+            self._total += 1
+            self._source = billing_data
+            self._refresh_rows()
+
+    def extend(self, bills, billing_data):
+        """Agrega un lote de facturas (importación masiva)"""
+        with self._lock:
+            self._items = heapq.nlargest(self.capacity, self._items + list(bills), key=_sort_key)
+            self._total = len(billing_data)
+            self._source = billing_data
+            self._refresh_rows()
+
+    def remove(self, billing_id, billing_data):
+        with self._lock:
+            self._items = [bill for bill in self._items if bill.get('billing_id') != billing_id]
+            self._total = len(billing_data)
+            self._source = billing_data
+            # Sin margen suficiente hay que volver a buscar en todas las facturas
+            exhausted = len(self._items) < min(self.size, self._total)
+            if not exhausted:
+                self._refresh_rows()
+        if exhausted:
+            self.rebuild(billing_data)
+
+    def rows(self):
+        return self._rows
+
+
+latest_sales = LatestSales(size=Config.LATEST_SALES_SIZE)
@@ -0,0 +1,129 @@
+import time
+from threading import Lock
+
+from config import Config
+
+# Motor de precios del servidor: el total de una compra se calcula con los
+# precios del catálogo, nunca con los que envía el navegador.
+
+
+class PricingEngine:
+    def __init__(self, iva_rate, exchange_rate_ttl):
+        self.iva_rate = iva_rate
+        self.exchange_rate_ttl = exchange_rate_ttl
+        self._lock = Lock()
+        self._rate = None
+        self._rate_expires = 0.0
+
+    # --- Índice de productos ---
+
+    def _products_index(self):
+        # Instantánea compartida del catálogo: búsqueda binaria por product_id
+        # y decodificación solo del producto encontrado
+        from api.products import get_catalog_snapshot
+        return get_catalog_snapshot()
+
+    def load(self):
+        self._products_index()
+
+    def catalog_index(self):
+        """Índice product_id -> producto (solo lectura, con .get())"""
+        return self._products_index()
+
+    def get_product(self, product_id):
+        return self._products_index().get(product_id)
+
+    def get_products(self, product_ids):
+        """Busca varios productos a la vez; devuelve (encontrados, ids_faltantes)"""
+        index = self._products_index()
+        found, missing = [], []
+        for product_id in product_ids:
+            product = index.get(product_id)
+            if product is None:
+                missing.append(product_id)
+            else:
+                found.append(product)
+        return found, missing
+
+    # --- Tasa de cambio ---
+
+    def _fetch_exchange_rate(self):
+        # Simulate exchange rate similar to pyBCV
+        # In a real implementation, this would fetch from an API
+        # For now, return a fixed rate (USD to VES)
+        return 355.55
+
+    def cached_exchange_rate(self):
+        """Tasa vigente si está en caché; None si hay que volver a consultarla"""
+        if self._rate is None or time.monotonic() >= self._rate_expires:
+            return None
+        return self._rate
+
+    def exchange_rate(self):
+        """Tasa USD -> VES, cacheada durante EXCHANGE_RATE_TTL segundos"""
+        now = time.monotonic()
+        if self._rate is None or now >= self._rate_expires:
+            with self._lock:
+                if self._rate is None or now >= self._rate_expires:
+                    self._rate = self._fetch_exchange_rate()
+                    self._rate_expires = now + self.exchange_rate_ttl
+        return self._rate
+
+    # --- Cotización de carritos ---
+
+    def price_cart(self, items):
+        """Valida y cotiza un carrito completo en una sola pasada.
+
+        Devuelve un dict con las líneas cotizadas, los totales (subtotal, IVA,
+        total en USD y VES) y la lista de errores por línea. Si hay errores el
+        carrito no debe aceptarse.
+        """
+        index = self._products_index()
+        lines, errors = [], []
+        subtotal = 0.0
+        for position, item in enumerate(items):
+            try:
+                product_id = int(item.get('product_id', item.get('id')))
+                quantity = int(item.get('quantity', 1))
+            except (TypeError, ValueError, AttributeError):
+                errors.append({'line': position, 'error': 'Línea de carrito inválida'})
+                continue
+            product = index.get(product_id)
+            if product is None:
+                errors.append({'line': position, 'product_id': product_id, 'error': 'Producto no encontrado'})
+                continue
+            if quantity <= 0:
+                errors.append({'line': position, 'product_id': product_id, 'error': 'Cantidad inválida'})
+                continue
+            unit_price = float(product['price'])
+            line_total = round(unit_price * quantity, 2)
+            subtotal += line_total
+            line = {
+                'product_id': product_id,
+                'name': product.get('name', ''),
+                'unit_price': unit_price,
+                'quantity': quantity,
+                'line_total': line_total
+            }
+            client_price = item.get('price')
+            if client_price is not None and client_price != unit_price:
+                line['price_changed'] = True
+            lines.append(line)
+
+        subtotal = round(subtotal, 2)
+        iva = round(subtotal * self.iva_rate, 2)
+        total_usd = round(subtotal + iva, 2)
+        rate = self.exchange_rate()
+        return {
+            'lines': lines,
+            'errors': errors,
+            'subtotal': subtotal,
+            'iva_rate': self.iva_rate,
+            'iva': iva,
+            'total_usd': total_usd,
+            'exchange_rate': rate,
+            'total_ves': round(total_usd * rate, 2)
+        }
+
+
+pricing = PricingEngine(iva_rate=Config.IVA_RATE, exchange_rate_ttl=Config.EXCHANGE_RATE_TTL)
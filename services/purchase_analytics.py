@@ -0,0 +1,333 @@
+from array import array
+from datetime import date, datetime
+from threading import Lock
+
+# Instantánea columnar de las líneas de compra para consultas de análisis.
+#
+# Cada línea de compra ocupa una posición en arreglos compactos (array del
+# módulo estándar): día ordinal, producto, cantidad, precio, estado, cliente,
+# categoría y compra. Los textos (estados, correos, categorías) se guardan una
+# sola vez en diccionarios y las columnas solo llevan su código. Con NumPy
+# instalado las agregaciones se hacen vectorizadas sobre vistas sin copia de
+# esas columnas; sin NumPy se usa un recorrido en Python puro.
+#
+# Actualización:
+# - El worker que guarda compras aplica solo lo que cambió (`apply`, costo
+#   proporcional a los cambios): las compras nuevas se agregan al final, un
+#   cambio de estado reescribe solo el rango de sus líneas y las compras
+#   eliminadas se marcan (se compacta cuando las marcas son muchas).
+# - `refresh` recorre la lista completa y aplica las diferencias. Solo hace
+#   falta cuando la versión del almacenamiento no es la que dejó el último
+#   `apply`: al arrancar, o cuando otro worker escribió las compras.
+
+GROUP_BY = ('product', 'category', 'client', 'status', 'week')
+
+DELETED = -1
+
+# Día 0: compra sin fecha ISO válida (datos heredados). Con group_by=week
+# esas líneas forman su propio grupo, la semana (0 - 1) // 7
+UNDATED_WEEK = -1
+
+_numpy = None
+
+
+def _np():
+    """NumPy si está instalado (importación diferida), o None"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+def _status_name(status):
+    return (status or 'Pendiente').strip().capitalize()
+
+
+def _day_ordinal(value):
+    """Día ordinal de una fecha ISO (0 si falta o no es válida)"""
+    try:
+        return datetime.fromisoformat(str(value)).toordinal()
+    except ValueError:
+        return 0
+
+
+class _Codes:
+    """Diccionario texto <-> código entero"""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def get(self, value, default=None):
+        """Código de un texto ya registrado (sin registrarlo)"""
+        return self._codes.get(value, default)
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class PurchaseSnapshot:
+    def __init__(self):
+        self._lock = Lock()
+        self._reset()
+
+    def _reset(self):
+        self.day = array('i')
+        self.product = array('i')
+        self.quantity = array('i')
+        self.price = array('d')
+        self.status = array('b')
+        self.client = array('i')
+        self.category = array('h')
+        self.purchase = array('i')
+        self.statuses = _Codes()
+        self.clients = _Codes()
+        self.categories = _Codes()
+        self._ranges = {}       # id de compra -> [inicio, fin, código de estado]
+        self._deleted_rows = 0
+        self._next_purchase = 0
+        self._source = None
+        self._version = None    # Versión del almacenamiento que refleja la instantánea
+        self._product_categories = {}
+
+    # --- Mantenimiento ---
+
+    def _append(self, purchase, status_code, catalog):
+        start = len(self.day)
+        day = _day_ordinal(purchase.get('purchase_date', ''))
+        client = self.clients.code((purchase.get('user') or {}).get('email', ''))
+        purchase_index = self._next_purchase
+        self._next_purchase += 1
+        for item in purchase.get('products', []):
+            try:
+                product_id = int(item.get('product_id', item.get('id')))
+                quantity = int(item.get('quantity', 1))
+                price = float(item.get('price', 0))
+            except (TypeError, ValueError):
+                continue
+            self.day.append(day)
+            self.product.append(product_id)
+            self.quantity.append(quantity)
+            self.price.append(price)
+            self.status.append(status_code)
+            self.client.append(client)
+            self.category.append(self._category_code(product_id, catalog))
+            self.purchase.append(purchase_index)
+        self._ranges[purchase.get('id')] = [start, len(self.day), status_code]
+
+    def _category_code(self, product_id, catalog):
+        # Cada producto se consulta en el catálogo una sola vez por refresh
+        code = self._product_categories.get(product_id)
+        if code is None:
+            category = (catalog.get(product_id) or {}).get('category', '')
+            code = self._product_categories[product_id] = self.categories.code(category)
+        return code
+
+    def _set_status(self, rows, code):
+        start, end = rows[0], rows[1]
+        if end > start:
+            self.status[start:end] = array('b', [code]) * (end - start)
+        rows[2] = code
+
+    def _delete(self, purchase_id):
+        rows = self._ranges.pop(purchase_id, None)
+        if rows is not None and rows[2] != DELETED:
+            self._set_status(rows, DELETED)
+            self._deleted_rows += rows[1] - rows[0]
+
+    def _current(self, purchases, version):
+        return purchases is self._source or (version is not None and version == self._version)
+
+    def apply(self, changed, deleted, catalog, previous, version):
+        """Aplica las compras creadas o con nuevo estado y las eliminadas de una escritura
+
+        `previous` y `version` son las versiones del almacenamiento antes y
+        después de la escritura. Si la instantánea no estaba en `previous`
+        (otro worker escribió en el medio) no se aplica nada y el próximo
+        `refresh` recorre la lista completa. Devuelve True si se aplicó.
+        """
+        with self._lock:
+            if self._version is None or self._version != previous:
+                return False
+            self._product_categories = {}
+            for purchase in changed:
+                code = self.statuses.code(_status_name(purchase.get('status')))
+                rows = self._ranges.get(purchase.get('id'))
+                if rows is None:
+                    self._append(purchase, code, catalog)
+                elif rows[2] != code:
+                    self._set_status(rows, code)
+            for purchase_id in deleted:
+                self._delete(purchase_id)
+            self._source = None
+            # Con muchas líneas eliminadas, el próximo refresh recorre la lista y compacta
+            self._version = version if self._deleted_rows <= max(len(self.day) // 4, 1024) else None
+            return True
+
+    def refresh(self, purchases, catalog, version=None):
+        """Aplica los cambios de la lista de compras (no hace nada si no cambió)
+
+        `catalog` es el índice product_id -> producto; da la categoría de las
+        líneas nuevas. `version` es la versión del almacenamiento de `purchases`:
+        si es la que ya refleja la instantánea no se recorre la lista.
+        """
+        if self._current(purchases, version):
+            return
+        with self._lock:
+            if self._current(purchases, version):
+                return
+            self._product_categories = {}
+            seen = set()
+            for purchase in purchases:
+                purchase_id = purchase.get('id')
+                seen.add(purchase_id)
+                code = self.statuses.code(_status_name(purchase.get('status')))
+                rows = self._ranges.get(purchase_id)
+                if rows is None:
+                    self._append(purchase, code, catalog)
+                elif rows[2] != code:
+                    self._set_status(rows, code)
+            for purchase_id in [pid for pid in self._ranges if pid not in seen]:
+                self._delete(purchase_id)
+            self._source = purchases
+            self._version = version
+            # Compactar cuando las líneas eliminadas pesan demasiado
+            if self._deleted_rows > max(len(self.day) // 4, 1024):
+                self._reset()
+                for purchase in purchases:
+                    self._append(purchase, self.statuses.code(_status_name(purchase.get('status'))), catalog)
+                self._source = purchases
+            self._version = version
+
+    def nbytes(self):
+        columns = (self.day, self.product, self.quantity, self.price,
+                   self.status, self.client, self.category, self.purchase)
+        return sum(column.itemsize * len(column) for column in columns)
+
+    # --- Consultas ---
+
+    def _label(self, group_by, key, catalog):
+        if group_by == 'product':
+            return (catalog.get(key) or {}).get('name', f'Producto {key}')
+        if group_by == 'category':
+            return self.categories.values[key] or 'Sin categoría'
+        if group_by == 'client':
+            return self.clients.values[key]
+        if group_by == 'status':
+            return self.statuses.values[key]
+        if key == UNDATED_WEEK:
+            return 'Sin fecha'
+        return date.fromordinal(key * 7 + 1).isoformat()  # lunes de la semana
+
+    def aggregate(self, group_by, start=None, end=None, status=None, top=None, catalog=None):
+        """Ingresos, unidades y líneas por grupo, más un resumen del rango filtrado"""
+        if group_by not in GROUP_BY:
+            raise ValueError(f'group_by debe ser uno de: {", ".join(GROUP_BY)}')
+        start_day = start.toordinal() if start else None
+        end_day = end.toordinal() if end else None
+        with self._lock:
+            status_code = self.statuses.get(_status_name(status), -2) if status else None
+            np = _np()
+            if np is not None:
+                groups, summary = self._aggregate_numpy(np, group_by, start_day, end_day, status_code)
+            else:
+                groups, summary = self._aggregate_python(group_by, start_day, end_day, status_code)
+            if group_by == 'week':
+                groups.sort(key=lambda g: g['key'])
+            else:
+                groups.sort(key=lambda g: g['revenue'], reverse=True)
+            if top:
+                groups = groups[:top]
+            for group in groups:
+                group['label'] = self._label(group_by, group['key'], catalog or {})
+        summary['engine'] = 'numpy' if np is not None else 'python'
+        return groups, summary
+
+    def _aggregate_numpy(self, np, group_by, start_day, end_day, status_code):
+        # Vistas sin copia sobre las columnas (el lock impide que crezcan mientras tanto)
+        day = np.frombuffer(self.day, dtype=np.int32)
+        status = np.frombuffer(self.status, dtype=np.int8)
+        mask = status != DELETED
+        if start_day is not None:
+            mask &= day >= start_day
+        if end_day is not None:
+            mask &= day <= end_day
+        if status_code is not None:
+            mask &= status == status_code
+        quantity = np.frombuffer(self.quantity, dtype=np.int32)[mask]
+        revenue = quantity * np.frombuffer(self.price, dtype=np.float64)[mask]
+        if group_by == 'week':
+            keys = (day[mask] - 1) // 7
+        else:
+            column = {'product': self.product, 'category': self.category,
+                      'client': self.client, 'status': self.status}[group_by]
+            keys = np.frombuffer(column, dtype=np.dtype(column.typecode))[mask]
+        unique, inverse = np.unique(keys, return_inverse=True)
+        revenue_by = np.bincount(inverse, weights=revenue, minlength=len(unique))
+        quantity_by = np.bincount(inverse, weights=quantity, minlength=len(unique))
+        lines_by = np.bincount(inverse, minlength=len(unique))
+        groups = [
+            {'key': int(k), 'revenue': round(float(r), 2), 'quantity': int(q), 'lines': int(n)}
+            for k, r, q, n in zip(unique, revenue_by, quantity_by, lines_by)
+        ]
+        purchases = int(np.unique(np.frombuffer(self.purchase, dtype=np.int32)[mask]).size)
+        total = float(revenue.sum())
+        summary = {
+            'revenue': round(total, 2),
+            'quantity': int(quantity.sum()),
+            'lines': int(mask.sum()),
+            'purchases': purchases,
+            'average_ticket': round(total / purchases, 2) if purchases else 0.0
+        }
+        return groups, summary
+
+    def _aggregate_python(self, group_by, start_day, end_day, status_code):
+        column = None if group_by == 'week' else {
+            'product': self.product, 'category': self.category,
+            'client': self.client, 'status': self.status}[group_by]
+        totals = {}
+        purchases = set()
+        revenue_total, quantity_total, lines = 0.0, 0, 0
+        for row in range(len(self.day)):
+            row_status = self.status[row]
+            if row_status == DELETED or (status_code is not None and row_status != status_code):
+                continue
+            day = self.day[row]
+            if (start_day is not None and day < start_day) or (end_day is not None and day > end_day):
+                continue
+            key = (day - 1) // 7 if column is None else column[row]
+            quantity = self.quantity[row]
+            revenue = quantity * self.price[row]
+            group = totals.get(key)
+            if group is None:
+                group = totals[key] = [0.0, 0, 0]
+            group[0] += revenue
+            group[1] += quantity
+            group[2] += 1
+            revenue_total += revenue
+            quantity_total += quantity
+            lines += 1
+            purchases.add(self.purchase[row])
+        groups = [
+            {'key': key, 'revenue': round(r, 2), 'quantity': q, 'lines': n}
+            for key, (r, q, n) in totals.items()
+        ]
+        summary = {
+            'revenue': round(revenue_total, 2),
+            'quantity': quantity_total,
+            'lines': lines,
+            'purchases': len(purchases),
+            'average_ticket': round(revenue_total / len(purchases), 2) if purchases else 0.0
+        }
+        return groups, summary
+
+
+purchase_snapshot = PurchaseSnapshot()
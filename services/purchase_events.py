@@ -0,0 +1,112 @@
+import os
+import time
+from collections import deque
+from threading import Condition, Lock
+
+from config import Config
+
+# Canal de cambios de compras para el panel de administración (SSE).
+#
+# Los handlers de compras publican 'purchase_created', 'status_changed' y
+# 'purchase_deleted'; cada conexión SSE espera nuevos eventos en la condición
+# compartida. Se guarda un registro acotado de los últimos eventos para que un
+# cliente que se reconecta (Last-Event-ID) reciba lo que se perdió. Si el id es
+# de otro arranque del proceso o ya salió del registro, recibe 'reset' y vuelve
+# a cargar la lista completa.
+#
+# Los eventos son del proceso: si otro worker escribe las compras, el cambio
+# se detecta por la versión del almacenamiento y también se envía 'reset'.
+
+RESET = 'reset'
+
+
+class PurchaseEventFeed:
+    def __init__(self, log_size, max_streams):
+        self.max_streams = max_streams
+        self._cond = Condition()
+        self._log = deque(maxlen=log_size)   # (seq, tipo, datos)
+        self._streams_lock = Lock()
+        self._start()
+        # Cada worker (fork del proceso maestro) lleva su propia secuencia
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._log.clear()
+        self._seq = 0
+        # Identifica este proceso y arranque: ids de otro worker o de antes de un reinicio no sirven
+        self._epoch = f'{time.time_ns():x}.{os.getpid()}'
+        self._source = None                  # Versión de las compras tras la última publicación
+        self._streams = 0
+
+    # --- Publicación ---
+
+    def publish(self, event_type, data, source=None):
+        """`source` es la versión del almacenamiento que deja el cambio publicado"""
+        with self._cond:
+            self._seq += 1
+            self._log.append((self._seq, event_type, data))
+            if source is not None:
+                self._source = source
+            self._cond.notify_all()
+
+    def check_source(self, source):
+        """Publica 'reset' si las compras cambiaron fuera de este proceso"""
+        if self._source is None:
+            self._source = source
+        elif source != self._source:
+            self.publish(RESET, {}, source)
+
+    # --- Lectura ---
+
+    def event_id(self, seq=None):
+        return f'{self._epoch}-{self._seq if seq is None else seq}'
+
+    def _parse(self, event_id):
+        """Secuencia a partir de la cual reanudar, o None si el id no es utilizable"""
+        if not event_id:
+            return self._seq
+        epoch, _, seq = event_id.partition('-')
+        if epoch != self._epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        oldest = self._log[0][0] if self._log else self._seq + 1
+        if seq > self._seq or seq < oldest - 1:
+            return None
+        return seq
+
+    def resume(self, event_id):
+        """(secuencia inicial, necesita_reset) para una conexión nueva"""
+        with self._cond:
+            seq = self._parse(event_id)
+            if seq is None:
+                return self._seq, True
+            return seq, False
+
+    def wait(self, after, timeout):
+        """Eventos posteriores a `after`; bloquea hasta `timeout` segundos si no hay"""
+        with self._cond:
+            if self._seq <= after:
+                self._cond.wait(timeout)
+            if self._log and self._log[0][0] > after + 1:
+                # El cliente quedó atrás del registro: que recargue todo
+                return [(self._seq, RESET, {})]
+            return [event for event in self._log if event[0] > after]
+
+    # --- Límite de conexiones por proceso ---
+
+    def open_stream(self):
+        with self._streams_lock:
+            if self._streams >= self.max_streams:
+                return False
+            self._streams += 1
+            return True
+
+    def close_stream(self):
+        with self._streams_lock:
+            self._streams -= 1
+
+
+purchase_events = PurchaseEventFeed(
+    log_size=Config.PURCHASE_EVENT_LOG_SIZE,
+    max_streams=Config.PURCHASE_EVENT_MAX_STREAMS
+)
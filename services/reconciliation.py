@@ -0,0 +1,201 @@
+import csv
+import io
+import math
+import re
+
+from services.client_directory import normalize
+
+# Conciliación de las compras pendientes contra un extracto bancario (CSV).
+#
+# Las compras 'Pendiente' se indexan una vez en diccionarios: por referencia
+# bancaria normalizada y por monto (cubetas del ancho de la tolerancia). Cada
+# fila del extracto se resuelve con búsquedas en esos índices, así que el costo
+# es lineal en filas más compras, sin comparar todas contra todas.
+#
+# Tipos de coincidencia, de mayor a menor confianza:
+# - 'exact': misma referencia y mismo monto (al céntimo).
+# - 'reference': misma referencia y monto dentro de la tolerancia.
+# - 'amount': la referencia no es de ninguna compra, pero hay una sola compra
+#   pendiente sin asignar con ese monto (dentro de la tolerancia).
+# Las filas con referencia se resuelven primero y las de solo monto al final,
+# para que una coincidencia por monto no tome la compra de una por referencia.
+# Cada compra se asigna a una sola fila; las demás se informan con el motivo.
+
+REFERENCE_COLUMNS = ('bank_reference', 'referencia', 'reference', 'ref', 'nro referencia',
+                     'numero de referencia', 'nro_referencia')
+AMOUNT_COLUMNS = ('amount', 'monto', 'importe', 'credito', 'abono')
+DATE_COLUMNS = ('date', 'fecha')
+
+EXACT_TOLERANCE = 0.005
+
+_NOT_ALNUM = re.compile(r'[^0-9A-Z]')
+_NOT_NUMERIC = re.compile(r'[^0-9,.\-]')
+
+
+def normalize_reference(value):
+    """Referencia comparable: mayúsculas, solo letras y dígitos, sin ceros a la izquierda"""
+    return _NOT_ALNUM.sub('', str(value or '').upper()).lstrip('0')
+
+
+def parse_amount(value):
+    """Monto de un extracto ('1.234,56', '1,234.56', 'Bs. 1234.56'); ValueError si no es un número"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    # Sin separadores sueltos en los extremos (el punto de 'Bs.' no es de miles)
+    text = _NOT_NUMERIC.sub('', str(value or '')).strip(',.')
+    if ',' in text and '.' in text:
+        # El separador que aparece último es el decimal
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        integer, _, decimals = text.rpartition(',')
+        text = f'{integer.replace(",", "")}.{decimals}' if len(decimals) != 3 else text.replace(',', '')
+    elif text.count('.') > 1:
+        text = text.replace('.', '')
+    amount = float(text)
+    if not math.isfinite(amount):
+        raise ValueError(value)
+    return amount
+
+
+def _column(fieldnames, aliases):
+    by_name = {normalize(name).replace('_', ' '): name for name in fieldnames or []}
+    for alias in aliases:
+        name = by_name.get(alias.replace('_', ' '))
+        if name is not None:
+            return name
+    return None
+
+
+def read_statement(stream):
+    """(filas, errores, ignoradas) de un extracto CSV: filas {'row', 'reference', 'amount', 'date'}
+
+    Los débitos y montos en cero se ignoran (solo se cuentan). Lanza
+    ValueError si faltan las columnas de referencia o de monto.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(text, dialect=dialect)
+    reference_column = _column(reader.fieldnames, REFERENCE_COLUMNS)
+    amount_column = _column(reader.fieldnames, AMOUNT_COLUMNS)
+    date_column = _column(reader.fieldnames, DATE_COLUMNS)
+    if reference_column is None or amount_column is None:
+        raise ValueError('El extracto debe tener columnas de referencia y de monto')
+
+    rows, errors, ignored = [], [], 0
+    for fields in reader:
+        try:
+            amount = parse_amount(fields.get(amount_column))
+        except ValueError:
+            errors.append({'row': reader.line_num, 'message': 'Monto inválido'})
+            continue
+        if amount <= 0:
+            ignored += 1
+            continue
+        rows.append({
+            'row': reader.line_num,
+            'reference': (fields.get(reference_column) or '').strip(),
+            'amount': amount,
+            'date': (fields.get(date_column) or '').strip() if date_column else ''
+        })
+    return rows, errors, ignored
+
+
+class PendingIndex:
+    """Compras pendientes indexadas por referencia normalizada y por cubeta de monto"""
+
+    def __init__(self, purchases, amount_of, tolerance):
+        self.tolerance = max(tolerance, EXACT_TOLERANCE)
+        self.amount_of = {}
+        self.by_reference = {}
+        self.by_bucket = {}
+        for purchase in purchases:
+            purchase_id = purchase.get('id')
+            amount = amount_of(purchase)
+            self.amount_of[purchase_id] = amount
+            reference = normalize_reference(purchase.get('bank_reference'))
+            if reference:
+                self.by_reference.setdefault(reference, []).append(purchase)
+            if amount is not None:
+                self.by_bucket.setdefault(self._bucket(amount), []).append(purchase)
+
+    def _bucket(self, amount):
+        return math.floor(amount / self.tolerance)
+
+    def by_amount(self, amount):
+        """Compras con monto a no más de la tolerancia"""
+        bucket = self._bucket(amount)
+        return [
+            purchase
+            for key in (bucket - 1, bucket, bucket + 1)
+            for purchase in self.by_bucket.get(key, ())
+            if abs(self.amount_of[purchase.get('id')] - amount) <= self.tolerance
+        ]
+
+
+def _match(row, purchase, kind, expected):
+    return {
+        'row': row['row'],
+        'reference': row['reference'],
+        'amount': row['amount'],
+        'date': row['date'],
+        'kind': kind,
+        'purchase_id': purchase.get('id'),
+        'expected_amount': expected,
+        'difference': round(row['amount'] - expected, 2),
+        'customer': (purchase.get('user') or {}).get('email', ''),
+        'bank_reference': purchase.get('bank_reference', '')
+    }
+
+
+def reconcile(rows, purchases, amount_of, tolerance):
+    """{'matches': [...], 'unmatched': [...]} de las filas contra las compras pendientes"""
+    index = PendingIndex(purchases, amount_of, tolerance)
+    claimed = set()
+    matches, unmatched, amount_only = [], [], []
+
+    for row in rows:
+        candidates = [p for p in index.by_reference.get(normalize_reference(row['reference']), ())
+                      if p.get('id') not in claimed]
+        if not candidates:
+            amount_only.append(row)
+            continue
+        best, best_difference = None, None
+        for purchase in candidates:
+            expected = index.amount_of[purchase.get('id')]
+            if expected is None:
+                continue
+            difference = abs(row['amount'] - expected)
+            if best is None or difference < best_difference:
+                best, best_difference = purchase, difference
+        if best is None or best_difference > index.tolerance:
+            unmatched.append({**row, 'reason': 'Monto distinto al de la compra con esa referencia',
+                              'candidates': [p.get('id') for p in candidates]})
+            continue
+        claimed.add(best.get('id'))
+        kind = 'exact' if best_difference <= EXACT_TOLERANCE else 'reference'
+        matches.append(_match(row, best, kind, index.amount_of[best.get('id')]))
+
+    for row in amount_only:
+        candidates = [p for p in index.by_amount(row['amount']) if p.get('id') not in claimed]
+        if len(candidates) == 1:
+            purchase = candidates[0]
+            claimed.add(purchase.get('id'))
+            matches.append(_match(row, purchase, 'amount', index.amount_of[purchase.get('id')]))
+        elif candidates:
+            unmatched.append({**row, 'reason': 'Varias compras pendientes con ese monto',
+                              'candidates': [p.get('id') for p in candidates]})
+        else:
+            unmatched.append({**row, 'reason': 'Sin compra pendiente con esa referencia o monto',
+                              'candidates': []})
+
+    matches.sort(key=lambda match: match['row'])
+    unmatched.sort(key=lambda row: row['row'])
+    return {'matches': matches, 'unmatched': unmatched}
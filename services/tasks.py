@@ -0,0 +1,152 @@
+import os
+import random
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+
+from config import Config
+from database.task_queue import TaskQueue
+
+# Tareas en segundo plano: trabajo lento que no debe pagar la petición.
+#
+# Los handlers encolan con `tasks.enqueue(nombre, argumentos)` y responden de
+# inmediato; la tarea queda en la cola persistente (database/task_queue.py),
+# así que sobrevive a un reinicio. Cada worker tiene un hilo despachador que
+# toma las tareas vencidas y las ejecuta en un pool de TASK_WORKERS hilos.
+# Si la función lanza una excepción se reintenta con espera exponencial
+# (TASK_RETRY_BASE * 2^intentos, con tope TASK_RETRY_MAX) hasta
+# TASK_MAX_ATTEMPTS intentos; después queda 'failed' con el último error.
+#
+# Las funciones se registran con el decorador `@tasks.task('nombre')` en el
+# módulo dueño del trabajo y reciben los argumentos como keywords. Pueden
+# ejecutarse más de una vez (reintentos, toma vencida): deben ser idempotentes.
+#
+# La cola es para trabajo que puede hacer cualquier worker. Lo que solo afecta
+# a las cachés en memoria de un proceso no se encola: ese proceso lo hace
+# directamente (ver PurchaseSnapshot.apply), así que no queda trabajo
+# huérfano cuando gunicorn recicla un worker.
+
+
+class TaskRunner:
+    def __init__(self, queue, workers, poll_interval, lease, max_attempts,
+                 retry_base, retry_max, retention):
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.retention = retention
+        self._handlers = {}
+        self._wake = Event()
+        self._start_lock = Lock()
+        self._running_lock = Lock()
+        self._running = 0
+        self._pid = None
+        self._executor = None
+
+    def init_app(self, app):
+        # Los hilos no sobreviven al fork: cada worker arranca los suyos con
+        # la primera petición (y retoma lo que haya quedado en la cola)
+        app.before_request(self.start)
+
+    # --- Registro y encolado ---
+
+    def task(self, name):
+        def register(func):
+            self._handlers[name] = func
+            return func
+        return register
+
+    def enqueue(self, name, payload=None, key=None, delay=0):
+        """Encola `name(**payload)` y devuelve el id de la tarea
+
+        `key` evita duplicados en cola.
+        """
+        task_id = self.queue.enqueue(name, payload or {}, self.max_attempts, key=key, delay=delay)
+        self.start()
+        self._wake.set()
+        return task_id
+
+    def status(self, task_id):
+        return self.queue.get(task_id)
+
+    # --- Ejecución ---
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._running = 0
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='task')
+            Thread(target=self._dispatch_loop, name='task-dispatcher', daemon=True).start()
+
+    def _dispatch_loop(self):
+        last_purge = 0
+        while True:
+            claimed = []
+            try:
+                with self._running_lock:
+                    free = self.workers - self._running
+                if free > 0:
+                    claimed = self.queue.claim(free, self.lease)
+                for task in claimed:
+                    with self._running_lock:
+                        self._running += 1
+                    self._executor.submit(self._run, task)
+                if time.time() - last_purge > self.retention / 24:
+                    self.queue.purge(self.retention)
+                    last_purge = time.time()
+            except Exception as e:
+                print(f"[ERROR] Cola de tareas: {e}", file=sys.stderr)
+            if not claimed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _retry_delay(self, attempts):
+        delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+        # Jitter: los reintentos de varias tareas no caen todos a la vez
+        return delay * random.uniform(0.8, 1.2)
+
+    def _run(self, task):
+        try:
+            handler = self._handlers.get(task['name'])
+            if handler is None:
+                self.queue.fail(task['id'], f"Tarea desconocida: {task['name']}")
+                return
+            try:
+                result = handler(**task['payload'])
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                print(f"[ERROR] Tarea {task['name']} #{task['id']} (intento {task['attempts']}): {error}",
+                      file=sys.stderr)
+                traceback.print_exc()
+                retry = task['attempts'] < task['max_attempts']
+                self.queue.fail(task['id'], error, self._retry_delay(task['attempts']) if retry else None)
+                return
+            self.queue.complete(task['id'], result)
+        except Exception as e:
+            # Error de la cola misma: la toma vence y la tarea se reintenta
+            print(f"[ERROR] Cola de tareas: {e}", file=sys.stderr)
+        finally:
+            with self._running_lock:
+                self._running -= 1
+            self._wake.set()
+
+
+tasks = TaskRunner(
+    TaskQueue(Config.TASK_DB),
+    workers=Config.TASK_WORKERS,
+    poll_interval=Config.TASK_POLL_INTERVAL,
+    lease=Config.TASK_LEASE,
+    max_attempts=Config.TASK_MAX_ATTEMPTS,
+    retry_base=Config.TASK_RETRY_BASE,
+    retry_max=Config.TASK_RETRY_MAX,
+    retention=Config.TASK_RETENTION
+)
@@ -4,10 +4,17 @@ let allClients = [];
 let filteredClients = [];
 let currentEditingClient = null;
 
+// Paginación y búsqueda del lado del servidor (/api/users/directory)
+const CLIENTS_PER_PAGE = 50;
+let currentPage = 1;
+let totalPages = 1;
+let currentQuery = '';
+
 document.addEventListener('DOMContentLoaded', async () => {
     console.log('[DEBUG] Inicializando página de clientes...');
     await loadClientsData();
     setupSearch();
+    setupPagination();
     setupModal();
     console.log('[DEBUG] Componentes inicializados');
 });
@@ -19,7 +26,13 @@ document.addEventListener('DOMContentLoaded', async () => {
 async function loadClientsData() {
     console.log('[DEBUG] Iniciando carga de datos de clientes...');
     try {
-        const response = await fetch('/api/users');
+        const params = new URLSearchParams({
+            role: 'cliente',
+            q: currentQuery,
+            page: currentPage,
+            per_page: CLIENTS_PER_PAGE
+        });
+        const response = await fetch(`/api/users/directory?${params}`);
 
         if (!response.ok) {
             console.error('[ERROR] Error en respuesta del servidor:', response.status, response.statusText);
@@ -30,8 +43,8 @@ async function loadClientsData() {
         console.log('[DEBUG] Datos recibidos del servidor:', data);
 
         // Validar que los datos sean un array
-        if (!Array.isArray(data)) {
-            console.error('[ERROR] Error al cargar JSON: los datos no son un array', typeof data);
+        if (!Array.isArray(data.items)) {
+            console.error('[ERROR] Error al cargar JSON: los datos no son un array', typeof data.items);
             showErrorMessage('No se pudieron cargar los usuarios o el archivo de datos está vacío');
             allClients = [];
             filteredClients = [];
@@ -39,21 +52,15 @@ async function loadClientsData() {
             return;
         }
 
-        if (data.length === 0) {
-            console.warn('[WARNING] No hay usuarios en el archivo');
-            showErrorMessage('No se pudieron cargar los usuarios o el archivo de datos está vacío');
-        }
-
-        // Filter to users with role containing "client", avoiding "admin"
-        allClients = data.filter(user => {
-            const role = user.role ? user.role.toLowerCase() : '';
-            return (role.includes('client') || role.includes('cliente')) && role !== 'admin';
-        });
+        // El servidor ya filtra por rol y por búsqueda
+        allClients = data.items;
+        filteredClients = [...allClients];
+        totalPages = Math.max(data.pages, 1);
 
-        console.log(`[DEBUG] Clientes filtrados: ${allClients.length} de ${data.length} usuarios`);
+        console.log(`[DEBUG] Página ${data.page} de ${totalPages}: ${allClients.length} de ${data.total} clientes`);
 
-        filteredClients = [...allClients];
         displayClients();
+        updatePagination(data.total);
 
     } catch (error) {
         console.error('Error al cargar JSON:', error);
@@ -174,35 +181,51 @@ function setupSearch() {
         return;
     }
 
+    // Búsqueda por prefijo en el servidor, con espera breve entre teclas
+    let searchTimeout = null;
     searchInput.addEventListener('input', (e) => {
-        const query = e.target.value.toLowerCase().trim();
+        clearTimeout(searchTimeout);
+        searchTimeout = setTimeout(() => {
+            currentQuery = e.target.value.trim();
+            currentPage = 1;
+            loadClientsData();
+        }, 250);
+    });
 
-        // Verificar que los datos estén cargados
-        if (!allClients || allClients.length === 0) {
-            console.warn('[WARNING] No hay datos para filtrar');
-            return;
-        }
+    console.log('[DEBUG] Búsqueda configurada');
+}
 
-        if (query === '') {
-            filteredClients = [...allClients];
-        } else {
-            filteredClients = allClients.filter(client => {
-                const firstName = client.first_name ? client.first_name.toLowerCase() : '';
-                const lastName = client.last_name ? client.last_name.toLowerCase() : '';
-                const cedula = client.cedula ? client.cedula.toLowerCase() : '';
-                const email = client.email ? client.email.toLowerCase() : '';
-
-                return firstName.includes(query) ||
-                    lastName.includes(query) ||
-                    cedula.includes(query) ||
-                    email.includes(query);
-            });
-        }
+// ========================================
+// PAGINACIÓN
+// ========================================
 
-        displayClients();
+function setupPagination() {
+    const prevBtn = document.getElementById('prev-page');
+    const nextBtn = document.getElementById('next-page');
+    if (!prevBtn || !nextBtn) return;
+
+    prevBtn.addEventListener('click', () => {
+        if (currentPage > 1) {
+            currentPage--;
+            loadClientsData();
+        }
+    });
+    nextBtn.addEventListener('click', () => {
+        if (currentPage < totalPages) {
+            currentPage++;
+            loadClientsData();
+        }
     });
+}
 
-    console.log('[DEBUG] Búsqueda configurada');
+function updatePagination(total) {
+    const pageInfo = document.getElementById('page-info');
+    const prevBtn = document.getElementById('prev-page');
+    const nextBtn = document.getElementById('next-page');
+
+    if (pageInfo) pageInfo.textContent = `Página ${currentPage} de ${totalPages} (${total} clientes)`;
+    if (prevBtn) prevBtn.disabled = currentPage <= 1;
+    if (nextBtn) nextBtn.disabled = currentPage >= totalPages;
 }
 
 // ========================================
@@ -4,12 +4,14 @@ let mockPurchases = [];
 let currentPage = 1;
 const itemsPerPage = 10;
 let filteredPurchases = [];
+let purchaseEvents = null;
 
 document.addEventListener('DOMContentLoaded', async () => {
     await loadPurchasesData();
     setupFilters();
     setupModal();
     setupLightbox();
+    setupReconciliation();
 });
 
 // Load purchases data from API
@@ -21,8 +23,8 @@ async function loadPurchasesData() {
         }
         const data = await response.json();
         mockPurchases = data;
-        filteredPurchases = [...mockPurchases];
-        loadPurchases();
+        refreshPurchasesView();
+        connectPurchaseEvents(response.headers.get('X-Event-ID'));
     } catch (error) {
         console.error('Error loading purchases data:', error);
         showNotification('Error al cargar los datos de compras: ' + error.message, 'error');
@@ -33,6 +35,65 @@ async function loadPurchasesData() {
     }
 }
 
+// Live updates: the server streams purchase changes (SSE) and the board
+// applies them to the loaded list instead of downloading everything again
+function connectPurchaseEvents(lastEventId) {
+    if (purchaseEvents || !window.EventSource) return;
+
+    const url = lastEventId ?
+        `/api/purchases/events?last_event_id=${encodeURIComponent(lastEventId)}` :
+        '/api/purchases/events';
+    purchaseEvents = new EventSource(url);
+
+    purchaseEvents.addEventListener('purchase_created', (e) => {
+        const purchase = JSON.parse(e.data);
+        if (!mockPurchases.some(p => p.id === purchase.id)) {
+            mockPurchases.unshift(purchase);
+            refreshPurchasesView();
+        }
+    });
+
+    purchaseEvents.addEventListener('status_changed', (e) => {
+        const change = JSON.parse(e.data);
+        const purchase = mockPurchases.find(p => p.id === change.id);
+        if (purchase && purchase.status !== change.status) {
+            purchase.status = change.status;
+            refreshPurchasesView();
+        }
+    });
+
+    purchaseEvents.addEventListener('purchase_deleted', (e) => {
+        removePurchase(JSON.parse(e.data).id);
+    });
+
+    // The server could not replay what was missed: reload the whole list
+    purchaseEvents.addEventListener('reset', () => loadPurchasesData());
+
+    purchaseEvents.onerror = () => {
+        // EventSource retries by itself unless the server refused the stream
+        if (purchaseEvents.readyState === EventSource.CLOSED) {
+            purchaseEvents = null;
+            setTimeout(loadPurchasesData, 30000);
+        }
+    };
+}
+
+function removePurchase(purchaseId) {
+    const index = mockPurchases.findIndex(p => p.id === purchaseId);
+    if (index !== -1) {
+        mockPurchases.splice(index, 1);
+        refreshPurchasesView();
+    }
+}
+
+// Re-apply the current filters keeping the current page
+function refreshPurchasesView() {
+    filterPurchases();
+    const totalPages = Math.max(1, Math.ceil(filteredPurchases.length / itemsPerPage));
+    currentPage = Math.min(currentPage, totalPages);
+    loadPurchases();
+}
+
 // Load and display purchases
 function loadPurchases() {
     const startIndex = (currentPage - 1) * itemsPerPage;
@@ -121,6 +182,12 @@ function setupFilters() {
 
 // Apply all filters
 function applyFilters() {
+    filterPurchases();
+    currentPage = 1;
+    loadPurchases();
+}
+
+function filterPurchases() {
     const searchTerm = document.getElementById('search-input').value.toLowerCase();
     const statusFilter = document.getElementById('status-filter').value;
     const dateFrom = document.getElementById('date-from').value;
@@ -140,9 +207,6 @@ function applyFilters() {
 
         return matchesSearch && matchesStatus && matchesDate;
     });
-
-    currentPage = 1;
-    loadPurchases();
 }
 
 // Update pagination controls
@@ -283,9 +347,11 @@ async function updatePurchaseStatus() {
             throw new Error(errorData.error || 'Error updating status');
         }
 
-        // Close modal and reload data
+        // Close modal and update the row (the change feed confirms it to other tabs)
         document.getElementById('purchase-modal').style.display = 'none';
-        loadPurchasesData();
+        const purchase = mockPurchases.find(p => p.id === purchaseRef);
+        if (purchase) purchase.status = newStatus;
+        refreshPurchasesView();
 
         // Show success message
         showNotification('Estado de la compra actualizado exitosamente', 'success');
@@ -296,6 +362,68 @@ async function updatePurchaseStatus() {
     }
 }
 
+// Bank statement reconciliation: the server matches the uploaded CSV against
+// the pending purchases (by bank_reference and amount) and proposes the status
+// changes; after confirmation they are applied in a single request
+function setupReconciliation() {
+    const fileInput = document.getElementById('statement-file');
+    const button = document.getElementById('reconcile-statement');
+    if (!fileInput || !button) return;
+
+    button.addEventListener('click', () => fileInput.click());
+    fileInput.addEventListener('change', async () => {
+        const file = fileInput.files[0];
+        fileInput.value = '';
+        if (file) await reconcileStatement(file);
+    });
+}
+
+async function reconcileStatement(file) {
+    try {
+        const formData = new FormData();
+        formData.append('file', file);
+        const response = await fetch('/api/purchases/reconcile', { method: 'POST', body: formData });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || 'Error al conciliar el extracto');
+        }
+        if (!data.matches.length) {
+            showNotification(`Ninguna de las ${data.rows} filas coincide con una compra pendiente`, 'info');
+            return;
+        }
+
+        const kinds = { exact: 'exacta', reference: 'referencia', amount: 'solo monto' };
+        const lines = data.matches.slice(0, 15).map(match =>
+            `${match.purchase_id} ← ref ${match.reference || '-'} por ${match.amount} (${kinds[match.kind] || match.kind})`);
+        if (data.matches.length > lines.length) {
+            lines.push(`... y ${data.matches.length - lines.length} más`);
+        }
+        const summary = `${data.matched} de ${data.rows} filas coinciden; ${data.unmatched.length} sin coincidencia.\n\n` +
+            `${lines.join('\n')}\n\n¿Marcar estas compras como ${getStatusText(data.matches[0].status)}?`;
+        if (!confirm(summary)) return;
+
+        const applyResponse = await fetch('/api/purchases/reconcile/apply', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ matches: data.matches })
+        });
+        const result = await applyResponse.json();
+        if (!applyResponse.ok) {
+            throw new Error(result.error || 'Error al aplicar la conciliación');
+        }
+        result.results.filter(r => r.ok).forEach(r => {
+            const purchase = mockPurchases.find(p => p.id === r.purchase_id);
+            if (purchase) purchase.status = r.status;
+        });
+        refreshPurchasesView();
+        showNotification(`Compras conciliadas: ${result.updated}` +
+            (result.failed ? ` (${result.failed} no se pudieron actualizar)` : ''), result.failed ? 'info' : 'success');
+    } catch (error) {
+        console.error('Error reconciling statement:', error);
+        showNotification('Error al conciliar el extracto: ' + error.message, 'error');
+    }
+}
+
 // Delete purchase with confirmation
 async function deletePurchase(purchaseId) {
     const purchase = mockPurchases.find(p => p.id === purchaseId);
@@ -320,8 +448,8 @@ async function deletePurchase(purchaseId) {
                 throw new Error(errorData.error || 'Error deleting purchase');
             }
 
-            // Reload data to reflect changes
-            loadPurchasesData();
+            // Remove the row (the change feed removes it in other tabs)
+            removePurchase(purchaseId);
 
             // Show success message
             showNotification('Compra eliminada exitosamente', 'success');
@@ -69,19 +69,52 @@ function filterProducts() {
     }
 }
 
+// Datos de arranque de la página (catálogo, tasa de cambio, sesión y cotización
+// del carrito) en una sola petición; las llamadas con el mismo carrito comparten
+// la respuesta. El servidor la revalida con ETag (304 si nada cambió).
+let bootstrapRequest = null;
+let bootstrapCart = null;
+
+function bootstrapCartParam() {
+    const cart = JSON.parse(localStorage.getItem('cart')) || [];
+    return cart
+        .filter(item => item.id != null)
+        .map(item => item.price != null ? `${item.id}:${item.quantity}:${item.price}` : `${item.id}:${item.quantity}`)
+        .join(',');
+}
+
+function loadBootstrap() {
+    const cartParam = bootstrapCartParam();
+    if (bootstrapRequest === null || cartParam !== bootstrapCart) {
+        bootstrapCart = cartParam;
+        const url = cartParam ? `/api/bootstrap?cart=${encodeURIComponent(cartParam)}` : '/api/bootstrap';
+        const request = fetch(url).then(response => {
+            if (!response.ok) {
+                throw new Error('No se pudieron cargar los datos de la página.');
+            }
+            return response.json();
+        });
+        // Un error no queda memorizado: la próxima llamada reintenta
+        request.catch(() => {
+            if (bootstrapRequest === request) bootstrapRequest = null;
+        });
+        bootstrapRequest = request;
+    }
+    return bootstrapRequest;
+}
+
 // Función para cargar los productos del catálogo
 async function loadProducts() {
     const loading = document.getElementById('loading');
     const productList = document.getElementById('product-list');
 
+    // Páginas sin listado (carrito, perfil...) no necesitan el catálogo
+    if (!productList) return;
+
     if (loading) loading.style.display = 'block';
 
     try {
-        const response = await fetch('/api/products/');
-        if (!response.ok) {
-            throw new Error('No se pudo cargar el catálogo.');
-        }
-        const products = await response.json();
+        const { catalog: products } = await loadBootstrap();
 
         if (loading) loading.style.display = 'none';
         if (productList) productList.innerHTML = ''; // Limpiar
@@ -696,11 +729,12 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // Load products into global variable and initialize carousel
-    fetch('/api/products/')
-        .then(response => response.json())
-        .then(products => {
-            frontendProducts = products;
-            initializeCarousel(products);
+    // (solo en páginas con carrusel o modal de producto)
+    if (!document.getElementById('product-carousel') && !modal) return;
+    loadBootstrap()
+        .then(({ catalog }) => {
+            frontendProducts = catalog;
+            initializeCarousel(catalog);
         })
         .catch(error => console.error('Error loading products:', error));
 });
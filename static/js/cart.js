@@ -96,25 +96,37 @@ function removeItem(index) {
 
 async function updateCartTotals() {
     const cart = JSON.parse(localStorage.getItem('cart')) || [];
-    const subtotal = cart.reduce((sum, item) => sum + (item.price * item.quantity), 0);
-    const iva = subtotal * 0.16; // 16% IVA
-    const totalUSD = subtotal + iva;
+    let subtotal = cart.reduce((sum, item) => sum + (item.price * item.quantity), 0);
+    let iva = subtotal * 0.16; // 16% IVA
+    let totalUSD = subtotal + iva;
+    let totalVES = totalUSD * 36.50; // Default fallback rate
 
-    // Fetch exchange rate
-    let exchangeRate = 36.50; // Default fallback rate
+    // Los totales los calcula el servidor con los precios del catálogo
+    // (cotización incluida en los datos de arranque, ver loadBootstrap en app.js)
     try {
-        const response = await fetch('/api/products/exchange-rate');
-        if (response.ok) {
-            const data = await response.json();
-            exchangeRate = data.rate;
+        const { cart: quote } = await loadBootstrap();
+        if (quote) {
+            subtotal = quote.subtotal;
+            iva = quote.iva;
+            totalUSD = quote.total_usd;
+            totalVES = quote.total_ves;
+
+            // Actualizar precios desactualizados guardados en el carrito
+            const changed = quote.lines.filter(line => line.price_changed);
+            if (changed.length > 0) {
+                changed.forEach(line => {
+                    cart.filter(item => item.id == line.product_id).forEach(item => item.price = line.unit_price);
+                });
+                localStorage.setItem('cart', JSON.stringify(cart));
+                loadCart();
+                return;
+            }
         }
     } catch (error) {
-        console.error('Error fetching exchange rate:', error);
-        // Use fallback rate
+        console.error('Error fetching cart quote:', error);
+        // Use local totals
     }
 
-    const totalVES = totalUSD * exchangeRate;
-
     // Update DOM elements
     document.getElementById('cart-subtotal').textContent = `$${subtotal.toFixed(2)}`;
     document.getElementById('cart-iva').textContent = `$${iva.toFixed(2)}`;
@@ -6,7 +6,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
 async function loadPurchases() {
     try {
-        const response = await fetch('/api/purchases/user');
+        const response = await fetch('/api/purchases/history');
 
         if (response.status === 401) {
             // Redirigir al login
@@ -18,15 +18,36 @@ async function loadPurchases() {
             throw new Error('Failed to load purchases: ' + response.status);
         }
 
-        const purchases = await response.json();
+        const history = await response.json();
 
-        displayPurchases(purchases);
+        displayStats(history.stats);
+        displayPurchases(history.purchases);
     } catch (error) {
         console.error('Error loading purchases:', error);
         displayPurchases([]);
     }
 }
 
+function displayStats(stats) {
+    const summary = document.getElementById('purchases-summary');
+    if (!summary || !stats || stats.order_count === 0) {
+        return;
+    }
+
+    const parts = [
+        `${stats.order_count} ${stats.order_count === 1 ? 'compra' : 'compras'}`,
+        `Total gastado: $${stats.lifetime_spend.toFixed(2)}`
+    ];
+    if (stats.pending_count > 0) {
+        parts.push(`${stats.pending_count} pendiente${stats.pending_count === 1 ? '' : 's'}`);
+    }
+    if (stats.last_purchase_date) {
+        parts.push(`Última compra: ${new Date(stats.last_purchase_date).toLocaleDateString('es-ES')}`);
+    }
+    summary.textContent = parts.join(' · ');
+    summary.style.display = 'block';
+}
+
 function displayPurchases(purchases) {
     const tableBody = document.getElementById('purchases-table-body');
     const table = document.getElementById('purchases-table');
@@ -127,6 +127,18 @@ function validatePaymentForm(formData) {
 }
 
 // Handle payment form submission
+// Idempotency-Key of the current checkout: a retry after a timeout or a server
+// error reuses it, so the server returns the original purchase instead of
+// registering it twice. A new key is used once the server has answered.
+let paymentIdempotencyKey = null;
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}-${Math.random().toString(36).slice(2)}`;
+}
+
 async function handlePaymentSubmission(event) {
     event.preventDefault();
 
@@ -188,14 +200,23 @@ async function handlePaymentSubmission(event) {
         };
 
         // Send to server
+        if (!paymentIdempotencyKey) {
+            paymentIdempotencyKey = newIdempotencyKey();
+        }
         const response = await fetch('/api/purchases/register', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Idempotency-Key': paymentIdempotencyKey
             },
             body: JSON.stringify(requestData)
         });
 
+        // Client errors are final answers: the next attempt is a new request
+        if (response.status >= 400 && response.status < 500 && ![409, 429].includes(response.status)) {
+            paymentIdempotencyKey = null;
+        }
+
         if (!response.ok) {
             const errorData = await response.json();
             throw new Error(errorData.error || 'Error al registrar la compra');
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from services import admission
+from services.admission import AdmissionClass, AdmissionController, TokenBucketLimiter, class_slots
+
+
+def _clock(monkeypatch, start=1000.0):
+    now = [start]
+    monkeypatch.setattr(admission.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_take_admits_up_to_capacity_then_asks_to_wait(monkeypatch):
+    now = _clock(monkeypatch)
+    limiter = TokenBucketLimiter(max_keys=10)
+
+    assert [limiter.take('ip', capacity=3, rate=0.5) for _ in range(3)] == [0, 0, 0]
+    assert limiter.take('ip', capacity=3, rate=0.5) == 2
+    assert limiter.take('other', capacity=3, rate=0.5) == 0
+
+    now[0] += 2
+    assert limiter.take('ip', capacity=3, rate=0.5) == 0
+    assert limiter.metrics() == {'limited': 1, 'tracked_keys': 2}
+
+
+def test_take_evicts_least_recently_used_keys(monkeypatch):
+    _clock(monkeypatch)
+    limiter = TokenBucketLimiter(max_keys=2)
+
+    limiter.take('a', capacity=1, rate=1)
+    limiter.take('b', capacity=1, rate=1)
+    limiter.take('c', capacity=1, rate=1)
+
+    assert limiter.metrics()['tracked_keys'] == 2
+    assert limiter.take('a', capacity=1, rate=1) == 0    # 'a' was evicted: full bucket again
+
+
+def test_acquire_sheds_when_queue_is_full():
+    gate = AdmissionClass('auth', limit=1, queue=1, timeout=5, retry_after=1)
+    assert gate.acquire()
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(gate.acquire()))
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while gate.metrics()['queue_depth'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert gate.acquire() is False
+    gate.release()
+    waiter.join(5)
+
+    assert results == [True]
+    metrics = gate.metrics()
+    assert metrics['shed'] == 1
+    assert metrics['admitted'] == 2
+    assert metrics['running'] == 1
+
+
+def test_acquire_times_out_in_queue():
+    gate = AdmissionClass('reports', limit=1, queue=2, timeout=0.05, retry_after=1)
+    assert gate.acquire()
+
+    assert gate.acquire() is False
+    assert gate.metrics()['timed_out'] == 1
+    assert gate.metrics()['queue_depth'] == 0
+
+
+CLASSES = {
+    'auth': {'endpoints': ('auth.login',), 'limit': 0.25, 'queue': 0.125, 'timeout': 2.0, 'retry_after': 2},
+    'reports': {'endpoints': ('purchases.get_reports',), 'limit': 0.125, 'queue': 0.0625, 'timeout': 5.0,
+                'retry_after': 10}
+}
+
+
+def test_class_slots_leave_threads_for_other_routes():
+    for threads in (4, 8, 16, 64):
+        slots = class_slots(CLASSES, threads, free_share=0.5)
+        assert sum(limit + queue for limit, queue in slots.values()) <= threads // 2
+        assert all(limit >= 1 for limit, _ in slots.values())
+
+
+def test_class_slots_trim_queues_before_limits():
+    assert class_slots(CLASSES, 8, free_share=0.5) == {'auth': (2, 1), 'reports': (1, 0)}
+    assert class_slots(CLASSES, 2, free_share=0.5) == {'auth': (1, 0), 'reports': (1, 0)}
+
+
+def test_controller_resize():
+    controller = AdmissionController(CLASSES, threads=8, free_share=0.5, rate_limits={},
+                                     rate_limited_endpoints=(), max_keys=10)
+    controller.resize(16)
+    metrics = controller.metrics()['classes']
+    assert (metrics['auth']['limit'], metrics['auth']['queue_size']) == (4, 1)
+    assert (metrics['reports']['limit'], metrics['reports']['queue_size']) == (2, 1)
@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+from flask import Flask, g, jsonify, request
+
+from services.asgi import AsgiAdapter
+from services.async_views import async_views
+
+
+def _app(calls):
+    app = Flask(__name__)
+
+    @app.before_request
+    def guard():
+        calls.append('before')
+        if request.headers.get('X-Blocked'):
+            return jsonify({'error': 'blocked'}), 429
+        g.admitted = True
+        return None
+
+    @app.teardown_request
+    def teardown(exc=None):
+        calls.append('teardown')
+
+    @app.route('/asgi-test')
+    def asgi_test_view():
+        return jsonify({'variant': 'sync'})
+
+    return app
+
+
+@async_views.view('asgi_test_view')
+async def asgi_test_view_async():
+    return jsonify({'variant': 'async', 'admitted': g.get('admitted', False)})
+
+
+def _get(app, headers=()):
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': '/asgi-test', 'query_string': b'',
+        'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80)
+    }
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(AsgiAdapter(app, wsgi_threads=2)(scope, receive, send))
+    return sent[0]['status'], sent[1]['body']
+
+
+def test_async_variant_runs_before_request_hooks():
+    calls = []
+    status, body = _get(_app(calls))
+    assert status == 200
+    assert json.loads(body) == {'variant': 'async', 'admitted': True}
+    assert calls == ['before', 'teardown']
+
+
+def test_before_request_response_skips_the_async_variant():
+    calls = []
+    status, body = _get(_app(calls), headers=[('x-blocked', '1')])
+    assert status == 429
+    assert b'blocked' in body
+    assert calls == ['before', 'teardown']
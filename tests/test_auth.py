@@ -0,0 +1,30 @@
+from api.auth import LOGIN_SCHEMA, REGISTER_SCHEMA, check_password, hash_password
+
+USER = {'first_name': 'Ana', 'last_name': 'Pérez', 'email': 'ana@example.com', 'id_card': '12345678',
+        'phone': '04141234567'}
+
+
+def test_login_accepts_passwords_longer_than_72_characters():
+    values, errors = LOGIN_SCHEMA.validate({'email': 'ana@example.com', 'password': 'x' * 100})
+    assert errors is None
+    assert len(values['password']) == 100
+
+
+def test_login_rejects_a_missing_body():
+    values, errors = LOGIN_SCHEMA.validate(None)
+    assert values is None
+    assert '_body' in errors
+
+
+def test_register_limits_the_password_in_bytes():
+    assert REGISTER_SCHEMA.validate({**USER, 'password': 'x' * 72})[1] is None
+    # 40 caracteres, 80 bytes en UTF-8
+    errors = REGISTER_SCHEMA.validate({**USER, 'password': 'ñ' * 40})[1]
+    assert errors == {'password': 'Contraseña debe tener máximo 72 bytes'}
+
+
+def test_check_password_with_a_long_stored_password():
+    password = 'y' * 90
+    user = {'password_hash': hash_password(password).decode('utf-8')}
+    assert check_password(password, user)
+    assert not check_password('z' * 90, user)
@@ -0,0 +1,48 @@
+from services.customer_history import CustomerHistory
+
+
+def _purchase(purchase_id, email, date, status='Pendiente', total=10):
+    return {'id': purchase_id, 'user': {'email': email}, 'purchase_date': date,
+            'status': status, 'total_amount': total}
+
+
+def test_upsert_applies_own_writes():
+    history = CustomerHistory()
+    history.rebuild([_purchase('PUR-1', 'a@b.co', '2024-03-01')], 'v1')
+
+    assert history.upsert(_purchase('PUR-2', 'a@b.co', '2024-03-02'), 'v1', 'v2')
+    assert history.remove('PUR-1', 'v2', 'v3')
+
+    purchases, stats = history.history('a@b.co')
+    assert [p['id'] for p in purchases] == ['PUR-2']
+    assert stats['order_count'] == 1
+
+
+def test_write_after_another_worker_leaves_the_index_stale():
+    history = CustomerHistory()
+    history.rebuild([_purchase('PUR-1', 'a@b.co', '2024-03-01')], 'v1')
+    # Otro worker guardó PUR-2 (v1 -> v2); este worker guarda PUR-3 (v2 -> v3)
+    stored = [_purchase('PUR-1', 'a@b.co', '2024-03-01'), _purchase('PUR-2', 'a@b.co', '2024-03-02'),
+              _purchase('PUR-3', 'a@b.co', '2024-03-03')]
+
+    assert not history.upsert(stored[2], 'v2', 'v3')
+    assert not history.remove('PUR-1', 'v2', 'v3')
+
+    history.sync('v3', lambda: stored)
+    purchases, stats = history.history('a@b.co')
+    assert [p['id'] for p in purchases] == ['PUR-3', 'PUR-2', 'PUR-1']
+    assert stats['order_count'] == 3
+
+
+def test_upsert_many_moves_stats_between_customers():
+    history = CustomerHistory()
+    history.rebuild([_purchase('PUR-1', 'a@b.co', '2024-03-01', total=10)], 'v1')
+
+    assert history.upsert_many([_purchase('PUR-1', 'c@d.co', '2024-03-01', total=10),
+                                _purchase('PUR-2', 'c@d.co', '2024-03-02', status='Cancelada')], 'v1', 'v2')
+
+    assert history.history('a@b.co')[1]['order_count'] == 0
+    stats = history.history('c@d.co')[1]
+    assert stats['order_count'] == 2
+    assert stats['lifetime_spend'] == 10.0
+    assert stats['cancelled_count'] == 1
@@ -0,0 +1,41 @@
+import multiprocessing
+
+from database.file_lock import FileLock
+from database.purchase_store import PurchaseStore
+
+
+def _store(tmp_path):
+    return PurchaseStore(str(tmp_path / 'purchases.json'), str(tmp_path / 'archive'))
+
+
+def _append_purchases(tmp_path, count):
+    # Un "worker": mismo ciclo que register_purchase (id = mayor número + 1)
+    store, lock = _store(tmp_path), FileLock(str(tmp_path / 'purchases.lock'))
+    for _ in range(count):
+        with lock:
+            purchases = store.load()
+            number = store.max_id_number() + 1
+            purchases.append({'id': f'PUR-2024-{number:03d}', 'purchase_date': '2024-03-01', 'total_amount': 1})
+            store.save(purchases)
+
+
+def test_workers_never_lose_or_duplicate_purchases(tmp_path):
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_append_purchases, args=(tmp_path, 25)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+
+    ids = [p['id'] for p in _store(tmp_path).load()]
+    assert len(ids) == 100
+    assert len(set(ids)) == 100
+
+
+def test_lock_is_reentrant(tmp_path):
+    lock = FileLock(str(tmp_path / 'locks' / 'data.lock'))
+    with lock:
+        with lock:
+            pass
+        assert lock._file is not None
+    assert lock._file is None
@@ -0,0 +1,87 @@
+import threading
+
+from flask import Flask, jsonify, request
+
+from database.idempotency_store import IdempotencyStore
+from services.idempotency import IdempotencyCache
+
+
+def _client(tmp_path, view):
+    cache = IdempotencyCache(IdempotencyStore(str(tmp_path / 'keys.sqlite3')),
+                             ttl=60, lock_timeout=30, purge_interval=60)
+    app = Flask(__name__)
+    app.add_url_rule('/orders', 'orders', cache.idempotent(view), methods=['POST'])
+    return app.test_client()
+
+
+def _post(client, body, key='key-1'):
+    return client.post('/orders', json=body, headers={'Idempotency-Key': key})
+
+
+def test_retry_replays_the_stored_response(tmp_path):
+    calls = []
+
+    def create():
+        calls.append(request.get_json())
+        return jsonify({'order': len(calls)}), 201
+
+    client = _client(tmp_path, create)
+    first = _post(client, {'total': 10})
+    retry = _post(client, {'total': 10})
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json() == first.get_json() == {'order': 1}
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert len(calls) == 1
+
+
+def test_retry_while_original_runs_gets_409(tmp_path):
+    started, finish = threading.Event(), threading.Event()
+
+    def create():
+        started.set()
+        finish.wait(5)
+        return jsonify({'order': 1}), 201
+
+    client = _client(tmp_path, create)
+    results = []
+    original = threading.Thread(target=lambda: results.append(_post(client, {'total': 10})))
+    original.start()
+    assert started.wait(5)
+    try:
+        retry = _post(client, {'total': 10})
+    finally:
+        finish.set()
+        original.join()
+
+    assert retry.status_code == 409
+    assert retry.headers['Retry-After'] == '1'
+    assert results[0].status_code == 201
+
+
+def test_key_reused_with_another_body_gets_422(tmp_path):
+    calls = []
+
+    def create():
+        calls.append(request.get_json())
+        return jsonify({'order': len(calls)}), 201
+
+    client = _client(tmp_path, create)
+    assert _post(client, {'total': 10}).status_code == 201
+    reused = _post(client, {'total': 99})
+
+    assert reused.status_code == 422
+    assert len(calls) == 1
+
+
+def test_server_error_is_not_stored(tmp_path):
+    calls = []
+
+    def create():
+        calls.append(1)
+        return jsonify({'error': 'boom'}), (500 if len(calls) == 1 else 201)
+
+    client = _client(tmp_path, create)
+    assert _post(client, {'total': 10}).status_code == 500
+    assert _post(client, {'total': 10}).status_code == 201
+    assert len(calls) == 2
@@ -0,0 +1,101 @@
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from database.stock_store import StockStore
+from services.inventory import InventoryService, InsufficientStockError
+
+
+def _service(path):
+    # Un servicio por "worker", todos sobre el mismo archivo de contadores
+    service = InventoryService(StockStore(path), flush_interval=60)
+    service._changed = lambda: None  # Sin hilo de escritura a products.json
+    service.seed([])  # No cargar el catálogo real
+    return service
+
+
+@pytest.fixture
+def stock_path(tmp_path):
+    path = str(tmp_path / 'stock.sqlite3')
+    _service(path).seed([{'product_id': 1, 'stock_quantity': 5}, {'product_id': 2, 'stock_quantity': 3}])
+    return path
+
+
+def test_reserve_is_all_or_nothing(stock_path):
+    service = _service(stock_path)
+    with pytest.raises(InsufficientStockError) as error:
+        service.reserve({1: 2, 2: 4})
+    assert error.value.shortages == [{'product_id': 2, 'requested': 4, 'available': 3}]
+    assert service.available(1) == 5
+    assert service.available(2) == 3
+
+
+def test_seed_keeps_existing_counters(stock_path):
+    service = _service(stock_path)
+    service.reserve({1: 1})
+    service.seed([{'product_id': 1, 'stock_quantity': 5}, {'product_id': 3, 'stock_quantity': 7}])
+    assert service.available(1) == 4
+    assert service.available(3) == 7
+
+
+def test_concurrent_reserve_and_release_never_oversell(stock_path):
+    workers = [_service(stock_path) for _ in range(4)]
+    sold = []
+
+    def buy(n):
+        service = workers[n % len(workers)]
+        try:
+            service.reserve({1: 1})
+        except InsufficientStockError:
+            return
+        if n % 3 == 0:
+            service.release({1: 1})
+        else:
+            sold.append(n)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(buy, range(60)))
+
+    assert len(sold) == 5
+    assert workers[0].available(1) == 0
+
+
+def _buy_all(path, results):
+    service = _service(path)
+    bought = 0
+    while True:
+        try:
+            service.reserve({2: 1})
+        except InsufficientStockError:
+            break
+        bought += 1
+    results.put(bought)
+
+
+def test_processes_cannot_sell_the_same_unit(stock_path):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=_buy_all, args=(stock_path, results)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+    assert sum(results.get(timeout=5) for _ in processes) == 3
+    assert _service(stock_path).available(2) == 0
+
+
+def test_failed_multi_line_reservations_return_their_stock(stock_path):
+    workers = [_service(stock_path) for _ in range(4)]
+
+    def buy(n):
+        try:
+            workers[n % len(workers)].reserve({1: 1, 2: 4})   # Nunca alcanza el producto 2
+        except InsufficientStockError:
+            pass
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(buy, range(40)))
+
+    assert workers[0].available(1) == 5
+    assert workers[0].available(2) == 3
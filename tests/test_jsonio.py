@@ -0,0 +1,35 @@
+import gzip
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from database import jsonio
+
+
+def test_threads_writing_the_same_file_never_leave_it_half_written(tmp_path):
+    path = str(tmp_path / 'data.json')
+
+    def write(n):
+        jsonio.dump_atomic([{'writer': n, 'payload': 'x' * 2000}] * 50, path)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(write, range(200)))
+
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    assert len(data) == 50
+    assert os.listdir(tmp_path) == ['data.json']
+
+
+def test_failed_write_keeps_the_previous_file(tmp_path):
+    path = str(tmp_path / 'data.json.gz')
+    jsonio.dump_atomic([1, 2], path, opener=gzip.open)
+
+    with pytest.raises(TypeError):
+        jsonio.dump_atomic([object()], path, opener=gzip.open)
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        assert json.load(f) == [1, 2]
+    assert os.listdir(tmp_path) == ['data.json.gz']
@@ -0,0 +1,59 @@
+from datetime import date
+
+from services.purchase_analytics import PurchaseSnapshot
+
+CATALOG = {1: {'name': 'Casco', 'category': 'Accesorios'}, 2: {'name': 'Cadena', 'category': 'Transmisión'}}
+
+
+def _purchase(purchase_id, status='Pendiente', product_id=1, quantity=1, price=10.0):
+    return {'id': purchase_id, 'status': status, 'purchase_date': '2024-03-15T10:00:00',
+            'user': {'email': f'{purchase_id}@example.com'},
+            'products': [{'product_id': product_id, 'quantity': quantity, 'price': price}]}
+
+
+def _totals(snapshot):
+    groups, summary = snapshot.aggregate('status', catalog=CATALOG)
+    return {g['label']: g['revenue'] for g in groups}, summary['purchases']
+
+
+def test_apply_matches_a_full_refresh():
+    purchases = [_purchase('P1'), _purchase('P2', product_id=2, price=5.0)]
+    snapshot = PurchaseSnapshot()
+    snapshot.refresh(purchases, CATALOG, version=1)
+
+    created = _purchase('P3', quantity=2)
+    changed = dict(purchases[0], status='Completada')
+    assert snapshot.apply([created, changed], ['P2'], CATALOG, previous=1, version=2)
+
+    rebuilt = PurchaseSnapshot()
+    rebuilt.refresh([changed, created], CATALOG, version=2)
+    assert _totals(snapshot) == _totals(rebuilt) == ({'Pendiente': 20.0, 'Completada': 10.0}, 2)
+
+
+def test_apply_is_skipped_when_another_writer_changed_the_store():
+    snapshot = PurchaseSnapshot()
+    snapshot.refresh([_purchase('P1')], CATALOG, version=1)
+    assert not snapshot.apply([_purchase('P2')], [], CATALOG, previous=5, version=6)
+    assert _totals(snapshot) == ({'Pendiente': 10.0}, 1)
+
+
+def test_refresh_skips_the_scan_when_the_version_is_current():
+    snapshot = PurchaseSnapshot()
+    snapshot.refresh([_purchase('P1')], CATALOG, version=1)
+    snapshot.apply([_purchase('P2')], [], CATALOG, previous=1, version=2)
+    # Otra lista con la misma versión: no se recorre (la instantánea ya la refleja)
+    snapshot.refresh([], CATALOG, version=2)
+    assert _totals(snapshot) == ({'Pendiente': 20.0}, 2)
+
+
+def test_week_groups_put_undated_purchases_in_their_own_bucket():
+    legacy = [dict(_purchase('P2'), purchase_date='15/03/2024'), dict(_purchase('P3'), purchase_date=None)]
+    snapshot = PurchaseSnapshot()
+    snapshot.refresh([_purchase('P1')] + legacy, CATALOG, version=1)
+
+    groups, summary = snapshot.aggregate('week', catalog=CATALOG)
+    assert [(g['label'], g['lines']) for g in groups] == [('Sin fecha', 2), ('2024-03-11', 1)]
+    assert summary['lines'] == 3
+
+    groups, summary = snapshot.aggregate('week', start=date(2024, 1, 1), catalog=CATALOG)
+    assert [g['label'] for g in groups] == ['2024-03-11']
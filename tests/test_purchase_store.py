@@ -0,0 +1,90 @@
+import multiprocessing
+from datetime import date
+
+import pytest
+
+from api.purchases import CREATE_PURCHASE_SCHEMA
+from database.file_lock import FileLock
+from database.purchase_store import PurchaseStore, purchase_month
+
+
+@pytest.mark.parametrize('value, month', [
+    ('2024-03-15T10:20:00', '2024-03'),
+    ('2024-03-15', '2024-03'),
+    ('2024-03', '2024-03'),
+    ('15/03/2024', ''),
+    ('2024/03/15', ''),
+    ('2024-13-01', ''),
+    ('202403151020', ''),
+    ('abc', ''),
+    ('', ''),
+    (None, '')
+])
+def test_purchase_month(value, month):
+    assert purchase_month({'purchase_date': value}) == month
+
+
+def test_seal_keeps_malformed_dates_in_the_open_partition(tmp_path):
+    store = PurchaseStore(str(tmp_path / 'purchases.json'), str(tmp_path / 'archive'))
+    store.save([
+        {'id': 'PUR-2024-001', 'purchase_date': '2024-01-10T09:00:00', 'total_amount': 10},
+        {'id': 'PUR-2024-002', 'purchase_date': '15/03/2024', 'total_amount': 20},
+        {'id': 'PUR-2024-003', 'purchase_date': 'abc', 'total_amount': 30}
+    ])
+
+    assert store.seal(today=date(2024, 6, 1)) == ['2024-01']
+    assert sorted(store.index()) == ['2024-01']
+    assert [p['id'] for p in store.hot()] == ['PUR-2024-002', 'PUR-2024-003']
+    assert sorted(p.name for p in (tmp_path / 'archive').iterdir()) == ['2024-01.json.gz', 'index.json']
+
+
+def _locked_store(tmp_path):
+    return PurchaseStore(str(tmp_path / 'purchases.json'), str(tmp_path / 'archive'),
+                         lock=FileLock(str(tmp_path / 'purchases.lock')))
+
+
+def _append_and_seal(tmp_path, worker, count):
+    # Un worker agrega compras de meses cerrados y sella después de cada una
+    store = _locked_store(tmp_path)
+    for n in range(count):
+        with store.lock:
+            purchases = store.load()
+            purchases.append({'id': f'PUR-2024-{worker}{n:03d}', 'purchase_date': '2024-01-10', 'total_amount': 1})
+            store.save(purchases)
+        store.seal(today=date(2024, 6, 1))
+
+
+def test_seal_never_drops_purchases_appended_by_other_workers(tmp_path):
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_append_and_seal, args=(tmp_path, worker, 20)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+
+    store = _locked_store(tmp_path)
+    store.seal(today=date(2024, 6, 1))
+    ids = [p['id'] for p in store.partition('2024-01')]
+    assert len(ids) == len(set(ids)) == 80
+    assert store.hot() == []
+
+
+def test_save_rejects_an_invalid_partition(tmp_path):
+    store = PurchaseStore(str(tmp_path / 'purchases.json'), str(tmp_path / 'archive'))
+    with pytest.raises(ValueError):
+        store.save([{'id': 'PUR-2024-001'}], '15/03/2')
+
+
+@pytest.mark.parametrize('value', ['15/03/2024', 'abc', '2024-02-30', '2024-03-15X'])
+def test_create_schema_rejects_non_iso_dates(value):
+    data = {'user_id': 1, 'user': {}, 'products': [], 'total_amount': 1, 'purchase_date': value}
+    values, errors = CREATE_PURCHASE_SCHEMA.validate(data)
+    assert values is None
+    assert 'purchase_date' in errors
+
+
+def test_create_schema_accepts_iso_dates():
+    data = {'user_id': 1, 'user': {}, 'products': [], 'total_amount': 1, 'purchase_date': '2024-03-15T10:20:00'}
+    values, errors = CREATE_PURCHASE_SCHEMA.validate(data)
+    assert errors is None
+    assert values['purchase_date'] == '2024-03-15T10:20:00'
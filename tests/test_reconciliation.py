@@ -0,0 +1,27 @@
+import pytest
+
+from services.reconciliation import normalize_reference, parse_amount
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1.234,56', 1234.56),
+    ('1,234.56', 1234.56),
+    ('1,234', 1234.0),
+    ('12,5', 12.5),
+    ('1.234.567', 1234567.0),
+    ('Bs. 1234.56', 1234.56),
+    (250, 250.0),
+])
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('text', ['', 'abc', True])
+def test_parse_amount_rejects_non_numbers(text):
+    with pytest.raises(ValueError):
+        parse_amount(text)
+
+
+def test_normalize_reference():
+    assert normalize_reference(' ref-000123 ') == 'REF000123'
+    assert normalize_reference('000123') == '123'
@@ -0,0 +1,21 @@
+from database.task_queue import TaskQueue
+
+
+def test_tasks_can_be_claimed_by_any_worker(tmp_path):
+    queue = TaskQueue(str(tmp_path / 'tasks.sqlite3'))
+    task_id = queue.enqueue('seal', {'month': '2024-01'}, 3, key='seal')
+    assert queue.enqueue('seal', {'month': '2024-01'}, 3, key='seal') == task_id
+    claimed = queue.claim(5, lease=60)
+    assert [task['id'] for task in claimed] == [task_id]
+
+
+def test_purge_keeps_pending_tasks(tmp_path):
+    queue = TaskQueue(str(tmp_path / 'tasks.sqlite3'))
+    done = queue.enqueue('seal', {}, 3)
+    pending = queue.enqueue('resize', {}, 3)
+    queue.claim(1, lease=60)
+    queue.complete(done)
+
+    assert queue.purge(older_than=-1) == 1
+    assert queue.get(done) is None
+    assert queue.get(pending)['status'] == 'queued'
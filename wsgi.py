@@ -0,0 +1,19 @@
+# wsgi.py - Punto de entrada para el servidor de producción
+#
+#   gunicorn -c gunicorn.conf.py wsgi:application
+#
+# Con preload_app el módulo se importa una sola vez en el proceso maestro:
+# las cachés y las plantillas compiladas quedan cargadas antes del fork y los
+# workers las comparten copy-on-write.
+
+import gc
+
+from app import app, warmup
+
+warmup()
+
+# Mover los objetos ya cargados a la generación permanente para que el GC de
+# cada worker no los toque (y no rompa las páginas compartidas)
+gc.freeze()
+
+application = app